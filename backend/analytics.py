@@ -0,0 +1,198 @@
+"""
+Daily and weekly progress rollups.
+
+``daily_rollups`` and ``weekly_rollups`` hold per-user totals per UTC day and
+per Monday-based UTC week: tasks completed, points earned and estimated
+minutes of those tasks (by completion day), and minutes of timed events (by
+start day). The analytics endpoint only ever reads these tables.
+
+Write paths keep them current with ``adjust_rollups``: before changing or
+deleting rows they retract the rows' current contributions, and afterwards
+add the new ones. Both are ``INSERT OR REPLACE ... SELECT`` statements that
+read the rows themselves inside the write's transaction, so
+concurrent writers cannot make the totals drift and a rolled back write
+takes its adjustments with it. ``rebuild_rollups`` recomputes everything in
+bulk from the event and task tables (archives included).
+"""
+
+from datetime import date, timedelta
+from functools import cache
+
+from sqlalchemy import BigInteger, and_, bindparam, func, literal_column, type_coerce
+from extensions import db
+from models import DATETIME_STORAGE, ArchivedEvent, ArchivedTask, DailyRollup, Event, Task, WeeklyRollup
+
+
+PERIODS = {
+    'day': DailyRollup,
+    'week': WeeklyRollup,
+}
+
+METRICS = ('tasks_completed', 'points_earned', 'completed_minutes', 'scheduled_minutes')
+
+# Upper bound on periods per request (a bit more than a year of days)
+MAX_PERIODS = 400
+
+
+def _day(column):
+    # UTC date of a stored UTCDateTime column as 'YYYY-MM-DD'
+    if DATETIME_STORAGE == 'epoch':
+        return func.date(type_coerce(column, BigInteger) // 1000000, 'unixepoch')
+    return func.date(column)
+
+
+def _period_start(day, rollup):
+    if rollup is DailyRollup:
+        return day
+    # Forward to the week's Sunday (or stay on it), then back to its Monday
+    return func.date(day, 'weekday 0', '-6 days')
+
+
+def _minutes(start, end):
+    if DATETIME_STORAGE == 'epoch':
+        return (type_coerce(end, BigInteger) - type_coerce(start, BigInteger)) / 60000000.0
+    return (func.julianday(end) - func.julianday(start)) * 1440
+
+
+def _contributions(model, by_id: bool):
+    """Per-row ``(user_id, day, *METRICS)`` of ``model``, limited to the ``ids`` parameter with ``by_id``."""
+
+    table = model.__table__
+
+    if model in (Task, ArchivedTask):
+        day = _day(table.c.completed_at)
+        metrics = (
+            literal_column('1'),
+            func.coalesce(table.c.points, 0),
+            func.coalesce(table.c.estimated_minutes, 0),
+            literal_column('0'),
+        )
+        where = table.c.completed_at.is_not(None)
+    else:
+        day = _day(table.c.start_time)
+        metrics = (
+            literal_column('0'),
+            literal_column('0'),
+            literal_column('0'),
+            func.round(_minutes(table.c.start_time, table.c.end_time)),
+        )
+        where = table.c.all_day.is_(False)
+
+    stmt = db.select(
+        table.c.user_id,
+        day.label('day'),
+        *(metric.label(name) for metric, name in zip(metrics, METRICS))
+    ).where(table.c.user_id.is_not(None), where)
+    if by_id:
+        stmt = stmt.where(table.c.id.in_(bindparam('ids', expanding=True)))
+    return stmt.subquery()
+
+
+@cache
+def _adjust_statements(model, by_id: bool) -> tuple:
+    """
+    One statement per rollup table adding ``sign`` times the grouped
+    contributions to the stored totals. INSERT OR REPLACE over a LEFT JOIN
+    (rather than an upsert) keeps the statements in SQLAlchemy's compiled
+    cache, so the per-write cost is only executing them.
+    """
+
+    rows = _contributions(model, by_id)
+
+    statements = []
+    for rollup in PERIODS.values():
+        table = rollup.__table__
+        period_start = _period_start(rows.c.day, rollup)
+        delta = db.select(
+            rows.c.user_id,
+            period_start.label('period_start'),
+            *(func.sum(rows.c[name]).label(name) for name in METRICS)
+        ).group_by(rows.c.user_id, period_start).subquery()
+
+        totals = db.select(
+            delta.c.user_id,
+            delta.c.period_start,
+            *(func.coalesce(table.c[name], 0) + bindparam('sign') * delta.c[name] for name in METRICS)
+        ).select_from(
+            delta.outerjoin(table, and_(
+                table.c.user_id == delta.c.user_id,
+                table.c.period_start == delta.c.period_start
+            ))
+        )
+
+        statements.append(
+            table.insert().prefix_with('OR REPLACE').from_select(['user_id', 'period_start', *METRICS], totals)
+        )
+    return tuple(statements)
+
+
+def adjust_rollups(model, ids=None, sign: int = 1, connection=None) -> None:
+    """
+    Add (``sign=1``) or retract (``sign=-1``) the contributions of the
+    ``model`` rows with the given ``ids`` (all rows if None) to both rollup
+    tables. Runs in the current transaction of ``connection``, or of the
+    session if None; retract before the rows change, add after.
+    """
+
+    params = {'sign': sign}
+    if ids is not None:
+        params['ids'] = list(ids)
+    executor = connection if connection is not None else db.session
+    for stmt in _adjust_statements(model, ids is not None):
+        executor.execute(stmt, params)
+
+
+def rebuild_rollups() -> dict:
+    """
+    Recompute both rollup tables from every event and task, hot and
+    archived, in one transaction. Returns the number of rows per table.
+    """
+
+    for rollup in PERIODS.values():
+        db.session.execute(db.delete(rollup))
+    for model in (Event, ArchivedEvent, Task, ArchivedTask):
+        adjust_rollups(model)
+    db.session.commit()
+
+    return {
+        rollup.__tablename__: db.session.scalar(db.select(func.count()).select_from(rollup))
+        for rollup in PERIODS.values()
+    }
+
+
+def read_rollups(user_id: int, period: str, start: date, end: date) -> list[dict]:
+    """
+    The user's rollups for every day or week (Monday based) overlapping
+    ``[start, end)``, with zeros for periods without activity. Raises
+    ValueError if more than MAX_PERIODS would be returned.
+    """
+
+    rollup = PERIODS[period]
+    step = timedelta(days=1 if period == 'day' else 7)
+    if period == 'week':
+        start -= timedelta(days=start.weekday())
+
+    if (end - start) / step > MAX_PERIODS:
+        raise ValueError(f'Range spans more than {MAX_PERIODS} periods')
+
+    stored = {
+        row.period_start: row
+        for row in db.session.scalars(
+            db.select(rollup).where(
+                rollup.user_id == user_id,
+                rollup.period_start >= start,
+                rollup.period_start < end
+            )
+        )
+    }
+
+    results = []
+    current = start
+    while current < end:
+        row = stored.get(current)
+        if row is not None:
+            results.append(row.to_dict())
+        else:
+            results.append({'period_start': current.isoformat(), **dict.fromkeys(METRICS, 0)})
+        current += step
+    return results
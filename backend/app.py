@@ -34,6 +34,13 @@ def create_app(config_name=None):
     app = Flask(__name__, instance_path=config_obj.INSTANCE_PATH)
     app.config.from_object(config_obj)
 
+    from auth import check_signing_keys
+    check_signing_keys(app.config)
+
+    # JSON with ISO 8601 datetimes; MessagePack is negotiated per request
+    from formats import JSONProvider
+    app.json = JSONProvider(app)
+
     # Initialize extensions
     initialize_extensions(app)
 
@@ -43,10 +50,12 @@ def create_app(config_name=None):
     # Register error handlers
     register_error_handlers(app)
 
-    # Create database tables
-    with app.app_context():
-        from extensions import db
-        db.create_all()
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
+    # Create database tables and indexes
+    initialize_database(app)
 
     # Register root route
     @app.route('/')
@@ -70,11 +79,35 @@ def initialize_extensions(app):
         app (Flask): Flask application instance.
     """
     from extensions import db, cors
+    from notifications import broker
+    from compression import compression
+    from shards import router
+    import ratelimit
+    import coalesce
+    import groupcommit
     from flasgger import Swagger
 
     # Initialize database
     db.init_app(app)
 
+    # Initialize shard routing (no-op unless SHARD_COUNT is set)
+    router.init_app(app)
+
+    # Initialize change notification broker
+    broker.init_app(app)
+
+    # Initialize rate limiting and admission control
+    ratelimit.init_app(app)
+
+    # Initialize coalescing of identical concurrent reads
+    coalesce.init_app(app)
+
+    # Initialize group commit for creates (no-op unless enabled)
+    groupcommit.init_app(app)
+
+    # Initialize response compression
+    compression.init_app(app)
+
     # Initialize CORS
     cors.init_app(app, resources={
         r"/api/*": {"origins": app.config['CORS_ORIGINS']}
@@ -88,6 +121,145 @@ def initialize_extensions(app):
     )
 
 
+def initialize_database(app):
+    """
+    Create database tables and the SQL-level objects (indexes, triggers)
+    that the ORM metadata does not describe, in the main database and in
+    every shard.
+
+    Args:
+        app (Flask): Flask application instance.
+    """
+    from extensions import db
+    from models import DATETIME_STORAGE
+    from shards import router, seed_allocator
+
+    # The column types were fixed when the models were imported; converting
+    # the rows to another format would leave them unreadable
+    if app.config['DATETIME_STORAGE'] != DATETIME_STORAGE:
+        raise RuntimeError(
+            f"DATETIME_STORAGE is {app.config['DATETIME_STORAGE']!r} but the models were imported with "
+            f"{DATETIME_STORAGE!r}; set it in the environment, not in a config class"
+        )
+
+    with app.app_context():
+        prepare_database(app, db.engine, None)
+        for shard in range(router.count):
+            prepare_database(app, router.engine(shard, create=True), shard)
+
+        if router.count:
+            seed_allocator()
+
+
+def prepare_database(app, engine, shard):
+    """
+    Bring one database up to date: the main one (``shard`` None) or a shard.
+
+    Args:
+        app (Flask): Flask application instance.
+        engine: Engine of the database.
+        shard (int | None): Shard number of the database.
+    """
+    from extensions import db
+    from models import DATETIME_STORAGE
+    from archive import reserve_archived_ids
+    from migrations import upgrade_schema, convert_datetime_storage, datetime_conversion_pending
+    from search import install_search_index
+    from shards import drop_global_copies, install_tenant_guard, shard_tables
+    from sync import drop_change_log_triggers, install_change_log
+
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            connection.exec_driver_sql(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+
+    tables = db.metadata.sorted_tables if shard is None else shard_tables()
+    db.metadata.create_all(engine, tables=tables)
+
+    with engine.begin() as connection:
+        if shard is not None:
+            drop_global_copies(connection)
+        upgrade_schema(connection, tables)
+        reserve_archived_ids(connection)
+
+        # Storage conversion is not a data change, keep it out of the change log
+        if datetime_conversion_pending(connection, tables, DATETIME_STORAGE):
+            drop_change_log_triggers(connection)
+            convert_datetime_storage(connection, tables, DATETIME_STORAGE)
+
+        install_search_index(connection)
+        install_change_log(connection)
+        if engine.dialect.name == 'sqlite':
+            install_tenant_guard(connection, shard)
+
+
+# Read-only requests that warm_up sends through the whole stack. The 2000
+# ranges reach past the archive cutoff, so archive queries are warmed too
+WARMUP_PATHS = (
+    '/api/auth/me',
+    '/api/events?start=2000-01-03T00:00:00&end=2000-01-10T00:00:00',
+    '/api/events/0',
+    '/api/events/summary?start=2000-01-03T00:00:00&end=2000-01-10T00:00:00&bucket=day',
+    '/api/events/export.ics?start=2000-01-03T00:00:00',
+    '/api/tasks?start=2000-01-03T00:00:00&end=2000-01-10T00:00:00',
+    '/api/tasks/0',
+    '/api/tasks/next',
+    '/api/analytics?start=2000-01-03&end=2000-01-10',
+    '/api/search?q=warmup',
+    '/api/sync',
+    '/apispec.json',
+)
+
+
+def warm_up(app):
+    """
+    Send WARMUP_PATHS through the app as a user id that does not exist, so
+    SQLAlchemy's compiled statement cache, the Swagger spec and lazy imports
+    are ready before real traffic arrives. Run before forking workers, the
+    warm caches are shared by all of them.
+
+    Args:
+        app (Flask): Flask application instance.
+    """
+    from auth import encode_token
+
+    control = app.extensions['admission']
+    enabled, control.enabled = control.enabled, False
+    try:
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {encode_token(0)}'}
+        client = app.test_client()
+        for path in WARMUP_PATHS:
+            response = client.get(path, headers=headers)
+            response.close()
+            if response.status_code >= 500:
+                app.logger.warning('Warm-up request %s failed with %s', path, response.status_code)
+    except Exception:
+        # A cold cache only costs latency, never refuse to start over it
+        app.logger.exception('Warm-up failed')
+    finally:
+        control.enabled = enabled
+
+
+def reset_after_fork(app):
+    """
+    Drop state a forked worker must not share with the process that
+    created the app: pooled database connections (shards included), reserved
+    id blocks and the notification broker's poller.
+
+    Args:
+        app (Flask): Flask application instance.
+    """
+    from extensions import db
+    from notifications import broker
+    from shards import router
+
+    with app.app_context():
+        # close=False leaves the parent's connections alone
+        db.engine.dispose(close=False)
+    router.after_fork()
+    broker.after_fork()
+
+
 def register_blueprints(app):
     """
     Register Flask blueprints with the app instance.
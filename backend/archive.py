@@ -0,0 +1,132 @@
+"""
+Archival of old events and completed tasks.
+
+Rows older than ARCHIVE_AFTER_DAYS are moved, with their ids, from ``events``
+and ``tasks`` into ``events_archive`` and ``tasks_archive`` so the hot tables
+and their indexes only hold what day-to-day queries touch. Rows move in
+ARCHIVE_BATCH_SIZE chunks, one short transaction each, so a run can go on in
+the background (``flask archive`` from cron) without holding up requests.
+
+Archived rows are read-only. Read routes only query the archive when the
+requested range starts before the cutoff: an archived event ended before it,
+and an archived task was due before it (or has no due date).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import func, and_, or_, text
+from extensions import db
+from models import ArchivedEvent, ArchivedTask, Event, Task
+
+
+# Archive table model for each hot table model
+ARCHIVES = {
+    Event: ArchivedEvent,
+    Task: ArchivedTask,
+}
+
+
+def archive_cutoff() -> datetime:
+    """Rows that ended/were due before this may live in the archive."""
+
+    return datetime.now(timezone.utc) - timedelta(days=current_app.config['ARCHIVE_AFTER_DAYS'])
+
+
+def reaches_archive(start_dt: datetime | None) -> bool:
+    """Whether a query for rows from ``start_dt`` on has to include the archive."""
+
+    return start_dt is None or start_dt < archive_cutoff()
+
+
+def models_for(model, start_dt: datetime | None) -> list:
+    """``model`` plus its archive model when ``start_dt`` reaches back that far."""
+
+    return [model, ARCHIVES[model]] if reaches_archive(start_dt) else [model]
+
+
+def reserve_archived_ids(connection) -> None:
+    """
+    Move each hot table's AUTOINCREMENT counter past the ids in its archive,
+    so new rows never take an archived id. Only needed once for databases
+    archived before the hot tables were AUTOINCREMENT; read only otherwise.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for model, archived_model in ARCHIVES.items():
+        highest = connection.execute(db.select(func.max(
+            db.select(func.coalesce(func.max(model.id), 0)).scalar_subquery(),
+            db.select(func.coalesce(func.max(archived_model.id), 0)).scalar_subquery()
+        ))).scalar()
+        if not highest:
+            continue
+
+        name = model.__tablename__
+        current = connection.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = :name"), {'name': name}
+        ).scalar()
+        if current is None:
+            connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                               {'name': name, 'seq': highest})
+        elif current < highest:
+            connection.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :name"),
+                               {'name': name, 'seq': highest})
+
+
+def _archivable(model, cutoff: datetime):
+    if model is Event:
+        return Event.end_time < cutoff
+    return and_(
+        Task.completed_at < cutoff,
+        or_(Task.due_datetime.is_(None), Task.due_datetime < cutoff)
+    )
+
+
+def _move_batch(model, cutoff: datetime, batch_size: int) -> int:
+    table = model.__table__
+    archive_table = ARCHIVES[model].__table__
+
+    ids = db.session.scalars(
+        db.select(model.id).where(_archivable(model, cutoff)).order_by(model.id).limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+
+    # A row may have changed since it was picked (an event moved, a task
+    # reopened), so both statements check again. The INSERT takes the write
+    # lock, so the DELETE sees the same rows
+    columns = [column.name for column in table.columns]
+    moving = and_(table.c.id.in_(ids), _archivable(model, cutoff))
+    db.session.execute(
+        db.insert(archive_table).from_select(
+            columns,
+            db.select(*(table.c[name] for name in columns)).where(moving)
+        )
+    )
+    moved = db.session.execute(db.delete(table).where(moving)).rowcount
+    db.session.commit()
+    return moved
+
+
+def archive_old_rows() -> dict:
+    """
+    Move every archivable event and task to the archive tables, one
+    ARCHIVE_BATCH_SIZE transaction at a time. Returns the number of rows
+    moved per table.
+    """
+
+    cutoff = archive_cutoff()
+    batch_size = current_app.config['ARCHIVE_BATCH_SIZE']
+
+    moved = {}
+    for model in ARCHIVES:
+        total = 0
+        while True:
+            count = _move_batch(model, cutoff, batch_size)
+            total += count
+            if count < batch_size:
+                break
+        moved[model.__tablename__] = total
+    return moved
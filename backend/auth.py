@@ -0,0 +1,141 @@
+"""
+Stateless JWT authentication.
+
+Tokens carry the user id in ``sub``; verifying one is a signature check
+against a key that is prepared once and cached, so authenticating a request
+never touches the database.
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
+
+import jwt
+from flask import current_app, g, request, jsonify
+from config import DEV_SECRET_KEY
+from extensions import db
+from models import User
+
+
+def public(view):
+    """Mark a view as reachable without an access token."""
+
+    view.is_public = True
+    return view
+
+
+def allow_query_token(view):
+    """
+    Also accept the token as an ``access_token`` query parameter, for
+    clients such as EventSource that cannot set request headers.
+    """
+
+    view.allow_query_token = True
+    return view
+
+
+def admin_only(view):
+    """
+    Restrict a view to users whose email is listed in ADMIN_EMAILS. Unlike
+    authentication this loads the user, so keep it to rarely called views.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = db.session.get(User, g.user_id)
+        if user is None or user.email not in current_app.config['ADMIN_EMAILS']:
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+@lru_cache(maxsize=8)
+def _prepared_key(algorithm: str, key_material: str):
+    # Parsing PEM keys is expensive; do it once per key instead of per request
+    return jwt.get_algorithm_by_name(algorithm).prepare_key(key_material)
+
+
+def _signing_key(config):
+    algorithm = config['JWT_ALGORITHM']
+    material = config['JWT_PRIVATE_KEY'] or config['JWT_SECRET_KEY']
+    return _prepared_key(algorithm, material)
+
+
+def _verification_key(config):
+    algorithm = config['JWT_ALGORITHM']
+    material = config['JWT_PUBLIC_KEY'] or config['JWT_SECRET_KEY']
+    return _prepared_key(algorithm, material)
+
+
+def check_signing_keys(config) -> None:
+    """
+    With REQUIRE_SIGNING_KEYS, raise RuntimeError unless tokens are signed
+    with a configured key: anyone can forge tokens signed with the public
+    development default.
+    """
+
+    if not config['REQUIRE_SIGNING_KEYS']:
+        return
+
+    if config['JWT_ALGORITHM'].startswith('HS'):
+        if not config['JWT_SECRET_KEY'] or config['JWT_SECRET_KEY'] == DEV_SECRET_KEY:
+            raise RuntimeError('Set JWT_SECRET_KEY (or SECRET_KEY) to a secret value before starting in production')
+    elif not config['JWT_PRIVATE_KEY'] or not config['JWT_PUBLIC_KEY']:
+        raise RuntimeError(f"{config['JWT_ALGORITHM']} needs JWT_PRIVATE_KEY and JWT_PUBLIC_KEY")
+
+
+def encode_token(user_id: int) -> str:
+    """Issue an access token for ``user_id``."""
+
+    config = current_app.config
+    now = datetime.now(timezone.utc)
+    claims = {
+        'sub': str(user_id),
+        'iat': now,
+        'exp': now + timedelta(seconds=config['JWT_EXPIRES_SECONDS']),
+    }
+    return jwt.encode(claims, _signing_key(config), algorithm=config['JWT_ALGORITHM'])
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verify ``token`` and return its claims.
+    Raises jwt.InvalidTokenError if it is malformed, forged or expired.
+    """
+
+    config = current_app.config
+    return jwt.decode(
+        token,
+        _verification_key(config),
+        algorithms=[config['JWT_ALGORITHM']],
+        options={'require': ['sub', 'exp']}
+    )
+
+
+def authenticate():
+    """
+    ``before_request`` hook: resolve the bearer token into ``g.user_id``
+    or reject the request with 401. Views marked ``@public`` are skipped.
+    """
+
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None or getattr(view, 'is_public', False) or request.method == 'OPTIONS':
+        return None
+
+    token = None
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        token = header[len('Bearer '):].strip()
+    elif getattr(view, 'allow_query_token', False):
+        token = request.args.get('access_token')
+
+    if not token:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    try:
+        claims = decode_token(token)
+        g.user_id = int(claims['sub'])
+    except (jwt.InvalidTokenError, ValueError):
+        return jsonify({'error': 'Invalid or expired token'}), 401
+
+    return None
@@ -0,0 +1,203 @@
+"""
+Online backups of the SQLite database.
+
+``backup_database`` copies the live database with SQLite's backup API while
+the app keeps serving, BACKUP_STEP_PAGES pages per step with a short pause
+between steps. In WAL mode (the default, see SQLITE_JOURNAL_MODE) the copy
+runs inside one read transaction. That makes it a consistent snapshot of
+the moment the backup started, writers are never blocked, and writes
+made meanwhile do not restart it. In other journal modes each step holds a
+shared lock only for its own pages, so writers get in between steps; their
+writes restart the copy, which finishes in a single step after
+MAX_RESTARTS restarts.
+
+Backups can be gzip-compressed. ``restore_database`` takes either form,
+checks it and copies it back into the live database, again through the
+backup API. With sharding, ``backup_databases`` backs up every shard next
+to the main database; each file is consistent on its own, and so is every
+user's data, since it lives in a single shard.
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from extensions import db
+from shards import router
+
+
+# Restarts (caused by other connections writing) before a backup outside
+# WAL mode copies the rest in one step, holding its shared lock throughout
+MAX_RESTARTS = 3
+
+
+class BackupError(Exception):
+    """A backup or restore that could not be carried out."""
+
+
+class _Restarted(Exception):
+    pass
+
+
+def default_backup_path(compress: bool = False) -> str:
+    """A new timestamped file name in BACKUP_DIR."""
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+    name = f'database-{stamp}.db' + ('.gz' if compress else '')
+    return os.path.join(current_app.config['BACKUP_DIR'], name)
+
+
+def shard_backup_path(destination: str, shard: int | None) -> str:
+    """``destination`` for the main database, with ``-shard-N`` before its extension for shard N."""
+
+    if shard is None:
+        return destination
+    gz = '.gz' if destination.endswith('.gz') else ''
+    root, extension = os.path.splitext(destination[:len(destination) - len(gz)])
+    return f'{root}-shard-{shard}{extension}{gz}'
+
+
+def _copy(source, target, step_pages: int, pause: float) -> int:
+    """Copy ``source`` into ``target`` step by step; returns the page count."""
+
+    state = {'remaining': None, 'total': 0, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _Restarted
+        state['remaining'] = remaining
+        state['total'] = total
+        time.sleep(pause)
+
+    try:
+        source.backup(target, pages=step_pages, progress=progress)
+    except _Restarted:
+        source.backup(target)
+        state['total'] = target.execute('PRAGMA page_count').fetchone()[0]
+    return state['total']
+
+
+def _check(connection, name: str) -> None:
+    result = connection.execute('PRAGMA integrity_check').fetchone()[0]
+    if result != 'ok':
+        raise BackupError(f'{name} failed its integrity check: {result}')
+
+
+def backup_database(destination: str, compress: bool = False, engine=None) -> dict:
+    """
+    Copy the live database (the main one unless ``engine`` is given) to
+    ``destination``, gzip-compressed with ``compress``, without stopping
+    the app. The copy is checked before it is moved into place. Returns the
+    file name, its size in bytes, the number of pages copied and the
+    seconds taken.
+    """
+
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        raise BackupError('Online backups are only supported for SQLite databases')
+
+    config = current_app.config
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    partial = destination + '.partial'
+    started = time.monotonic()
+
+    with engine.connect() as connection:
+        source = connection.connection.driver_connection
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        target = sqlite3.connect(partial)
+        try:
+            if wal:
+                # Pin one snapshot for the whole copy
+                source.execute('BEGIN')
+                source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+            try:
+                pages = _copy(source, target, config['BACKUP_STEP_PAGES'], config['BACKUP_STEP_PAUSE_MS'] / 1000)
+            finally:
+                if wal:
+                    source.rollback()
+
+            # A standalone file, without the -wal/-shm companions
+            target.execute('PRAGMA journal_mode=DELETE')
+            _check(target, 'The backup')
+        except BaseException:
+            target.close()
+            os.remove(partial)
+            raise
+        target.close()
+
+    if compress:
+        with open(partial, 'rb') as raw, gzip.open(partial + '.gz', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.remove(partial)
+        os.replace(partial + '.gz', destination)
+    else:
+        os.replace(partial, destination)
+
+    return {
+        'file': destination,
+        'bytes': os.path.getsize(destination),
+        'pages': pages,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def backup_databases(destination: str, compress: bool = False) -> list[dict]:
+    """
+    ``backup_database`` of the main database to ``destination`` and of
+    every shard next to it (see ``shard_backup_path``). Each result also
+    names its ``shard`` (None for the main database).
+    """
+
+    results = []
+    for shard in router.shard_ids():
+        result = backup_database(shard_backup_path(destination, shard), compress, router.database(shard))
+        results.append({**result, 'shard': shard})
+    return results
+
+
+def restore_database(source: str, engine=None) -> int:
+    """
+    Replace the contents of the live database (the main one unless
+    ``engine`` is given) with the backup in ``source``, gzip-compressed if
+    it ends in .gz, after checking it. Other connections wait (up to
+    SQLITE_BUSY_TIMEOUT) while the pages are copied. Returns the number of
+    pages restored.
+    """
+
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        raise BackupError('Online restores are only supported for SQLite databases')
+    if not os.path.isfile(source):
+        raise BackupError(f'No backup at {source}')
+
+    unpacked = None
+    path = source
+    try:
+        if source.endswith('.gz'):
+            handle, unpacked = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(source)))
+            with os.fdopen(handle, 'wb') as raw, gzip.open(source, 'rb') as packed:
+                shutil.copyfileobj(packed, raw, 1024 * 1024)
+            path = unpacked
+
+        backup = sqlite3.connect(path)
+        try:
+            try:
+                _check(backup, source)
+            except sqlite3.DatabaseError as e:
+                raise BackupError(f'{source} is not a database backup: {e}') from e
+
+            with engine.connect() as connection:
+                backup.backup(connection.connection.driver_connection)
+            return backup.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            backup.close()
+    finally:
+        if unpacked is not None:
+            os.remove(unpacked)
@@ -0,0 +1,52 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks are run by hand from the backend directory, e.g.
+``python -m bench.search``, and print their results; they are not part of
+the test suite. Each builds the app on a fresh SQLite file, so numbers
+include real disk writes, with rate limiting and admission control off.
+"""
+
+import os
+import tempfile
+import timeit
+
+from config import TestingConfig, config
+
+
+def make_app(path: str | None = None, **settings):
+    """The app on a new database file at ``path`` (a temporary one by default), with ``settings`` applied."""
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+    elif os.path.exists(path):
+        os.remove(path)
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+        RATELIMIT_ENABLED = False
+
+    for name, value in settings.items():
+        setattr(BenchConfig, name, value)
+    config['bench'] = BenchConfig
+
+    from app import create_app
+    app = create_app('bench')
+    app.extensions['admission'].enabled = False
+    return app
+
+
+def register(app, email: str = 'bench@example.com'):
+    """A test client authenticated as a new user, and the user's id."""
+
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={'email': email, 'password': 'password123'})
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + response.json['access_token']
+    return client, client.get('/api/auth/me').json['id']
+
+
+def best_of(function, number: int, repeat: int = 5) -> float:
+    """Seconds per call of ``function``: the best of ``repeat`` runs of ``number`` calls."""
+
+    function()
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
@@ -0,0 +1,96 @@
+"""
+Text against integer epoch datetime storage (DATETIME_STORAGE).
+
+    python -m bench.datetime_storage [rows]
+
+The mode is read when the models are imported, so each mode runs in its
+own process. Both seed ``rows`` (default 200,000) events on a file
+database, then time week-range queries through the ix_events_user_start
+index, loading and serializing rows with to_dict(), and GET /api/events
+over a month, and report the database size.
+"""
+
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+MODES = ('text', 'epoch')
+BATCH_SIZE = 50_000
+
+
+def run(rows):
+    from bench.common import best_of, make_app, register
+    from extensions import db
+    from models import DATETIME_STORAGE, Event
+
+    app = make_app()
+    client, user_id = register(app)
+    base = datetime(2020, 1, 1)
+
+    with app.app_context():
+        for start in range(0, rows, BATCH_SIZE):
+            db.session.execute(db.insert(Event), [
+                {
+                    'user_id': user_id,
+                    'title': f'event {i}',
+                    '_start_time': base + timedelta(minutes=37 * i),
+                    '_end_time': base + timedelta(minutes=37 * i + 60),
+                    'all_day': False,
+                }
+                for i in range(start, min(start + BATCH_SIZE, rows))
+            ])
+            db.session.commit()
+
+        rng = random.Random(1)
+        days = (timedelta(minutes=37 * rows) // timedelta(days=1)) - 7
+        weeks = []
+        for _ in range(300):
+            start = base.replace(tzinfo=timezone.utc) + timedelta(days=rng.randint(0, days))
+            weeks.append((start, start + timedelta(days=7)))
+
+        def range_queries():
+            for start, end in weeks:
+                db.session.execute(
+                    db.select(Event.id).where(Event.user_id == user_id, Event.start_time < end, Event.end_time > start)
+                ).all()
+
+        def load_and_serialize():
+            db.session.expunge_all()
+            events = db.session.scalars(db.select(Event).where(Event.user_id == user_id).limit(20_000)).all()
+            for event in events:
+                event.to_dict()
+
+        results = {
+            'range': best_of(range_queries, number=1, repeat=3),
+            'load': best_of(load_and_serialize, number=1, repeat=3),
+        }
+        # Sizes are compared once everything is in the main file
+        db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        path = db.engine.url.database
+
+    month = '/api/events?start=2020-03-01T00:00:00&end=2020-04-01T00:00:00'
+    results['get'] = best_of(lambda: client.get(month), number=10)
+    print(
+        f'{DATETIME_STORAGE:5}  300 week ranges {results["range"] * 1000:7.0f} ms'
+        f'  load+to_dict 20k rows {results["load"] * 1000:6.0f} ms'
+        f'  GET a month {results["get"] * 1000:6.1f} ms'
+        f'  database {os.path.getsize(path) / 1e6:5.1f} MB'
+    )
+
+
+def main(rows):
+    for mode in MODES:
+        subprocess.run(
+            [sys.executable, '-m', 'bench.datetime_storage', str(rows), '--run'],
+            env={**os.environ, 'DATETIME_STORAGE': mode}, check=True,
+        )
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    if '--run' in sys.argv:
+        run(rows)
+    else:
+        main(rows)
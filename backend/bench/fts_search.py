@@ -0,0 +1,122 @@
+"""
+Full-text search at scale: GET /api/search against a LIKE scan.
+
+    python -m bench.fts_search [rows]
+
+Seeds ``rows`` (default one million) events and tasks for one user, with
+titles, descriptions and locations drawn from a synthetic vocabulary, then
+times search() for common, rare, prefix and multi-term queries, a date
+range and a deep page, next to a LIKE filter returning the first 20
+unranked substring matches. bm25 ranks every row matching the query, so
+search time grows with the number of matches, which is printed too.
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from bench.common import best_of, make_app, register
+from extensions import db
+from models import Event, Task
+from search import build_match_query, search
+
+BATCH_SIZE = 50_000
+# Word frequencies are skewed, as in real text: a few words are everywhere
+COMMON_WORDS = ['meeting', 'review', 'team', 'weekly', 'project', 'call', 'report', 'planning']
+RARE_WORDS = [f'{syllable}{suffix}' for syllable in ('zor', 'quil', 'brant', 'vex', 'mor', 'tal')
+              for suffix in ('ax', 'ine', 'ope', 'ul', 'ent')]
+WORDS = [f'word{i}' for i in range(5000)]
+
+
+def _text(rng, length):
+    words = []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < 0.2:
+            words.append(rng.choice(COMMON_WORDS))
+        elif roll < 0.2005:
+            words.append(rng.choice(RARE_WORDS))
+        else:
+            words.append(rng.choice(WORDS))
+    return ' '.join(words)
+
+
+def seed(user_id, rows):
+    rng = random.Random(1)
+    base = datetime(2020, 1, 1)
+    for model in (Event, Task):
+        for start in range(0, rows // 2, BATCH_SIZE):
+            batch = []
+            for i in range(start, min(start + BATCH_SIZE, rows // 2)):
+                when = base + timedelta(minutes=7 * i)
+                row = {
+                    'user_id': user_id,
+                    'title': _text(rng, 4),
+                    'description': _text(rng, 20),
+                    'location': f'Room {rng.randint(1, 300)}',
+                }
+                if model is Event:
+                    row.update(_start_time=when, _end_time=when + timedelta(hours=1), all_day=False)
+                else:
+                    row['_due_datetime'] = when
+                batch.append(row)
+            db.session.execute(db.insert(model), batch)
+            db.session.commit()
+
+
+def like_scan(user_id, term):
+    # A substring filter, stopping at the first 20 hits it finds
+    hits = []
+    for model in (Event, Task):
+        pattern = f'%{term}%'
+        hits += db.session.scalars(
+            db.select(model.id)
+            .where(model.user_id == user_id,
+                   or_(model.title.like(pattern), model.description.like(pattern), model.location.like(pattern)))
+            .limit(20)
+        ).all()
+    return hits
+
+
+def matches(query):
+    match = build_match_query(query)
+    return sum(
+        db.session.execute(db.text(f'SELECT count(*) FROM {name} WHERE {name} MATCH :match'), {'match': match}).scalar()
+        for name in ('events_fts', 'tasks_fts')
+    )
+
+
+def main(rows):
+    app = make_app()
+    client, user_id = register(app)
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed(user_id, rows)
+        print(f'seeded {rows:,} rows with their FTS5 index in {time.perf_counter() - started:.0f}s')
+
+        queries = [
+            ('common term', {'query': 'meeting'}),
+            ('rare term', {'query': 'zorax'}),
+            ('prefix', {'query': 'plan'}),
+            ('two terms', {'query': 'weekly review'}),
+            ('date range', {'query': 'meeting', 'start_dt': datetime(2021, 1, 1), 'end_dt': datetime(2021, 2, 1)}),
+            ('page 50', {'query': 'meeting', 'page': 50}),
+        ]
+        for label, arguments in queries:
+            seconds = best_of(lambda: search(user_id, **arguments), number=5)
+            print(f'search {label:12} {seconds * 1000:8.2f} ms  ({matches(arguments["query"]):,} matching rows)')
+
+        for label, term in (('common term', 'meeting'), ('rare term', 'zorax')):
+            seconds = best_of(lambda: like_scan(user_id, term), number=1, repeat=3)
+            print(f'LIKE   {label:12} {seconds * 1000:8.2f} ms  (first 20, unranked)')
+
+    seconds = best_of(lambda: client.get('/api/search?q=weekly%20review'), number=5)
+    print(f'GET /api/search?q=weekly review {seconds * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
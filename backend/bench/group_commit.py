@@ -0,0 +1,59 @@
+"""
+Inserts per second with and without GROUP_COMMIT_ENABLED.
+
+    python -m bench.group_commit [requests]
+
+For each mode and each concurrency level, threads send ``requests``
+(default 1600) POST /api/events in total through the full stack, on a
+file database, and every request must get its 201.
+"""
+
+import sys
+import threading
+import time
+
+from bench.common import make_app, register
+
+CONCURRENCY = (1, 4, 16, 64)
+EVENT = {'title': 'Standup', 'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T11:00:00Z'}
+
+
+def inserts_per_second(app, token, concurrency, requests):
+    per_thread = requests // concurrency
+    failures = []
+
+    def write():
+        client = app.test_client()
+        for _ in range(per_thread):
+            response = client.post('/api/events', json=EVENT, headers={'Authorization': token})
+            if response.status_code != 201:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=write) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    assert not failures, failures
+    return per_thread * concurrency / elapsed
+
+
+def main(requests):
+    print('concurrency   ' + ''.join(f'{concurrency:>8}' for concurrency in CONCURRENCY))
+    for label, enabled in (('per-request', False), ('group commit', True)):
+        app = make_app(
+            GROUP_COMMIT_ENABLED=enabled,
+            MAX_CONCURRENT_REQUESTS=1000,
+            SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30}},
+        )
+        client, _ = register(app)
+        token = client.environ_base['HTTP_AUTHORIZATION']
+        rates = [inserts_per_second(app, token, concurrency, requests) for concurrency in CONCURRENCY]
+        print(f'{label:14}' + ''.join(f'{rate:8.0f}' for rate in rates) + '  inserts/s')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1600)
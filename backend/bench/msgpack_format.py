@@ -0,0 +1,61 @@
+"""
+MessagePack against JSON responses (Accept: application/msgpack).
+
+    python -m bench.msgpack_format [events]
+
+Encodes ``events`` (default 1000) event dicts from to_dict() both ways
+and reports body size (raw and gzipped), encode and decode time, and
+the time of GET /api/events for them in each format.
+"""
+
+import gzip
+import json
+import sys
+
+import msgpack
+
+from bench.common import best_of, make_app, register
+from extensions import db
+from formats import _msgpack_default
+from models import Event
+
+
+def main(count):
+    app = make_app()
+    client, _ = register(app)
+    for i in range(count):
+        day = f'2026-01-{1 + i % 28:02d}'
+        client.post('/api/events', json={
+            'title': f'event {i}', 'description': 'weekly sync with the team', 'location': 'Room 4',
+            'start_time': f'{day}T10:00:00', 'end_time': f'{day}T11:00:00',
+        })
+
+    with app.app_context():
+        events = [event.to_dict() for event in db.session.scalars(db.select(Event))]
+        json_body = app.json.dumps(events).encode()
+        msgpack_body = msgpack.packb(events, datetime=True, default=_msgpack_default)
+
+        print(f'{count} events    {"JSON":>10} {"msgpack":>10}')
+        print(f'bytes         {len(json_body):10,} {len(msgpack_body):10,}')
+        print(f'gzip bytes    {len(gzip.compress(json_body)):10,} {len(gzip.compress(msgpack_body)):10,}')
+        encode = (
+            best_of(lambda: app.json.dumps(events), number=20),
+            best_of(lambda: msgpack.packb(events, datetime=True, default=_msgpack_default), number=20),
+        )
+        print(f'encode ms     {encode[0] * 1000:10.2f} {encode[1] * 1000:10.2f}')
+        decode = (
+            best_of(lambda: json.loads(json_body), number=20),
+            best_of(lambda: msgpack.unpackb(msgpack_body, timestamp=3), number=20),
+        )
+        print(f'decode ms     {decode[0] * 1000:10.2f} {decode[1] * 1000:10.2f}')
+
+    url = '/api/events?start=2026-01-01T00:00:00&end=2026-02-01T00:00:00'
+    get = [
+        best_of(lambda: client.get(url, headers={'Accept': accept}), number=10)
+        for accept in ('application/json', 'application/msgpack')
+    ]
+    print(f'GET ms        {get[0] * 1000:10.2f} {get[1] * 1000:10.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
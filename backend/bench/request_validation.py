@@ -0,0 +1,103 @@
+"""
+Request validation cost on the write routes.
+
+    python -m bench.request_validation [other-backend-dir ...]
+
+Times valid and invalid event and task writes and a conflicts check
+through the full stack on an in-memory database, for this tree and for
+each given backend directory, e.g. a ``git worktree`` of the commit before
+the schemas to compare against the hand-written per-route checks. Each
+tree runs in its own process, importing only its own modules. Then times
+the schemas on their own, and parse_datetime against plain
+``fromisoformat`` + ``replace(tzinfo=...)``.
+"""
+
+import os
+import subprocess
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENT = {
+    'title': ' Standup ', 'description': 'Daily', 'location': 'Room 4',
+    'start_time': '2026-01-01T10:00:00', 'end_time': '2026-01-01T11:00:00', 'all_day': False,
+}
+BAD_EVENT = {'title': 'Standup', 'start_time': '2026-01-02T10:00:00', 'end_time': '2026-01-01T11:00:00'}
+TASK = {'title': 'Report', 'description': 'Numbers', 'due_datetime': '2026-01-03T17:00:00', 'estimated_minutes': 30}
+INTERVALS = {'intervals': [
+    {'start_time': f'2026-02-{day:02d}T10:00:00', 'end_time': f'2026-02-{day:02d}T11:00:00'} for day in range(1, 29)
+] * 10}
+
+
+def _per_call(function, number):
+    function()
+    return min(timeit.repeat(function, number=number, repeat=3)) / number
+
+
+def run(tree):
+    # Imports come from ``tree`` only, not from this directory
+    sys.path[0] = tree
+    from app import create_app
+
+    app = create_app('testing')
+    if 'admission' in app.extensions:
+        app.extensions['admission'].enabled = False
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={'email': 'bench@example.com', 'password': 'password123'})
+    client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + response.json['access_token']
+    event_id = client.post('/api/events', json=EVENT).json['id']
+    update = {'start_time': '2026-01-01T09:00:00', 'end_time': '2026-01-01T12:00:00'}
+
+    requests = [
+        ('POST /api/events', lambda: client.post('/api/events', json=EVENT), 1000),
+        ('POST /api/events (400)', lambda: client.post('/api/events', json=BAD_EVENT), 2000),
+        ('PUT /api/events/<id>', lambda: client.put(f'/api/events/{event_id}', json=update), 1000),
+        ('POST /api/tasks', lambda: client.post('/api/tasks', json=TASK), 1000),
+        ('POST /api/events/conflicts (280)', lambda: client.post('/api/events/conflicts', json=INTERVALS), 200),
+    ]
+    print(tree)
+    for label, function, number in requests:
+        print(f'  {label:34} {_per_call(function, number) * 1e6:7.0f} us')
+
+
+def validation_timings():
+    from datetime import datetime, timezone
+
+    from validation import EVENT_SCHEMA, INTERVAL_SCHEMA, TASK_SCHEMA, ValidationError, parse_datetime
+
+    def invalid():
+        try:
+            EVENT_SCHEMA.validate(BAD_EVENT)
+        except ValidationError:
+            pass
+
+    schemas = [
+        ('EVENT_SCHEMA.validate', lambda: EVENT_SCHEMA.validate(EVENT)),
+        ('EVENT_SCHEMA.validate (error)', invalid),
+        ('TASK_SCHEMA.validate', lambda: TASK_SCHEMA.validate(TASK)),
+        ('INTERVAL_SCHEMA.validate_many (280)', lambda: INTERVAL_SCHEMA.validate_many(INTERVALS['intervals'])),
+    ]
+    for label, function in schemas:
+        print(f'{label:36} {_per_call(function, 2000) * 1e6:7.1f} us')
+
+    def plain(value):
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+    for value in ('2026-01-01T10:00:00', '2026-01-01T10:00:00Z'):
+        fast = _per_call(lambda: parse_datetime(value), 200_000)
+        slow = _per_call(lambda: plain(value), 200_000)
+        print(f'parse_datetime({value!r:24}) {fast * 1e9:5.0f} ns, fromisoformat + replace {slow * 1e9:5.0f} ns')
+
+
+def main(trees):
+    for tree in [HERE, *trees]:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run', os.path.abspath(tree)], check=True)
+    validation_timings()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        run(sys.argv[2])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,56 @@
+"""
+Memory-bounded iteration over large result sets.
+
+``db.session.scalars(stmt).all()`` is fine for a page of results, but a job
+walking every event or task would hold the whole table in memory (and, for
+ORM instances, in the session's identity map). ``iter_chunks`` streams a
+statement from a single cursor with ``yield_per`` instead, BULK_CHUNK_SIZE
+rows at a time, and expunges ORM instances once their chunk is done, so
+memory use depends on the chunk size rather than on the table size.
+"""
+
+from flask import current_app
+from extensions import db
+
+
+def _selects_entity(stmt) -> bool:
+    # select(Event) rather than select(Event.id, ...) or select(Event, Task)
+    descriptions = stmt.column_descriptions
+    return len(descriptions) == 1 and descriptions[0]['expr'] is descriptions[0]['entity']
+
+
+def iter_chunks(stmt, chunk_size: int | None = None):
+    """
+    Yield the results of ``stmt`` in lists of at most ``chunk_size`` items
+    (BULK_CHUNK_SIZE by default). Selecting a single entity yields
+    instances, other statements yield rows.
+
+    Before the next chunk is fetched, pending changes are flushed and the
+    previous chunk's instances are expunged; they stay usable as detached
+    objects but are no longer tracked. Commit once the iteration is done:
+    the cursor is open until then.
+    """
+
+    size = chunk_size or current_app.config['BULK_CHUNK_SIZE']
+    entities = _selects_entity(stmt)
+
+    result = db.session.execute(stmt.execution_options(yield_per=size))
+    if entities:
+        result = result.scalars()
+
+    try:
+        for chunk in result.partitions():
+            yield chunk
+            if entities:
+                db.session.flush()
+                for instance in chunk:
+                    db.session.expunge(instance)
+    finally:
+        result.close()
+
+
+def iter_rows(stmt, chunk_size: int | None = None):
+    """Like ``iter_chunks``, but yield the instances or rows one at a time."""
+
+    for chunk in iter_chunks(stmt, chunk_size):
+        yield from chunk
@@ -0,0 +1,150 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+When the same user sends the same read several times at once (a dashboard
+opened in several tabs, a client retrying a slow range query) there is no
+point running the query and serializing the result once per request. The
+first request runs the view; identical requests arriving while it is in
+flight wait for it and answer with a copy of its response. Requests are
+identical when they have the same user, method, path, query string and
+negotiated response format.
+
+Only requests overlapping in time are coalesced; nothing is cached once the
+response is ready. A write by a user (any non-GET request) detaches that
+user's in-flight reads, so a read sent after the write's response arrived
+never joins a query that started before the write. Flights are per worker
+process.
+"""
+
+import threading
+from functools import wraps
+
+from flask import current_app, g, request
+
+
+# How long an identical request waits for the running one before running
+# the view itself
+WAIT_SECONDS = 30
+
+
+class Flight:
+    """
+    One running view call. ``done`` is set once it returned; ``response`` is
+    then its body, status and headers, or None if it cannot be shared.
+    """
+
+    __slots__ = ('done', 'response')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class SingleFlight:
+    """In-flight reads keyed by request identity, plus counters for GET /api/admin/metrics."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._executed = 0
+        self._coalesced = 0
+        self._fallbacks = 0
+
+    def join(self, key) -> tuple[Flight, bool]:
+        """The flight for ``key`` and whether the caller leads it (must run the view)."""
+
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self._executed += 1
+                return flight, True
+            self._coalesced += 1
+            return flight, False
+
+    def land(self, key, flight: Flight) -> None:
+        """Wake up the requests waiting on ``flight`` and stop accepting new ones."""
+
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def forget_user(self, user_id) -> None:
+        """Let new requests from ``user_id`` start their own flights."""
+
+        with self._lock:
+            for key in [key for key in self._flights if key[0] == user_id]:
+                del self._flights[key]
+
+    def fell_back(self) -> None:
+        with self._lock:
+            self._fallbacks += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'in_flight': len(self._flights),
+                'executed': self._executed,
+                'coalesced': self._coalesced,
+                'fallbacks': self._fallbacks,
+            }
+
+
+def init_app(app):
+    """Attach the single-flight table to ``app``."""
+
+    app.extensions['coalescing'] = SingleFlight(app.config['COALESCING_ENABLED'])
+
+
+def _snapshot(response):
+    # Taken before after_request hooks (e.g. compression) modify the response
+    if response.is_streamed or response.direct_passthrough:
+        return None
+    return response.get_data(), response.status_code, list(response.headers)
+
+
+def coalesced(view):
+    """
+    Let identical concurrent requests to ``view`` share one call. Only for
+    read views whose response depends on nothing but the user and the URL.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        flights = current_app.extensions['coalescing']
+        if not flights.enabled:
+            return view(*args, **kwargs)
+
+        key = (g.user_id, request.method, request.full_path, g.get('response_mimetype'))
+        flight, leader = flights.join(key)
+
+        if leader:
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+                flight.response = _snapshot(response)
+                return response
+            finally:
+                flights.land(key, flight)
+
+        if flight.done.wait(WAIT_SECONDS) and flight.response is not None:
+            body, status, headers = flight.response
+            return current_app.response_class(body, status=status, headers=headers)
+
+        # The leader failed, timed out or streamed its response
+        flights.fell_back()
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def forget_after_write(response):
+    """``after_request`` hook: a write detaches the user's in-flight reads."""
+
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        user_id = g.get('user_id')
+        if user_id is not None:
+            current_app.extensions['coalescing'].forget_user(user_id)
+    return response
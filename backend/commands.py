@@ -0,0 +1,164 @@
+"""
+Flask CLI commands for maintenance tasks (run with ``flask --app app <command>``).
+"""
+
+import click
+from extensions import db
+from analytics import rebuild_rollups
+from archive import ARCHIVES, archive_old_rows
+from backup import BackupError, backup_databases, default_backup_path, restore_database
+from grading import regrade_tasks
+from models import Event, Task, User
+from shards import (
+    router, each_database, move_tenant, plan_rebalance, shard_label, tenant_loads,
+)
+
+
+def register_commands(app):
+    """
+    Register maintenance commands on the app's CLI.
+
+    Args:
+        app (Flask): Flask application instance.
+    """
+
+    @app.cli.command('claim-orphans')
+    @click.argument('email')
+    def claim_orphans(email):
+        """Assign events and tasks created before user accounts to EMAIL."""
+
+        user = db.session.scalar(db.select(User).where(User.email == email.strip().lower()))
+        if user is None:
+            raise click.ClickException(f'No user with email {email}')
+        if user.shard is not None:
+            # Orphans live in the main database
+            raise click.ClickException(f'{email} is on shard {user.shard}; move it to main first')
+
+        for model in (Event, Task, *ARCHIVES.values()):
+            result = db.session.execute(
+                db.update(model).where(model.user_id.is_(None)).values(user_id=user.id)
+            )
+            click.echo(f'{model.__tablename__}: {result.rowcount} assigned')
+
+        db.session.commit()
+
+        # Ownerless rows were left out of the rollups until now
+        rebuild_rollups()
+
+    @app.cli.command('regrade-tasks')
+    @click.option('--force', is_flag=True, help='Regrade every task, not just stale ones.')
+    def regrade_tasks_command(force):
+        """Recompute task points after GRADING_MODEL changes."""
+
+        for shard in each_database():
+            checked, regraded = regrade_tasks(force=force)
+            click.echo(f'{_prefix(shard)}tasks: {checked} checked, {regraded} regraded')
+
+    @app.cli.command('archive')
+    def archive_command():
+        """Move old events and completed tasks to the archive tables."""
+
+        for shard in each_database():
+            for table, moved in archive_old_rows().items():
+                click.echo(f'{_prefix(shard)}{table}: {moved} archived')
+
+    @app.cli.command('rebuild-analytics')
+    def rebuild_analytics_command():
+        """Recompute the daily and weekly progress rollups from scratch."""
+
+        for shard in each_database():
+            for table, rows in rebuild_rollups().items():
+                click.echo(f'{_prefix(shard)}{table}: {rows} rows')
+
+    @app.cli.command('backup-db')
+    @click.argument('destination', required=False)
+    @click.option('--compress', is_flag=True, help='Gzip the backup (implied by a .gz DESTINATION).')
+    def backup_db_command(destination, compress):
+        """
+        Back up the database to DESTINATION (default: a new file in
+        BACKUP_DIR) while the app keeps running; shards go next to it.
+        """
+
+        compress = compress or bool(destination and destination.endswith('.gz'))
+        try:
+            results = backup_databases(destination or default_backup_path(compress), compress=compress)
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        for result in results:
+            click.echo(f"{result['file']}: {result['pages']} pages, {result['bytes']} bytes in {result['seconds']}s")
+
+    @app.cli.command('restore-db')
+    @click.argument('source', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--shard', type=int, help='Restore this shard instead of the main database.')
+    @click.confirmation_option(prompt='This replaces everything in the database. Continue?')
+    def restore_db_command(source, shard):
+        """Replace the database (or one shard) with the backup in SOURCE (.db or .db.gz)."""
+
+        try:
+            pages = restore_database(source, router.database(shard))
+        except LookupError as e:
+            raise click.ClickException(str(e))
+        except BackupError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{source}: {pages} pages restored; restart the app')
+
+    @app.cli.command('shards')
+    def shards_command():
+        """Show the users and rows (events and tasks, archives included) in each database."""
+
+        for shard, counts in tenant_loads().items():
+            click.echo(f'{shard_label(shard)}: {len(counts)} users, {sum(counts.values())} rows')
+
+    @app.cli.command('move-tenant')
+    @click.argument('email')
+    @click.argument('target')
+    def move_tenant_command(email, target):
+        """Move EMAIL's data to shard TARGET (a number, or "main")."""
+
+        user = db.session.scalar(db.select(User).where(User.email == email.strip().lower()))
+        if user is None:
+            raise click.ClickException(f'No user with email {email}')
+        shard = _parse_shard(target)
+        if shard == user.shard:
+            raise click.ClickException(f'{email} is already on {shard_label(shard)}')
+
+        source = user.shard
+        copied = move_tenant(user, shard)
+        click.echo(f'{email}: {shard_label(source)} -> {shard_label(shard)}')
+        for table, rows in copied.items():
+            click.echo(f'  {table}: {rows} rows')
+
+    @app.cli.command('rebalance-shards')
+    @click.option('--dry-run', is_flag=True, help='Only print the moves.')
+    def rebalance_shards_command(dry_run):
+        """Move users off the main database and between shards until the shards hold similar row counts."""
+
+        if not router.count:
+            raise click.ClickException('Sharding is off (SHARD_COUNT is 0)')
+
+        loads = tenant_loads()
+        moves = plan_rebalance(loads)
+        rows = {user_id: count for counts in loads.values() for user_id, count in counts.items()}
+        for user_id, source, target in moves:
+            click.echo(f'user {user_id} ({rows[user_id]} rows): {shard_label(source)} -> {shard_label(target)}')
+            if not dry_run:
+                move_tenant(db.session.get(User, user_id), target)
+        if not moves:
+            click.echo('Already balanced')
+
+
+def _prefix(shard: int | None) -> str:
+    # Output of per-database commands names the database once sharding is on
+    return f'{shard_label(shard)}: ' if router.count else ''
+
+
+def _parse_shard(value: str) -> int | None:
+    if value == 'main':
+        return None
+    try:
+        shard = int(value)
+    except ValueError:
+        raise click.BadParameter('a shard number or "main"', param_hint='TARGET')
+    if not 0 <= shard < router.count:
+        raise click.BadParameter(f'no shard {shard} (SHARD_COUNT is {router.count})', param_hint='TARGET')
+    return shard
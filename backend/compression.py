@@ -0,0 +1,204 @@
+"""
+Response compression negotiated via ``Accept-Encoding``.
+
+gzip is always available; brotli (``br``) and zstandard (``zstd``) are used
+when their packages are installed. Buffered responses above
+COMPRESSION_MIN_SIZE are compressed in one go, with the compressed bytes of
+GET responses cached by content digest so identical payloads are compressed
+only once. Streamed responses are compressed chunk by chunk and flushed after
+each chunk so they keep streaming.
+
+A compressed body is a different representation, so its ``ETag`` gets the
+encoding appended (``"3-gzip"``); ``decoded_etag`` strips it again for
+``If-Match`` checks.
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/msgpack',
+    'application/javascript',
+    'text/calendar',
+    'text/css',
+    'text/html',
+    'text/plain',
+}
+
+
+# Every encoding this module can produce
+ENCODINGS = ('zstd', 'br', 'gzip')
+
+
+def available_encodings() -> list[str]:
+    """Supported encodings, most preferred first."""
+
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def decoded_etag(tag: str) -> str:
+    """``tag`` without the suffix ``compress_response`` adds for a content coding."""
+
+    base, _, suffix = tag.rpartition('-')
+    return base if base and suffix in ENCODINGS else tag
+
+
+def _tag_encoding(response, encoding: str) -> None:
+    tag, weak = response.get_etag()
+    if tag is not None:
+        response.set_etag(f'{tag}-{encoding}', weak)
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _stream_compressor(encoding: str, level: int):
+    """Return ``(compress_chunk, finish)`` callables for one stream."""
+
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        return (
+            lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush
+        )
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        return (lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish)
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+
+def _compress_stream(chunks, encoding: str, level: int):
+    compress_chunk, finish = _stream_compressor(encoding, level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compress_chunk(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Let the wrapped iterable run its own cleanup (e.g. stream_with_context)
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class CompressionCache:
+    """Bounded LRU of compressed payloads keyed by ``(digest, encoding)``."""
+
+    def __init__(self, max_entries: int):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: bytes) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class Compression:
+    """Flask extension compressing eligible responses in ``after_request``."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['COMPRESSION_ENABLED']
+        self.min_size = app.config['COMPRESSION_MIN_SIZE']
+        self.levels = app.config['COMPRESSION_LEVELS']
+        self.cache_max_item = app.config['COMPRESSION_CACHE_MAX_ITEM_SIZE']
+        self.cache = CompressionCache(app.config['COMPRESSION_CACHE_SIZE'])
+        self.encodings = available_encodings()
+        app.after_request(self.compress_response)
+
+    def _eligible(self, response) -> bool:
+        return (
+            200 <= response.status_code < 300
+            and response.status_code != 204
+            and response.mimetype in COMPRESSIBLE_MIMETYPES
+            and 'Content-Encoding' not in response.headers
+            and 'no-transform' not in response.headers.get('Cache-Control', '')
+            and not response.direct_passthrough
+        )
+
+    def compress_response(self, response):
+        if not self.enabled or not self._eligible(response):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            _tag_encoding(response, encoding)
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        cacheable = request.method == 'GET' and len(data) <= self.cache_max_item
+        if cacheable:
+            key = (hashlib.blake2b(data, digest_size=16).digest(), encoding)
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = compress(data, encoding, level)
+                self.cache.put(key, compressed)
+        else:
+            compressed = compress(data, encoding, level)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        _tag_encoding(response, encoding)
+        return response
+
+
+compression = Compression()
@@ -1,6 +1,10 @@
 import os
 
 
+# Public fallback for local development only; production refuses to sign with it
+DEV_SECRET_KEY = 'dev-secret-key-change-in-production'
+
+
 class Config:
     """Base configuration class with default settings."""
 
@@ -11,12 +15,153 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(INSTANCE_PATH, "database.db")}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Set on startup. WAL lets readers and the writer proceed side by side,
+    # which several worker processes (and a new master booting while the
+    # old one still serves during a reload) depend on. Persists in the file
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    # Seconds a write waits for another connection's write lock before
+    # failing with "database is locked"; workers share one database file
+    SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 15))
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT}}
+
+    # How datetime columns are stored: 'text' (ISO strings) or 'epoch'
+    # (integer microseconds, faster range queries). Read once when the models
+    # are imported, so set it in the environment (startup fails if a config
+    # class disagrees); existing rows are converted on startup when it changes
+    DATETIME_STORAGE = os.environ.get('DATETIME_STORAGE', 'text')
+
     # Security
-    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+    SECRET_KEY = os.environ.get('SECRET_KEY', DEV_SECRET_KEY)
+
+    # Authentication (JWT). HS* algorithms sign with JWT_SECRET_KEY; RS*/ES*
+    # algorithms use the PEM keys below and need PyJWT[crypto] installed
+    JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', SECRET_KEY)
+    JWT_PRIVATE_KEY = os.environ.get('JWT_PRIVATE_KEY')
+    JWT_PUBLIC_KEY = os.environ.get('JWT_PUBLIC_KEY')
+    JWT_EXPIRES_SECONDS = int(os.environ.get('JWT_EXPIRES_SECONDS', 12 * 60 * 60))
+    # Refuse to start without real signing keys (see auth.check_signing_keys)
+    REQUIRE_SIGNING_KEYS = False
 
     # CORS configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
+    # Rate limiting: (tokens per second, burst) per client and route; clients
+    # are identified by user id, or by IP address before they log in
+    RATELIMIT_ENABLED = True
+    RATELIMIT_DEFAULT = (10.0, 20)
+    RATELIMIT_ROUTES = {
+        'api.register': (0.05, 3),
+        'api.login': (0.2, 5),
+        'api.import_ical_events': (0.1, 2),
+        'api.create_backup': (0.01, 2),
+    }
+    RATELIMIT_MAX_CLIENTS = 10000
+
+    # Admission control: requests beyond this many in flight get a 503
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 32))
+
+    # Response compression, negotiated via Accept-Encoding. br and zstd are
+    # only offered when the brotli/zstandard packages are installed
+    COMPRESSION_ENABLED = True
+    COMPRESSION_MIN_SIZE = 500
+    COMPRESSION_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+    COMPRESSION_CACHE_SIZE = 256
+    COMPRESSION_CACHE_MAX_ITEM_SIZE = 1024 * 1024
+
+    # Identical concurrent list/summary/analytics/search reads by one user
+    # share a single query and response (see coalesce.py)
+    COALESCING_ENABLED = os.environ.get('COALESCING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+    # Group commit: event/task creates from concurrent requests share one
+    # transaction, flushed after GROUP_COMMIT_MAX_DELAY_MS or once
+    # GROUP_COMMIT_MAX_ROWS are waiting. Trades a few ms of latency for
+    # fewer fsyncs under write-heavy load
+    GROUP_COMMIT_ENABLED = os.environ.get('GROUP_COMMIT_ENABLED', '').lower() in ('1', 'true', 'yes')
+    GROUP_COMMIT_MAX_DELAY_MS = float(os.environ.get('GROUP_COMMIT_MAX_DELAY_MS', 2))
+    GROUP_COMMIT_MAX_ROWS = 100
+
+    # Idempotency-Key replay storage for POST routes
+    IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+    IDEMPOTENCY_MAX_KEYS = 10000
+
+    # iCalendar import/export
+    ICAL_IMPORT_CHUNK_SIZE = 500
+    ICAL_RECURRENCE_HORIZON_DAYS = 730
+    ICAL_MAX_OCCURRENCES = 1000
+
+    # GET /api/tasks/next ranking: score = deadline * urgency + points * task
+    # points. Urgency is 1 once a task's slack (hours until due minus its
+    # estimated minutes, default_minutes if unset) is used up, falls off as
+    # 1 / (1 + slack / slack_hours) before that, and is 0 without a due date
+    NEXT_TASKS_MODEL = {
+        'deadline': 100.0,
+        'points': 1.0,
+        'slack_hours': 24,
+        'default_minutes': 30,
+    }
+    MAX_NEXT_TASKS = 50
+
+    # Rows per chunk when bulk jobs and exports stream whole tables (see
+    # bulk.py); bounds their memory use independent of the table size
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+    # Online backups (see backup.py): `flask backup-db` and POST
+    # /api/admin/backups write to BACKUP_DIR, copying BACKUP_STEP_PAGES pages
+    # per step and pausing BACKUP_STEP_PAUSE_MS between steps
+    BACKUP_DIR = os.environ.get('BACKUP_DIR', os.path.join(INSTANCE_PATH, 'backups'))
+    BACKUP_STEP_PAGES = 1024
+    BACKUP_STEP_PAUSE_MS = 5
+
+    # Sharding (see shards.py), SQLite only: with SHARD_COUNT > 0 each
+    # user's events, tasks and derived rows live in one of SHARD_COUNT files
+    # in SHARD_DIR, so users on different shards never wait for each other's
+    # writes. At most SHARD_MAX_ENGINES shards are kept open per process, and
+    # ids are reserved SHARD_ID_BLOCK_SIZE at a time
+    SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 0))
+    SHARD_DIR = os.environ.get('SHARD_DIR', os.path.join(INSTANCE_PATH, 'shards'))
+    SHARD_MAX_ENGINES = int(os.environ.get('SHARD_MAX_ENGINES', 16))
+    SHARD_ID_BLOCK_SIZE = 1000
+
+    # Emails of the users allowed to call the /api/admin routes
+    ADMIN_EMAILS = [
+        email.strip().lower()
+        for email in os.environ.get('ADMIN_EMAILS', '').split(',')
+        if email.strip()
+    ]
+
+    # Most intervals one POST /api/events/conflicts request may check
+    MAX_CONFLICT_INTERVALS = 1000
+
+    # Archival: events that ended, and completed tasks that were completed
+    # and due, more than this many days ago move to the archive tables when
+    # `flask archive` runs, in batches of ARCHIVE_BATCH_SIZE rows
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = 500
+
+    # Task grading: points = bias + sum(weight * feature), clamped to
+    # [min_points, max_points]. Features are log1p(description length),
+    # log1p(estimated minutes, default_minutes if unset), urgency (1 when due
+    # at creation, falling with lead time) and log1p(earlier tasks with the
+    # same title). Run `flask regrade-tasks` after changing these
+    GRADING_MODEL = {
+        'bias': 5.0,
+        'description': 2.0,
+        'duration': 4.0,
+        'urgency': 15.0,
+        'repeats': -3.0,
+        'default_minutes': 30,
+        'min_points': 1,
+        'max_points': 100,
+    }
+
+    # Server-Sent Events
+    SSE_QUEUE_SIZE = 100
+    SSE_HISTORY_SIZE = 1000
+    SSE_HEARTBEAT_SECONDS = 15
+    # How often each worker reads notifications published by the others
+    SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 0.25))
+
     # Swagger configuration
     SWAGGER_CONFIG = {
         "headers": [],
@@ -42,6 +187,15 @@ class Config:
         },
         "basePath": "/api",
         "schemes": ["http"],
+        "securityDefinitions": {
+            "Bearer": {
+                "type": "apiKey",
+                "name": "Authorization",
+                "in": "header",
+                "description": "Access token from /api/auth/login, sent as \"Bearer <token>\""
+            }
+        },
+        "security": [{"Bearer": []}],
     }
 
 
@@ -59,10 +213,14 @@ class ProductionConfig(Config):
     TESTING = False
 
     # Override with more secure settings for production
+    REQUIRE_SIGNING_KEYS = True
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         'DATABASE_URL',
         Config.SQLALCHEMY_DATABASE_URI
     )
+    # The busy timeout is an sqlite3 connect() argument other drivers reject
+    if not SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
 
 
 class TestingConfig(Config):
@@ -1,11 +1,41 @@
+from flask import g
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.sql.util import find_tables
 from flask_cors import CORS
 
 
+# Tables that always live in the main database, even when sharding is on
+GLOBAL_TABLES = frozenset({'users'})
+
+
 class Base(DeclarativeBase):
     pass
 
 
-db = SQLAlchemy(model_class=Base)
-cors = CORS()
\ No newline at end of file
+def _touches_global_table(mapper, clause) -> bool:
+    if mapper is not None and inspect(mapper).local_table.name in GLOBAL_TABLES:
+        return True
+    if clause is not None:
+        return any(getattr(table, 'name', None) in GLOBAL_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+
+class RoutingSession(Session):
+    """
+    Session that sends statements to the engine of the shard selected in
+    ``g.shard_engine`` (see shards.py). Statements on GLOBAL_TABLES, and
+    every statement while no shard is selected, use the main database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = g.get('shard_engine') if bind is None else None
+        if engine is not None and not _touches_global_table(mapper, clause):
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
+cors = CORS()
@@ -0,0 +1,84 @@
+"""
+Response body formats negotiated via ``Accept``.
+
+JSON is the default. Clients sending ``Accept: application/msgpack`` get the
+same payloads as MessagePack when the ``msgpack`` package is installed,
+with datetimes as MessagePack timestamps (extension type -1) rather than
+ISO 8601 strings. Both encoders take the same ``to_dict`` output, which
+keeps datetimes as ``datetime`` objects until the response is encoded.
+Error responses are always JSON.
+"""
+
+from datetime import date, datetime
+
+from flask import Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def json_default(value):
+    """``default`` for ``json.dumps``: datetimes as ISO 8601 strings."""
+
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+def _msgpack_default(value):
+    # Timezone-aware datetimes are packed natively; dates go out as text
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not MessagePack serializable')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, but writing datetimes as ISO 8601 instead of HTTP dates."""
+
+    default = staticmethod(json_default)
+
+
+def available_mimetypes() -> list[str]:
+    """Supported response formats, most preferred first."""
+
+    if msgpack is None:
+        return [JSON_MIMETYPE]
+    return [JSON_MIMETYPE, MSGPACK_MIMETYPE]
+
+
+def negotiate():
+    """
+    ``before_request`` hook: pick the response format from ``Accept``. Only
+    a client that accepts MessagePack but not JSON, on a server without
+    the ``msgpack`` package, is turned away with a 406; other unsupported
+    ``Accept`` values still get JSON.
+    """
+
+    accept = request.accept_mimetypes
+    best = accept.best_match(available_mimetypes())
+    if best is None and accept[MSGPACK_MIMETYPE]:
+        return jsonify({'error': f'{MSGPACK_MIMETYPE} responses are not available; accept {JSON_MIMETYPE}'}), 406
+    g.response_mimetype = best or JSON_MIMETYPE
+
+
+def respond(payload, status: int = 200) -> Response:
+    """``payload`` encoded in the format negotiated for this request."""
+
+    if g.get('response_mimetype') == MSGPACK_MIMETYPE:
+        response = Response(
+            msgpack.packb(payload, datetime=True, default=_msgpack_default),
+            status=status,
+            mimetype=MSGPACK_MIMETYPE
+        )
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,166 @@
+"""
+Task difficulty grading.
+
+Every task gets a ``points`` value from a small linear model over a few
+features: description length, estimated duration, how soon the task was due
+when it was created, and how often the user has done a task with the same
+title before. The model parameters live in GRADING_MODEL.
+
+Each task stores a hash of its feature inputs and the model parameters next
+to its points (``grade_hash``), so a task is only regraded when one of those
+changed. ``regrade_tasks`` walks the whole table in batches after the model
+parameters change, rewriting only the rows whose hash no longer matches.
+"""
+
+import hashlib
+import math
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import func
+from analytics import adjust_rollups
+from extensions import db
+from models import Task, to_utc_naive
+from bulk import iter_chunks
+
+
+def _fingerprint(model: dict) -> str:
+    return repr(sorted(model.items()))
+
+
+def grade_hash(model_fingerprint: str, description_length: int, estimated_minutes: int | None,
+               lead_hours: int | None, repeats: int) -> str:
+    """Hash of everything a task's points depend on."""
+
+    key = f'{model_fingerprint}|{description_length}|{estimated_minutes}|{lead_hours}|{repeats}'
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def _lead_hours(created_at: datetime, due: datetime | None) -> int | None:
+    if due is None:
+        return None
+    return max(0, int((due - created_at).total_seconds() // 3600))
+
+
+def score_batch(model: dict, description_lengths, estimated_minutes, lead_hours, repeats) -> list[int]:
+    """
+    Points for a batch of tasks, given one list per feature input (all the
+    same length). Each feature is computed column-wise over the batch before
+    the weighted sum, so a batch costs a handful of passes over flat lists.
+    """
+
+    default_minutes = model['default_minutes']
+
+    description = [math.log1p(n) for n in description_lengths]
+    duration = [math.log1p(default_minutes if m is None else m) for m in estimated_minutes]
+    # 1 for tasks due immediately, falling towards 0 the longer the lead time
+    urgency = [0.0 if h is None else 24.0 / (24.0 + h) for h in lead_hours]
+    repeat = [math.log1p(r) for r in repeats]
+
+    bias = model['bias']
+    w_description = model['description']
+    w_duration = model['duration']
+    w_urgency = model['urgency']
+    w_repeats = model['repeats']
+    low = model['min_points']
+    high = model['max_points']
+
+    return [
+        min(high, max(low, round(
+            bias + w_description * d + w_duration * t + w_urgency * u + w_repeats * r
+        )))
+        for d, t, u, r in zip(description, duration, urgency, repeat)
+    ]
+
+
+def grade_task(task: Task) -> None:
+    """
+    Set ``task.points`` from its current fields. Call before committing a
+    created or updated task; does nothing if the inputs did not change.
+    """
+
+    model = current_app.config['GRADING_MODEL']
+
+    # Earlier tasks of the same user with the same title. Folded by SQL on
+    # both sides (ASCII only), exactly as regrade_tasks partitions them
+    repeats_stmt = db.select(func.count()).select_from(Task).where(
+        Task.user_id == task.user_id,
+        func.lower(Task.title) == func.lower(task.title)
+    )
+    if task.id is not None:
+        repeats_stmt = repeats_stmt.where(Task.id < task.id)
+    with db.session.no_autoflush:
+        repeats = db.session.scalar(repeats_stmt)
+
+    created_at = task._created_at or to_utc_naive(datetime.now(timezone.utc))
+    lead_hours = _lead_hours(created_at, task._due_datetime)
+    description_length = len(task.description)
+
+    digest = grade_hash(_fingerprint(model), description_length, task.estimated_minutes, lead_hours, repeats)
+    if digest == task.grade_hash:
+        return
+
+    task.points, = score_batch(model, [description_length], [task.estimated_minutes], [lead_hours], [repeats])
+    task.grade_hash = digest
+
+
+def regrade_tasks(force: bool = False) -> tuple[int, int]:
+    """
+    Recompute points for every task whose grade hash is stale (or for all
+    of them with ``force``), BULK_CHUNK_SIZE rows at a time. Returns
+    ``(checked, regraded)``.
+    """
+
+    model = current_app.config['GRADING_MODEL']
+    fingerprint = _fingerprint(model)
+
+    repeats = func.count().over(
+        partition_by=(Task.user_id, func.lower(Task.title)),
+        order_by=Task.id
+    ) - 1
+    stmt = db.select(
+        Task.id,
+        func.length(Task.description),
+        Task.estimated_minutes,
+        Task._created_at,
+        Task._due_datetime,
+        repeats,
+        Task.grade_hash
+    )
+
+    checked = 0
+    regraded = 0
+    for batch in iter_chunks(stmt):
+        checked += len(batch)
+        ids, lengths, minutes, created, due, repeat_counts, hashes = zip(*batch)
+        leads = [_lead_hours(c, d) for c, d in zip(created, due)]
+        digests = [
+            grade_hash(fingerprint, *inputs)
+            for inputs in zip(lengths, minutes, leads, repeat_counts)
+        ]
+
+        stale = [i for i, (new, old) in enumerate(zip(digests, hashes)) if force or new != old]
+        if not stale:
+            continue
+
+        points = score_batch(
+            model,
+            [lengths[i] for i in stale],
+            [minutes[i] for i in stale],
+            [leads[i] for i in stale],
+            [repeat_counts[i] for i in stale]
+        )
+        # Written as we go, so memory stays bounded by the chunk size. Only
+        # points and grade_hash change, which the open scan neither filters
+        # nor orders on. Completed tasks move their points in the rollups
+        stale_ids = [ids[i] for i in stale]
+        adjust_rollups(Task, stale_ids, sign=-1)
+        db.session.execute(db.update(Task), [
+            {'id': ids[i], 'points': p, 'grade_hash': digests[i]}
+            for i, p in zip(stale, points)
+        ])
+        adjust_rollups(Task, stale_ids)
+        regraded += len(stale)
+    db.session.commit()
+
+    return checked, regraded
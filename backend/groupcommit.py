@@ -0,0 +1,198 @@
+"""
+Opt-in group commit for single-row creates.
+
+With GROUP_COMMIT_ENABLED, ``save_new`` hands the new row to a writer thread
+instead of committing it on the request's own session. The writer collects
+rows from concurrent requests for up to GROUP_COMMIT_MAX_DELAY_MS (or until
+GROUP_COMMIT_MAX_ROWS are waiting), inserts them all in one transaction and
+only then wakes the requests up, so one fsync covers the whole batch and each
+request still answers only once its row is durable. Rollup adjustments and
+stream notifications of the new rows are made in that same transaction.
+"""
+
+import queue
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect
+from analytics import adjust_rollups
+from extensions import db
+from notifications import broker
+
+
+# How long a request waits for its batch before giving up
+WAIT_SECONDS = 30
+
+
+class PendingInsert:
+    """One row waiting for the writer; ``done`` is set once it is committed or failed."""
+
+    __slots__ = ('engine', 'model', 'values', 'rollups', 'obj', 'event_type', 'done', 'id', 'error')
+
+    def __init__(self, engine, model, values: dict, rollups: bool, obj=None, event_type: str | None = None):
+        self.engine = engine
+        self.model = model
+        self.values = values
+        self.rollups = rollups
+        # Instance to publish as ``event_type`` once it has its id
+        self.obj = obj
+        self.event_type = event_type
+        self.done = threading.Event()
+        self.id = None
+        self.error = None
+
+
+class GroupCommitter:
+    """Writer thread batching inserts from concurrent requests into shared transactions."""
+
+    def __init__(self, max_delay: float, max_rows: int):
+        self._max_delay = max_delay
+        self._max_rows = max_rows
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, engine, model, values: dict, rollups: bool = False, obj=None, event_type: str | None = None) -> int:
+        """
+        Insert ``values`` into ``model``'s table of ``engine``'s database as
+        part of the next batch, adding the row to the rollups with
+        ``rollups`` and publishing ``obj`` as ``event_type`` when given;
+        returns the new id.
+        """
+
+        self._ensure_started()
+
+        pending = PendingInsert(engine, model, values, rollups, obj, event_type)
+        self._queue.put(pending)
+        if not pending.done.wait(WAIT_SECONDS):
+            raise TimeoutError('Timed out waiting for group commit')
+        if pending.error is not None:
+            raise pending.error
+        return pending.id
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[PendingInsert]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._max_delay
+        while len(batch) < self._max_rows:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # One transaction per database (there are several with sharding)
+            databases = {}
+            for pending in batch:
+                databases.setdefault(pending.engine, []).append(pending)
+            try:
+                for engine, rows in databases.items():
+                    try:
+                        self._write(engine, rows)
+                    except Exception:
+                        # One bad row must not fail the others: retry each on its own
+                        for pending in rows:
+                            try:
+                                self._write(engine, [pending])
+                            except Exception as e:
+                                pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def _write(self, engine, batch: list[PendingInsert]):
+        # Rows of the same table and shape share one executemany
+        groups = {}
+        for pending in batch:
+            groups.setdefault((pending.model, tuple(pending.values)), []).append(pending)
+
+        with engine.begin() as connection:
+            for (model, _), rows in groups.items():
+                table = model.__table__
+                result = connection.execute(
+                    table.insert().returning(table.c.id, sort_by_parameter_order=True),
+                    [pending.values for pending in rows]
+                )
+                for pending, new_id in zip(rows, result.scalars()):
+                    pending.id = new_id
+
+            # One adjustment per model for the whole batch, before it commits
+            adjusted = {}
+            for pending in batch:
+                if pending.rollups:
+                    adjusted.setdefault(pending.model, []).append(pending.id)
+            for model, ids in adjusted.items():
+                adjust_rollups(model, ids, connection=connection)
+
+            for pending in batch:
+                if pending.event_type is not None:
+                    pending.obj.id = pending.id
+                    broker.publish(pending.obj.user_id, pending.event_type, pending.obj.to_dict(), connection=connection)
+
+
+def init_app(app):
+    """Attach a group committer to ``app`` when GROUP_COMMIT_ENABLED is set."""
+
+    if not app.config['GROUP_COMMIT_ENABLED']:
+        return
+
+    app.extensions['group_commit'] = GroupCommitter(
+        app.config['GROUP_COMMIT_MAX_DELAY_MS'] / 1000,
+        app.config['GROUP_COMMIT_MAX_ROWS']
+    )
+
+
+def _column_values(obj) -> dict:
+    """
+    Column values for inserting ``obj``, with Python-side column defaults
+    filled in on the object too so it serializes like a flushed row.
+    """
+
+    values = {}
+    for attr in inspect(type(obj)).column_attrs:
+        column = attr.columns[0]
+        if column.primary_key:
+            continue
+        value = getattr(obj, attr.key)
+        if value is None and column.default is not None:
+            value = column.default.arg(None) if column.default.is_callable else column.default.arg
+            setattr(obj, attr.key, value)
+        values[column.name] = value
+    return values
+
+
+def save_new(obj, rollups: bool = False, event_type: str | None = None) -> None:
+    """
+    Persist a new model instance and set its ``id``: through the group
+    committer when enabled (``obj`` then stays detached from the session),
+    otherwise with a regular commit. With ``rollups`` its contributions are
+    added to the rollups, and with ``event_type`` it is published to the
+    user's streams, in the same transaction.
+    """
+
+    committer = current_app.extensions.get('group_commit')
+    if committer is None:
+        db.session.add(obj)
+        if rollups or event_type is not None:
+            db.session.flush()
+        if rollups:
+            adjust_rollups(type(obj), [obj.id])
+        if event_type is not None:
+            broker.publish(obj.user_id, event_type, obj.to_dict())
+        db.session.commit()
+        return
+
+    engine = db.session.get_bind(mapper=type(obj))
+    obj.id = committer.submit(engine, type(obj), _column_values(obj), rollups, obj, event_type)
@@ -0,0 +1,46 @@
+"""
+Gunicorn settings for running the API in production:
+
+    gunicorn            # from the backend directory, picks up this file
+
+The master preloads the app (creating tables, running migrations and
+warming caches once) and forks WEB_CONCURRENCY workers that share the
+port. To deploy new code, send SIGUSR2 to the master, wait for the new
+master to write its pid file, then send SIGQUIT to the old one: both
+serve side by side until the old workers finish their requests. SIGHUP
+only replaces the workers (with the code the master already loaded) and
+may reset a few connections while doing so. Command line flags override
+everything here.
+"""
+
+import multiprocessing
+import os
+
+
+wsgi_app = 'wsgi:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Workers finishing in-flight requests get this long on reload/shutdown
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+# Importing the app before fork is not safe for gevent/eventlet workers,
+# which have to monkey-patch the standard library before anything else
+preload_app = worker_class not in ('gevent', 'eventlet')
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    """Give each worker its own database pool and notification poller."""
+
+    if server.cfg.preload_app:
+        from wsgi import app
+        from app import reset_after_fork
+
+        reset_after_fork(app)
@@ -0,0 +1,391 @@
+"""
+Streaming iCalendar (RFC 5545) import and export for events.
+
+Both directions work one content line at a time so multi-megabyte calendars
+are handled in constant memory: the parser yields event rows as soon as each
+VEVENT closes, and the exporter yields the calendar in small text chunks.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from dateutil.rrule import rruleset, rrulestr
+from extensions import db
+from models import Event, to_utc_naive
+from analytics import adjust_rollups
+
+
+PRODID = '-//Gamify//Gamify API//EN'
+
+# RFC 5545 recommends folding content lines longer than 75 octets
+MAX_LINE_OCTETS = 75
+
+_DURATION_RE = re.compile(
+    r'^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+
+class ICalError(ValueError):
+    """Raised when a VEVENT cannot be mapped to an Event."""
+
+
+##################### Parsing #####################
+def unfold_lines(lines):
+    """
+    Join folded continuation lines (those starting with a space or tab)
+    back onto the content line they belong to.
+    """
+
+    current = None
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def parse_content_line(line: str):
+    """
+    Split a content line into ``(NAME, {PARAM: value}, value)``.
+    """
+
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            break
+    else:
+        raise ICalError(f'Malformed content line: {line[:40]!r}')
+
+    name, *param_parts = line[:index].split(';')
+    params = {}
+    for part in param_parts:
+        key, _, value = part.partition('=')
+        params[key.upper()] = value.strip('"')
+
+    return name.upper(), params, line[index + 1:]
+
+
+def iter_vevents(lines):
+    """
+    Yield the properties of each top-level VEVENT as ``{NAME: [(params, value), ...]}``.
+    Nested components such as VALARM are skipped.
+    """
+
+    props = None
+    nested = 0
+
+    for line in unfold_lines(lines):
+        try:
+            name, params, value = parse_content_line(line)
+        except ICalError:
+            continue
+
+        if name == 'BEGIN':
+            if value.upper() == 'VEVENT' and props is None:
+                props = {}
+            elif props is not None:
+                nested += 1
+        elif name == 'END':
+            if props is None:
+                continue
+            if nested:
+                nested -= 1
+            elif value.upper() == 'VEVENT':
+                yield props
+                props = None
+        elif props is not None and not nested:
+            props.setdefault(name, []).append((params, value))
+
+
+def unescape_text(value: str) -> str:
+    """Undo RFC 5545 TEXT escaping."""
+
+    return re.sub(
+        r'\\([\\;,nN])',
+        lambda m: '\n' if m.group(1) in 'nN' else m.group(1),
+        value
+    )
+
+
+def parse_ical_datetime(value: str, params: dict) -> tuple[datetime, bool]:
+    """
+    Parse a DATE or DATE-TIME value into an aware datetime.
+    Returns ``(datetime, is_date)``. Floating times and unknown TZIDs are
+    treated as UTC, matching how the API treats naive ISO 8601 input.
+    """
+
+    value = value.strip()
+    try:
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            day = datetime.strptime(value, '%Y%m%d')
+            return day.replace(tzinfo=timezone.utc), True
+
+        if value.endswith('Z'):
+            return datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc), False
+
+        dt = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    except ValueError:
+        raise ICalError(f'Invalid date-time value: {value!r}')
+
+    tzinfo = timezone.utc
+    if 'TZID' in params:
+        try:
+            tzinfo = ZoneInfo(params['TZID'])
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return dt.replace(tzinfo=tzinfo), False
+
+
+def parse_duration(value: str) -> timedelta:
+    """Parse an RFC 5545 DURATION value such as ``PT1H30M`` or ``P1D``."""
+
+    match = _DURATION_RE.match(value.strip())
+    if not match:
+        raise ICalError(f'Invalid duration: {value!r}')
+
+    parts = {k: int(v) for k, v in match.groupdict().items() if v and k != 'sign'}
+    duration = timedelta(**parts)
+    return -duration if match.group('sign') == '-' else duration
+
+
+def _first(props, name):
+    values = props.get(name)
+    return values[0] if values else None
+
+
+def _text(props, name, max_length=None):
+    entry = _first(props, name)
+    if entry is None:
+        return None
+    text = unescape_text(entry[1]).strip()
+    if not text:
+        return None
+    return text[:max_length] if max_length else text
+
+
+def vevent_to_rows(props, horizon_days=730, max_occurrences=1000):
+    """
+    Map one VEVENT to Event insert rows (mapped attribute names, naive UTC).
+    Recurring events (RRULE/RDATE/EXDATE) are expanded into one row per
+    occurrence, bounded by ``horizon_days`` past today and ``max_occurrences``.
+    """
+
+    dtstart = _first(props, 'DTSTART')
+    if dtstart is None:
+        raise ICalError('VEVENT is missing DTSTART')
+    start, all_day = parse_ical_datetime(dtstart[1], dtstart[0])
+
+    dtend = _first(props, 'DTEND')
+    duration = _first(props, 'DURATION')
+    if dtend is not None:
+        end = parse_ical_datetime(dtend[1], dtend[0])[0]
+    elif duration is not None:
+        end = start + parse_duration(duration[1])
+    else:
+        end = start + timedelta(days=1) if all_day else start
+
+    if end < start:
+        raise ICalError('VEVENT ends before it starts')
+
+    base = {
+        'title': _text(props, 'SUMMARY', 200) or 'Untitled event',
+        'description': _text(props, 'DESCRIPTION'),
+        'location': _text(props, 'LOCATION', 200),
+        'all_day': all_day,
+    }
+    length = end - start
+
+    if 'RRULE' not in props and 'RDATE' not in props:
+        yield {**base, '_start_time': to_utc_naive(start), '_end_time': to_utc_naive(end)}
+        return
+
+    rules = rruleset()
+    try:
+        for _, rule in props.get('RRULE', []):
+            rules.rrule(rrulestr(rule, dtstart=start))
+        for kind, add in (('RDATE', rules.rdate), ('EXDATE', rules.exdate)):
+            for params, value in props.get(kind, []):
+                for item in value.split(','):
+                    add(parse_ical_datetime(item, params)[0])
+    except (ValueError, TypeError) as e:
+        raise ICalError(f'Unsupported recurrence: {e}')
+
+    # rrulestr does not include DTSTART itself unless it matches the rule
+    rules.rdate(start)
+
+    horizon = max(start, datetime.now(timezone.utc)) + timedelta(days=horizon_days)
+    for count, occurrence in enumerate(rules):
+        if count >= max_occurrences or occurrence > horizon:
+            break
+        yield {
+            **base,
+            '_start_time': to_utc_naive(occurrence),
+            '_end_time': to_utc_naive(occurrence + length),
+        }
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    # Only the first few messages are kept so a broken file cannot grow the result
+    MAX_ERRORS = 10
+
+    def record_error(self, error: Exception) -> None:
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(str(error))
+
+
+def iter_event_rows(lines, result: ImportResult, horizon_days=730, max_occurrences=1000):
+    """
+    Stream Event insert rows from iCalendar text lines. VEVENTs that cannot
+    be mapped are skipped and recorded on ``result``.
+    """
+
+    for props in iter_vevents(lines):
+        try:
+            # Materialize per VEVENT so a bad RRULE never yields half its rows
+            rows = list(vevent_to_rows(props, horizon_days, max_occurrences))
+        except ICalError as e:
+            result.record_error(e)
+            continue
+        yield from rows
+
+
+def import_events(lines, user_id: int, chunk_size=500, horizon_days=730, max_occurrences=1000,
+                  result: ImportResult | None = None) -> ImportResult:
+    """
+    Parse iCalendar text lines and bulk insert the events for ``user_id``, committing every
+    ``chunk_size`` rows so neither memory nor the write lock grows with the file.
+    Chunks committed before a failure are kept; pass ``result`` to read their
+    counts after an exception.
+    """
+
+    result = result if result is not None else ImportResult()
+    chunk = []
+
+    for row in iter_event_rows(lines, result, horizon_days, max_occurrences):
+        row['user_id'] = user_id
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _insert_chunk(chunk)
+            result.imported += len(chunk)
+            chunk = []
+
+    if chunk:
+        _insert_chunk(chunk)
+        result.imported += len(chunk)
+
+    return result
+
+
+def _insert_chunk(rows):
+    ids = db.session.scalars(db.insert(Event).returning(Event.id), rows).all()
+    adjust_rollups(Event, ids)
+    db.session.commit()
+
+
+##################### Serialization #####################
+def escape_text(value: str) -> str:
+    """Apply RFC 5545 TEXT escaping."""
+
+    return (
+        value.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line: str) -> str:
+    """Fold a content line so no physical line exceeds 75 UTF-8 octets."""
+
+    if len(line.encode('utf-8')) <= MAX_LINE_OCTETS:
+        return line
+
+    parts = []
+    current = ''
+    size = 0
+    for char in line:
+        octets = len(char.encode('utf-8'))
+        if size + octets > MAX_LINE_OCTETS:
+            parts.append(current)
+            current = ' '
+            size = 1
+        current += char
+        size += octets
+    parts.append(current)
+    return '\r\n'.join(parts)
+
+
+def _format_utc(dt: datetime) -> str:
+    return dt.strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_vevent(event) -> str:
+    """
+    Render one event as a VEVENT block. ``event`` may be an Event or any
+    row exposing the same attributes (naive datetimes are taken as UTC).
+    """
+
+    start = event.start_time
+    end = event.end_time
+
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.id}@gamify',
+        f'DTSTAMP:{_format_utc(event.updated_at)}',
+    ]
+    if event.all_day:
+        lines.append(f'DTSTART;VALUE=DATE:{start:%Y%m%d}')
+        lines.append(f'DTEND;VALUE=DATE:{max(end.date(), start.date() + timedelta(days=1)):%Y%m%d}')
+    else:
+        lines.append(f'DTSTART:{_format_utc(start)}')
+        lines.append(f'DTEND:{_format_utc(end)}')
+
+    lines.append(f'SUMMARY:{escape_text(event.title)}')
+    if event.description:
+        lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+    if event.location:
+        lines.append(f'LOCATION:{escape_text(event.location)}')
+    lines.append('END:VEVENT')
+
+    return ''.join(fold_line(line) + '\r\n' for line in lines)
+
+
+def iter_calendar(events, events_per_chunk=64):
+    """
+    Yield a VCALENDAR document in chunks of ``events_per_chunk`` VEVENTs.
+    """
+
+    yield (
+        'BEGIN:VCALENDAR\r\n'
+        'VERSION:2.0\r\n'
+        f'PRODID:{PRODID}\r\n'
+        'CALSCALE:GREGORIAN\r\n'
+    )
+
+    chunk = []
+    for event in events:
+        chunk.append(format_vevent(event))
+        if len(chunk) >= events_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+    yield 'END:VCALENDAR\r\n'
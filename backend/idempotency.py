@@ -0,0 +1,193 @@
+"""
+``Idempotency-Key`` support for POST routes.
+
+The first request with a given key runs the view and stores its response;
+retries with the same key get the stored response back, with its
+``ETag``, ``Location`` and other representation headers, without
+re-running the view. The negotiated response format is part of the
+request, so a retry asking for another one is refused; content coding is
+not, as every reply (stored or replayed) is compressed for its own
+``Accept-Encoding``. Concurrent duplicates inside one process wait for the first one
+to finish, and the primary key on ``idempotency_keys`` makes sure only one
+process ever runs the view for a key.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import Response, current_app, g, request, jsonify
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import IdempotencyRecord, to_utc_naive
+
+
+MAX_KEY_LENGTH = 255
+
+# How long an in-process duplicate waits for the first request to finish
+WAIT_SECONDS = 30
+
+# Expired/excess keys are purged after every this many new keys per process
+CLEANUP_EVERY = 100
+
+# Response headers stored with the response and sent again on replays
+REPLAYED_HEADERS = ('ETag', 'Last-Modified', 'Location', 'Content-Location', 'Link', 'Vary')
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_new_keys = 0
+
+
+def _request_hash() -> str:
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    # The format negotiate() picked from Accept: a replay must be in it too
+    digest.update(b'\0' + (g.get('response_mimetype') or '').encode())
+    return digest.hexdigest()
+
+
+def _replay(record: IdempotencyRecord) -> Response:
+    response = Response(record.body, status=record.status_code, content_type=record.content_type)
+    for name, value in json.loads(record.headers or '[]'):
+        response.headers.add(name, value)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _expired(record: IdempotencyRecord) -> bool:
+    ttl = timedelta(seconds=current_app.config['IDEMPOTENCY_TTL_SECONDS'])
+    return record.created_at < to_utc_naive(datetime.now(timezone.utc)) - ttl
+
+
+def _claim(user_id: int, key: str, request_hash: str):
+    """
+    Insert the in-progress placeholder for ``key``. Returns None once the
+    key is claimed, or the existing record if another request owns it.
+    """
+
+    for _ in range(2):
+        try:
+            db.session.add(IdempotencyRecord(user_id=user_id, key=key, request_hash=request_hash))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        record = db.session.get(IdempotencyRecord, (user_id, key))
+        if record is None or not _expired(record):
+            return record
+
+        # Expired: forget it and claim the key afresh
+        db.session.delete(record)
+        db.session.commit()
+
+    return db.session.get(IdempotencyRecord, (user_id, key))
+
+
+def _answer_from(record: IdempotencyRecord, request_hash: str):
+    if record.request_hash != request_hash:
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    if record.status_code is None:
+        response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    return _replay(record)
+
+
+def purge_expired_keys():
+    """Delete keys past IDEMPOTENCY_TTL_SECONDS and the oldest beyond IDEMPOTENCY_MAX_KEYS."""
+
+    ttl = timedelta(seconds=current_app.config['IDEMPOTENCY_TTL_SECONDS'])
+    cutoff = to_utc_naive(datetime.now(timezone.utc)) - ttl
+    db.session.execute(db.delete(IdempotencyRecord).where(IdempotencyRecord.created_at < cutoff))
+
+    newest_excess = (
+        db.select(IdempotencyRecord.created_at)
+        .order_by(IdempotencyRecord.created_at.desc())
+        .offset(current_app.config['IDEMPOTENCY_MAX_KEYS'])
+        .limit(1)
+        .scalar_subquery()
+    )
+    db.session.execute(db.delete(IdempotencyRecord).where(IdempotencyRecord.created_at <= newest_excess))
+    db.session.commit()
+
+
+def idempotent(view):
+    """
+    Make a POST view safe to retry: requests carrying an ``Idempotency-Key``
+    header run at most once per user and key, and repeats replay the stored
+    response. Server errors are not stored, so those requests can be retried.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        global _new_keys
+
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = g.user_id
+        request_hash = _request_hash()
+        slot = (user_id, key)
+
+        with _inflight_lock:
+            done = _inflight.get(slot)
+            leader = done is None
+            if leader:
+                done = _inflight[slot] = threading.Event()
+
+        if not leader:
+            # Coalesce with the in-process request already running this key
+            done.wait(WAIT_SECONDS)
+            record = db.session.get(IdempotencyRecord, slot)
+            if record is None:
+                return jsonify({'error': 'The original request failed; retry it'}), 409
+            return _answer_from(record, request_hash)
+
+        try:
+            existing = _claim(user_id, key, request_hash)
+            if existing is not None:
+                return _answer_from(existing, request_hash)
+
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                db.session.execute(db.delete(IdempotencyRecord).where(
+                    IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key
+                ))
+                db.session.commit()
+                raise
+
+            record = db.session.get(IdempotencyRecord, slot)
+            if response.status_code >= 500:
+                db.session.delete(record)
+            else:
+                record.status_code = response.status_code
+                record.content_type = response.content_type
+                record.body = response.get_data()
+                record.headers = json.dumps([
+                    (name, value) for name in REPLAYED_HEADERS for value in response.headers.getlist(name)
+                ])
+            db.session.commit()
+
+            _new_keys += 1
+            if _new_keys % CLEANUP_EVERY == 0:
+                purge_expired_keys()
+
+            return response
+
+        finally:
+            with _inflight_lock:
+                del _inflight[slot]
+            done.set()
+
+    return wrapper
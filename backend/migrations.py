@@ -0,0 +1,151 @@
+"""
+Lightweight in-place schema upgrades.
+
+``db.create_all()`` only creates missing tables, so columns and indexes added
+to existing models never reach a ``database.db`` created by an older version.
+``upgrade_schema`` fills that gap; new columns must be nullable (or have a
+server default) so they can be added to tables that already hold rows, and
+indexes whose columns changed are rebuilt.
+SQLite tables that newly declare ``sqlite_autoincrement`` are rebuilt with
+their rows; their triggers are recreated by the installers that run after it.
+``convert_datetime_storage`` rewrites datetime values in place when the
+DATETIME_STORAGE mode changes.
+"""
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+from models import UTCDateTime
+
+
+# SQLite expressions converting a stored value of the other mode; ``{col}``
+# is the quoted column name. Text values always carry six fractional digits
+TO_EPOCH = (
+    "CAST(strftime('%s', {col}) AS INTEGER) * 1000000 "
+    "+ CAST(substr({col}, 21, 6) AS INTEGER)"
+)
+TO_TEXT = (
+    "datetime({col} / 1000000 - ({col} % 1000000 < 0), 'unixepoch') "
+    "|| '.' || printf('%06d', ({col} % 1000000 + 1000000) % 1000000)"
+)
+
+
+def upgrade_schema(connection, tables):
+    """
+    Add any columns and indexes declared on ``tables`` that are missing
+    from those which already exist.
+    """
+
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(
+                f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {column_ddl}'
+            ))
+
+        if table.dialect_options['sqlite']['autoincrement'] and not _has_autoincrement(connection, table):
+            _rebuild_table(connection, table)
+
+        # Indexes are matched by name, so one whose columns changed is rebuilt
+        indexed = {index['name']: index['column_names'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in indexed and indexed[index.name] != [column.name for column in index.columns]:
+                index.drop(connection)
+            index.create(connection, checkfirst=True)
+
+
+def _has_autoincrement(connection, table) -> bool:
+    if connection.dialect.name != 'sqlite':
+        return True
+    sql = connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table.name}
+    ).scalar()
+    return 'AUTOINCREMENT' in sql.upper()
+
+
+def _rebuild_table(connection, table):
+    """
+    Recreate ``table`` from its current definition, keeping its rows and
+    ids. Its indexes and triggers are dropped with the old table.
+    """
+
+    preparer = connection.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    rebuilt = preparer.quote(f'{table.name}__rebuild')
+
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect))
+    connection.execute(text(ddl.replace(f'CREATE TABLE {name} (', f'CREATE TABLE {rebuilt} (', 1)))
+
+    columns = ', '.join(preparer.quote(column.name) for column in table.columns)
+    connection.execute(text(f'INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}'))
+    connection.execute(text(f'DROP TABLE {name}'))
+    # Also renames the sqlite_sequence entry set by the copy
+    connection.execute(text(f'ALTER TABLE {rebuilt} RENAME TO {name}'))
+
+
+def _source_type(mode):
+    # typeof() of values stored in the other mode, and the expression converting them
+    if mode not in ('text', 'epoch'):
+        raise ValueError(f"DATETIME_STORAGE must be 'text' or 'epoch', not {mode!r}")
+    return ('text', TO_EPOCH) if mode == 'epoch' else ('integer', TO_TEXT)
+
+
+def _datetime_columns(tables):
+    for table in tables:
+        for column in table.columns:
+            if isinstance(column.type, UTCDateTime):
+                yield table, column
+
+
+def datetime_conversion_pending(connection, tables, mode) -> bool:
+    """
+    Whether any ``UTCDateTime`` value is still stored in the other format
+    than ``mode``. Read only, so a startup with nothing to convert takes no
+    write lock.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    source_type, _ = _source_type(mode)
+    preparer = connection.dialect.identifier_preparer
+
+    for table, column in _datetime_columns(tables):
+        col = preparer.quote(column.name)
+        if connection.execute(text(
+            f"SELECT 1 FROM {preparer.format_table(table)} WHERE typeof({col}) = '{source_type}' LIMIT 1"
+        )).first() is not None:
+            return True
+    return False
+
+
+def convert_datetime_storage(connection, tables, mode):
+    """
+    Rewrite ``UTCDateTime`` values stored in the other format so that every
+    row matches ``mode`` ('text' or 'epoch'). Rows already in ``mode`` are
+    left alone, so this is a no-op once a database has been converted.
+
+    SQLite keeps the declared column type, which is fine: DATETIME columns
+    hold integers and BIGINT columns hold ISO strings without coercion.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    source_type, expression = _source_type(mode)
+    preparer = connection.dialect.identifier_preparer
+
+    for table, column in _datetime_columns(tables):
+        col = preparer.quote(column.name)
+        connection.execute(text(
+            f"UPDATE {preparer.format_table(table)} SET {col} = {expression.format(col=col)} "
+            f"WHERE typeof({col}) = '{source_type}'"
+        ))
@@ -2,8 +2,23 @@ from extensions import Base
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql.expression import type_coerce
-from sqlalchemy import String, Text, Boolean, DateTime, ColumnElement
-from datetime import datetime, timezone
+from sqlalchemy import String, Text, Boolean, Date, DateTime, BigInteger, LargeBinary, ColumnElement, ForeignKey, Index, text
+from sqlalchemy.types import TypeDecorator
+from datetime import date, datetime, timedelta, timezone
+from config import Config
+
+
+# 'text' (SQLAlchemy's ISO strings) or 'epoch' (integer microseconds since
+# 1970-01-01 UTC). Chosen per process before the models are mapped; existing
+# rows are converted on startup by ``migrations.convert_datetime_storage``
+DATETIME_STORAGE = Config.DATETIME_STORAGE
+
+# With sharding on, event and task ids come from ``shards.allocate_id`` instead
+# of each database's rowids, so they stay unique when a user moves between
+# shards. Also chosen per process before the models are mapped
+SHARDED = Config.SHARD_COUNT > 0
+
+EPOCH = datetime(1970, 1, 1)
 
 
 def from_utc_naive(dt: datetime) -> datetime:
@@ -23,27 +38,130 @@ def to_utc_naive(dt: datetime) -> datetime:
     dt = dt.astimezone(timezone.utc)
     return dt.replace(tzinfo=None)
 
-class Event(Base):
-    __tablename__ = 'events'
+def to_epoch_micros(dt: datetime) -> int:
+    """
+    Converts a datetime (naive values are taken as UTC) to integer
+    microseconds since the Unix epoch
+    """
+
+    if dt.tzinfo is not None:
+        dt = to_utc_naive(dt)
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+def from_epoch_micros(value: int) -> datetime:
+    """
+    Converts integer microseconds since the Unix epoch to naive UTC
+    """
+
+    return EPOCH + timedelta(microseconds=value)
+
+class UTCDateTime(TypeDecorator):
+    """
+    Naive UTC datetime column stored according to DATETIME_STORAGE: as text
+    like ``DateTime`` does, or as integer epoch microseconds so range
+    comparisons and sorting are integer compares. Aware values are
+    normalized to UTC on the way in.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if DATETIME_STORAGE == 'epoch':
+            return dialect.type_descriptor(BigInteger())
+        return dialect.type_descriptor(DateTime())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if DATETIME_STORAGE == 'epoch':
+            return to_epoch_micros(value)
+        if value.tzinfo is not None:
+            value = to_utc_naive(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None or DATETIME_STORAGE != 'epoch':
+            return value
+        return from_epoch_micros(value)
+
+class User(Base):
+    __tablename__ = 'users'
 
     # Auto-generated fields
     id: Mapped[int] = mapped_column(primary_key=True)
     _created_at: Mapped[datetime] = mapped_column(
         'created_at',
-        DateTime,
+        UTCDateTime,
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+    # Required fields
+    email: Mapped[str] = mapped_column(String(254), unique=True)
+    password_hash: Mapped[str] = mapped_column(String(255))
+
+    # Shard holding the user's data (see shards.py); None for the main database
+    shard: Mapped[int | None] = mapped_column(default=None)
+
+    @hybrid_property
+    def created_at(self) -> datetime:
+        return from_utc_naive(self._created_at)
+
+    @created_at.inplace.setter
+    def _created_at_setter(self, value: datetime) -> None:
+        self._created_at = to_utc_naive(value)
+
+    @created_at.inplace.expression
+    @classmethod
+    def _created_at_expression(cls) -> ColumnElement[datetime]:
+        return type_coerce(cls._created_at, UTCDateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'created_at': self.created_at,
+            'email': self.email
+        }
+
+    def __repr__(self):
+        return f'<User {self.id}: {self.email}>'
+
+
+def _allocate_id(context) -> int:
+    from shards import allocate_id
+    return allocate_id(context.current_column.table.name)
+
+
+ID_OPTIONS = {'default': _allocate_id} if SHARDED else {}
+
+
+class EventMixin:
+    """Columns and behaviour shared by ``Event`` and ``ArchivedEvent``."""
+
+    # Auto-generated fields
+    id: Mapped[int] = mapped_column(primary_key=True, **ID_OPTIONS)
+    _created_at: Mapped[datetime] = mapped_column(
+        'created_at',
+        UTCDateTime,
         default=lambda: datetime.now(timezone.utc)
     )
     _updated_at: Mapped[datetime] = mapped_column(
         'updated_at',
-        DateTime,
+        UTCDateTime,
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc)
     )
 
+    # Owner (NULL only for rows created before user accounts existed)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), default=None)
+
+    # Bumped by every update; served as the ETag for If-Match checks
+    version: Mapped[int] = mapped_column(default=1, server_default='1')
+
     # Required fields
     title: Mapped[str] = mapped_column(String(200))
-    _start_time: Mapped[datetime] = mapped_column('start_time', DateTime)
-    _end_time: Mapped[datetime] = mapped_column('end_time', DateTime)
+    _start_time: Mapped[datetime] = mapped_column('start_time', UTCDateTime)
+    _end_time: Mapped[datetime] = mapped_column('end_time', UTCDateTime)
 
     # Optional fields
     description: Mapped[str | None] = mapped_column(Text, default=None)
@@ -61,7 +179,7 @@ class Event(Base):
     @created_at.inplace.expression
     @classmethod
     def _created_at_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._created_at, DateTime)
+        return type_coerce(cls._created_at, UTCDateTime)
 
     @hybrid_property
     def updated_at(self) -> datetime:
@@ -74,7 +192,7 @@ class Event(Base):
     @updated_at.inplace.expression
     @classmethod
     def _updated_at_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._updated_at, DateTime)
+        return type_coerce(cls._updated_at, UTCDateTime)
 
     @hybrid_property
     def start_time(self) -> datetime:
@@ -87,7 +205,7 @@ class Event(Base):
     @start_time.inplace.expression
     @classmethod
     def _start_time_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._start_time, DateTime)
+        return type_coerce(cls._start_time, UTCDateTime)
 
     @hybrid_property
     def end_time(self) -> datetime:
@@ -100,50 +218,92 @@ class Event(Base):
     @end_time.inplace.expression
     @classmethod
     def _end_time_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._end_time, DateTime)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'title': self.title,
-            'start_time': self.start_time.isoformat(),
-            'end_time': self.end_time.isoformat(),
-            'description': self.description,
-            'location': self.location,
-            'all_day': self.all_day
-        }
+        return type_coerce(cls._end_time, UTCDateTime)
+
+    # Serialized field -> (mapped attribute it is read from, getter). Datetimes
+    # stay datetime objects for the response encoder (see formats.py)
+    FIELDS = {
+        'id': ('id', lambda event: event.id),
+        'version': ('version', lambda event: event.version),
+        'created_at': ('_created_at', lambda event: event.created_at),
+        'updated_at': ('_updated_at', lambda event: event.updated_at),
+        'title': ('title', lambda event: event.title),
+        'start_time': ('_start_time', lambda event: event.start_time),
+        'end_time': ('_end_time', lambda event: event.end_time),
+        'description': ('description', lambda event: event.description),
+        'location': ('location', lambda event: event.location),
+        'all_day': ('all_day', lambda event: event.all_day),
+    }
+
+    def to_dict(self, fields=None):
+        """Serialize the event; ``fields`` limits the output to those keys."""
+
+        return {name: self.FIELDS[name][1](self) for name in fields or self.FIELDS}
 
     def __repr__(self):
-        return f'<Event {self.id}: {self.title}>'
+        return f'<{type(self).__name__} {self.id}: {self.title}>'
 
 
-class Task(Base):
-    __tablename__ = 'tasks'
+class Event(EventMixin, Base):
+    __tablename__ = 'events'
+    __table_args__ = (
+        # Every event query is scoped to one user, then seeks on time
+        Index('ix_events_user_start', 'user_id', 'start_time'),
+        # Ids are never handed out twice, so they cannot collide with
+        # archived events or with tombstones clients still hold
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ArchivedEvent(EventMixin, Base):
+    """
+    Event moved out of ``events`` by ``archive.archive_old_rows`` once it
+    ended more than ARCHIVE_AFTER_DAYS ago. Keeps its id; read-only.
+    """
+
+    __tablename__ = 'events_archive'
+    __table_args__ = (
+        Index('ix_events_archive_user_start', 'user_id', 'start_time'),
+    )
+
+
+class TaskMixin:
+    """Columns and behaviour shared by ``Task`` and ``ArchivedTask``."""
 
     # Auto-generated fields
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, **ID_OPTIONS)
     _created_at: Mapped[datetime] = mapped_column(
         'created_at',
-        DateTime,
+        UTCDateTime,
         default=lambda: datetime.now(timezone.utc)
     )
     _updated_at: Mapped[datetime] = mapped_column(
         'updated_at',
-        DateTime,
+        UTCDateTime,
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc)
     )
 
+    # Owner (NULL only for rows created before user accounts existed)
+    user_id: Mapped[int | None] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), default=None)
+
+    # Bumped by every update; served as the ETag for If-Match checks
+    version: Mapped[int] = mapped_column(default=1, server_default='1')
+
     # Required fields
     title: Mapped[str] = mapped_column(String(200))
     description: Mapped[str] = mapped_column(Text)
 
     # Optional fields
     location: Mapped[str | None] = mapped_column(String(200), default=None)
-    _due_datetime: Mapped[datetime | None] = mapped_column('due_datetime', DateTime, default=None)
+    _due_datetime: Mapped[datetime | None] = mapped_column('due_datetime', UTCDateTime, default=None)
     link: Mapped[str | None] = mapped_column(String(300), default=None)
+    estimated_minutes: Mapped[int | None] = mapped_column(default=None)
+    _completed_at: Mapped[datetime | None] = mapped_column('completed_at', UTCDateTime, default=None)
+
+    # Difficulty grade, maintained by grading.grade_task/regrade_tasks
+    points: Mapped[int | None] = mapped_column(default=None)
+    grade_hash: Mapped[str | None] = mapped_column(String(32), default=None)
 
     @hybrid_property
     def created_at(self) -> datetime:
@@ -156,7 +316,7 @@ class Task(Base):
     @created_at.inplace.expression
     @classmethod
     def _created_at_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._created_at, DateTime)
+        return type_coerce(cls._created_at, UTCDateTime)
 
     @hybrid_property
     def updated_at(self) -> datetime:
@@ -169,7 +329,7 @@ class Task(Base):
     @updated_at.inplace.expression
     @classmethod
     def _updated_at_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._updated_at, DateTime)
+        return type_coerce(cls._updated_at, UTCDateTime)
 
     @hybrid_property
     def due_datetime(self) -> datetime | None:
@@ -188,19 +348,217 @@ class Task(Base):
     @due_datetime.inplace.expression
     @classmethod
     def _due_datetime_expression(cls) -> ColumnElement[datetime]:
-        return type_coerce(cls._due_datetime, DateTime)
+        return type_coerce(cls._due_datetime, UTCDateTime)
+
+    @hybrid_property
+    def completed_at(self) -> datetime | None:
+        if self._completed_at is None:
+            return None
+        else:
+            return from_utc_naive(self._completed_at)
+
+    @completed_at.inplace.setter
+    def _completed_at_setter(self, value: datetime | None) -> None:
+        if value is None:
+            self._completed_at = None
+        else:
+            self._completed_at = to_utc_naive(value)
+
+    @completed_at.inplace.expression
+    @classmethod
+    def _completed_at_expression(cls) -> ColumnElement[datetime]:
+        return type_coerce(cls._completed_at, UTCDateTime)
+
+    # Serialized field -> (mapped attribute it is read from, getter). Datetimes
+    # stay datetime objects for the response encoder (see formats.py)
+    FIELDS = {
+        'id': ('id', lambda task: task.id),
+        'version': ('version', lambda task: task.version),
+        'created_at': ('_created_at', lambda task: task.created_at),
+        'updated_at': ('_updated_at', lambda task: task.updated_at),
+        'title': ('title', lambda task: task.title),
+        'description': ('description', lambda task: task.description),
+        'location': ('location', lambda task: task.location),
+        'due_datetime': ('_due_datetime', lambda task: task.due_datetime),
+        'link': ('link', lambda task: task.link),
+        'estimated_minutes': ('estimated_minutes', lambda task: task.estimated_minutes),
+        'points': ('points', lambda task: task.points),
+        'completed': ('_completed_at', lambda task: task.completed_at is not None),
+        'completed_at': ('_completed_at', lambda task: task.completed_at),
+    }
+
+    def to_dict(self, fields=None):
+        """Serialize the task; ``fields`` limits the output to those keys."""
+
+        return {name: self.FIELDS[name][1](self) for name in fields or self.FIELDS}
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.id}: {self.title}>'
+
+
+class Task(TaskMixin, Base):
+    __tablename__ = 'tasks'
+    __table_args__ = (
+        Index('ix_tasks_user_due', 'user_id', 'due_datetime'),
+        # Open tasks only, with every column the next-up ranking scores on
+        # (see urgency.py), so ranking reads neither completed tasks nor the
+        # table. SQLite only treats a partial index as covering when it also
+        # holds the columns of its WHERE clause, hence completed_at
+        Index(
+            'ix_tasks_user_open', 'user_id', 'due_datetime', 'estimated_minutes', 'points', 'completed_at',
+            sqlite_where=text('completed_at IS NULL')
+        ),
+        # Never reuse ids (see Event)
+        {'sqlite_autoincrement': True},
+    )
+
+
+class ArchivedTask(TaskMixin, Base):
+    """
+    Task moved out of ``tasks`` by ``archive.archive_old_rows`` once it was
+    completed (and due, if it has a due date) more than ARCHIVE_AFTER_DAYS
+    ago. Keeps its id; read-only.
+    """
+
+    __tablename__ = 'tasks_archive'
+    __table_args__ = (
+        Index('ix_tasks_archive_user_due', 'user_id', 'due_datetime'),
+    )
+
+
+class RollupMixin:
+    """
+    Per-user progress totals for one UTC period, kept current by
+    ``analytics.adjust_rollups`` on every write and rebuilt in bulk by
+    ``analytics.rebuild_rollups``.
+    """
+
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    # First day of the period (the Monday for weekly rollups)
+    period_start: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    # Tasks by completion day
+    tasks_completed: Mapped[int] = mapped_column(default=0)
+    points_earned: Mapped[int] = mapped_column(default=0)
+    completed_minutes: Mapped[int] = mapped_column(default=0)
+    # Timed events by start day
+    scheduled_minutes: Mapped[int] = mapped_column(default=0)
 
     def to_dict(self):
         return {
-            'id': self.id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'title': self.title,
-            'description': self.description,
-            'location': self.location,
-            'due_datetime': self.due_datetime.isoformat() if self.due_datetime else None,
-            'link': self.link
+            'period_start': self.period_start.isoformat(),
+            'tasks_completed': self.tasks_completed,
+            'points_earned': self.points_earned,
+            'completed_minutes': self.completed_minutes,
+            'scheduled_minutes': self.scheduled_minutes,
         }
 
     def __repr__(self):
-        return f'<Event {self.id}: {self.title}>'
\ No newline at end of file
+        return f'<{type(self).__name__} {self.user_id}: {self.period_start}>'
+
+
+class DailyRollup(RollupMixin, Base):
+    __tablename__ = 'daily_rollups'
+
+
+class WeeklyRollup(RollupMixin, Base):
+    __tablename__ = 'weekly_rollups'
+
+
+class Change(Base):
+    """
+    Change log used for delta sync. Holds one row per event/task that is
+    replaced on every write, so ``seq`` is the entity's latest change and
+    rows with ``deleted`` set act as tombstones for hard deletes.
+    Maintained by triggers (see ``sync.install_change_log``).
+    """
+
+    __tablename__ = 'changes'
+    __table_args__ = (
+        Index('ix_changes_entity', 'entity', 'entity_id', unique=True),
+        Index('ix_changes_user_seq', 'user_id', 'seq'),
+        # AUTOINCREMENT so a replaced row never hands its seq to a later change
+        {'sqlite_autoincrement': True},
+    )
+
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(10))
+    entity_id: Mapped[int]
+    user_id: Mapped[int | None] = mapped_column(default=None)
+    deleted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    def __repr__(self):
+        return f'<Change {self.seq}: {self.entity} {self.entity_id}>'
+
+
+class Notification(Base):
+    """
+    Log of ``/api/stream`` notifications, read by every worker process, in
+    the database of the users they are for. ``data`` is the JSON-encoded
+    payload. Appended by the writes they report, while the user has a
+    ``StreamListener``, and pruned to SSE_HISTORY_SIZE rows by
+    ``notifications.Broker``.
+    """
+
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        # AUTOINCREMENT so a pruned seq is never handed out again
+        {'sqlite_autoincrement': True},
+    )
+
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int]
+    event_type: Mapped[str] = mapped_column(String(50))
+    data: Mapped[str] = mapped_column(Text)
+
+    def __repr__(self):
+        return f'<Notification {self.seq}: {self.event_type}>'
+
+
+class StreamListener(Base):
+    """
+    Lease of a worker process (``worker``, a per-process token) that has
+    ``/api/stream`` clients of a user, in the user's database. Writes only
+    log notifications for users with a live lease. Renewed by
+    ``notifications.Broker`` while the streams are open.
+    """
+
+    __tablename__ = 'stream_listeners'
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    worker: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # Naive UTC; only compared against the current time, never serialized
+    expires_at: Mapped[datetime] = mapped_column(UTCDateTime)
+
+    def __repr__(self):
+        return f'<StreamListener {self.user_id}: {self.worker}>'
+
+
+class IdempotencyRecord(Base):
+    """
+    Stored outcome of a POST sent with an ``Idempotency-Key`` header.
+    ``status_code`` is NULL while the first request is still running.
+    Managed by ``idempotency.idempotent``.
+    """
+
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        Index('ix_idempotency_keys_created', 'created_at'),
+    )
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(64))
+    status_code: Mapped[int | None] = mapped_column(default=None)
+    content_type: Mapped[str | None] = mapped_column(String(100), default=None)
+    body: Mapped[bytes | None] = mapped_column(LargeBinary, default=None)
+    # JSON list of the [name, value] pairs of idempotency.REPLAYED_HEADERS
+    headers: Mapped[str | None] = mapped_column(Text, default=None)
+    # Naive UTC; only compared against TTL cutoffs, never serialized
+    created_at: Mapped[datetime] = mapped_column(
+        UTCDateTime,
+        default=lambda: to_utc_naive(datetime.now(timezone.utc))
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.user_id}: {self.key}>'
@@ -0,0 +1,365 @@
+"""
+Pub/sub broker behind the Server-Sent Events stream.
+
+Notifications are rows of the ``notifications`` log in the database of the
+user they are for (the main database or the user's shard), written by the
+change they report in its own transaction: write routes ``publish`` before
+they commit. They are only written while some worker process has a stream
+of the user open, which it announces with a lease in ``stream_listeners``
+of the same database, so a write nobody listens to costs one primary key
+lookup and no extra commit.
+
+While a process has ``/api/stream`` clients, one poller thread tails the
+log of every database they live in by ``seq`` and appends new rows to the
+small bounded queue of each matching client. So a client sees every write,
+whichever worker handled it, and can resume on any worker. The broker only
+uses lock/queue primitives, so under a cooperative server (e.g. gunicorn's
+gevent worker) each idle client costs a greenlet and a queue, not an OS
+thread.
+"""
+
+import json
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import g
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from extensions import db
+from formats import json_default
+from models import Notification, StreamListener, User
+from shards import router
+
+
+# Rows the poller reads per query
+POLL_BATCH_SIZE = 500
+# Publishes between two prunes of the log
+PRUNE_EVERY = 100
+# Lifetime of a worker's lease on a user's notifications, and how often
+# the poller renews the leases of the users it has streams for
+LEASE_SECONDS = 60
+RENEW_SECONDS = 20
+
+
+def _database_key(shard: int | None) -> str:
+    return 'main' if shard is None else str(shard)
+
+
+class Message:
+    """A published notification, encoded once and shared by all subscribers."""
+
+    __slots__ = ('seq', 'user_id', 'encoded')
+
+    def __init__(self, shard: int | None, seq: int, user_id: int | None, event_type: str, data: str):
+        # ``data`` is the JSON-encoded payload, as stored in the log
+        self.seq = seq
+        self.user_id = user_id
+        self.encoded = f'id: {_database_key(shard)}-{seq}\nevent: {event_type}\ndata: {data}\n\n'
+
+
+class Subscription:
+    """
+    A client's view of the broker: a bounded queue of pending messages, the
+    database whose log it follows and the ``seq`` of the last one queued.
+    """
+
+    def __init__(self, user_id: int, shard: int | None, maxsize: int, seq: int):
+        self.user_id = user_id
+        self.shard = shard
+        self.seq = seq
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def deliver(self, message: Message) -> None:
+        self.seq = message.seq
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            # A client this far behind is dropped; it reconnects with
+            # Last-Event-ID and catches up from the log
+            self.overflowed = True
+
+    def reset(self, shard: int | None, seq: int) -> None:
+        """Tell the client it missed notifications and follow ``shard``'s log from ``seq`` on."""
+
+        self.shard = shard
+        self.deliver(Message(shard, seq, self.user_id, 'reset', '{}'))
+
+    def iter_encoded(self, heartbeat: float):
+        """
+        Yield encoded SSE frames, or a comment frame every ``heartbeat``
+        seconds while idle. Stops when the subscription overflows.
+        """
+
+        while not self.overflowed:
+            try:
+                message = self._queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield message.encoded
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _newest(connection) -> int:
+    return connection.execute(db.select(func.max(Notification.__table__.c.seq))).scalar() or 0
+
+
+class Broker:
+    """
+    Per-user fan-out of the notification logs, with ``Last-Event-ID`` resume.
+
+    Event ids are ``<database>-<seq>``, the same on every worker. A client
+    resuming from an id of another database (its user moved) or whose
+    successors were already pruned (each log keeps SSE_HISTORY_SIZE rows)
+    is told to ``reset`` instead of silently missing events.
+    """
+
+    def __init__(self, history_size: int = 1000, queue_size: int = 100):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._history_size = history_size
+        self._queue_size = queue_size
+        self._app = None
+        # Poller thread, its wake-up signal, the last seq it handed out per
+        # database and when it last renewed this worker's leases
+        self._poller = None
+        self._wake = threading.Event()
+        self._cursors = {}
+        self._renewed = 0.0
+        self._worker = secrets.token_hex(8)
+        self.heartbeat = 15.0
+        self.poll_interval = 0.25
+
+    def init_app(self, app):
+        """Apply the SSE_* settings from the app configuration."""
+
+        with self._lock:
+            # Cursors are positions in the previous app's databases
+            if app is not self._app:
+                self._cursors = {}
+            self._app = app
+            self._history_size = app.config['SSE_HISTORY_SIZE']
+            self._queue_size = app.config['SSE_QUEUE_SIZE']
+            self.heartbeat = app.config['SSE_HEARTBEAT_SECONDS']
+            self.poll_interval = app.config['SSE_POLL_INTERVAL']
+
+        # This worker's streams get its own notifications as soon as they commit
+        if not event.contains(Engine, 'commit', self._committed):
+            event.listen(Engine, 'commit', self._committed)
+            event.listen(Engine, 'rollback', self._rolled_back)
+
+    def after_fork(self) -> None:
+        """Forget the parent's subscribers, poller and leases, which a forked worker does not have."""
+
+        with self._lock:
+            self._subscribers = {}
+            self._poller = None
+            self._wake = threading.Event()
+            self._cursors = {}
+            self._renewed = 0.0
+            self._worker = secrets.token_hex(8)
+
+    def _committed(self, connection):
+        if connection.info.pop('notified', False):
+            self._wake.set()
+
+    def _rolled_back(self, connection):
+        connection.info.pop('notified', None)
+
+    def publish(self, user_id: int, event_type: str, data: dict, connection=None) -> None:
+        """
+        Log a notification for every stream the user has open, on any
+        worker, in the current transaction of ``connection`` (by default the
+        session's, in the user's database); call it before the commit.
+        Writes nothing while no worker has a live lease for the user.
+        """
+
+        if connection is None:
+            connection = db.session.connection(bind_arguments={'mapper': Notification})
+
+        listeners = StreamListener.__table__
+        listened = connection.execute(
+            db.select(listeners.c.worker)
+            .where(listeners.c.user_id == user_id, listeners.c.expires_at > _now())
+            .limit(1)
+        ).first()
+        if listened is None:
+            return
+
+        table = Notification.__table__
+        seq = connection.execute(table.insert().values(
+            user_id=user_id,
+            event_type=event_type,
+            data=json.dumps(data, default=json_default)
+        )).inserted_primary_key[0]
+        if seq % PRUNE_EVERY == 0:
+            connection.execute(table.delete().where(table.c.seq <= seq - self._history_size))
+        connection.info['notified'] = True
+
+    def _lease(self, connection, user_ids) -> None:
+        connection.execute(
+            StreamListener.__table__.insert().prefix_with('OR REPLACE'),
+            [
+                {'user_id': user_id, 'worker': self._worker, 'expires_at': _now() + timedelta(seconds=LEASE_SECONDS)}
+                for user_id in user_ids
+            ]
+        )
+
+    def subscribe(self, user_id: int, last_event_id: str | None = None) -> Subscription:
+        """
+        Register a new subscription for the user, pre-filled with their
+        messages published after ``last_event_id`` when still in the log.
+        """
+
+        shard = g.get('shard')
+        engine = db.session.get_bind(mapper=Notification)
+        table = Notification.__table__
+
+        # Every write committed after the lease logs its notification
+        with engine.begin() as connection:
+            self._lease(connection, [user_id])
+
+        # Under the lock, so the poller cannot hand out rows newer than
+        # ``newest`` before the subscription is registered
+        with self._lock, engine.connect() as connection:
+            newest = _newest(connection)
+            subscription = Subscription(user_id, shard, self._queue_size, newest)
+
+            if last_event_id:
+                key, _, seq = last_event_id.rpartition('-')
+                oldest = connection.execute(db.select(func.min(table.c.seq))).scalar()
+                if key != _database_key(shard) or not seq.isdigit() or int(seq) > newest \
+                        or (oldest is not None and int(seq) + 1 < oldest):
+                    subscription.reset(shard, newest)
+                else:
+                    rows = connection.execute(
+                        db.select(table.c.seq, table.c.event_type, table.c.data)
+                        .where(table.c.seq > int(seq), table.c.user_id == user_id)
+                        .order_by(table.c.seq)
+                    )
+                    for row_seq, event_type, data in rows:
+                        subscription.deliver(Message(shard, row_seq, user_id, event_type, data))
+                    subscription.seq = newest
+
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._cursors.setdefault(shard, newest)
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='sse-poller', daemon=True)
+                self._poller.start()
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        # The lease runs out on its own once the poller stops renewing it
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+
+    def _renew(self, user_ids) -> None:
+        """
+        Renew this worker's leases in each user's current database, and
+        reset the streams of users who moved onto their new database.
+        """
+
+        shards = dict(db.session.execute(db.select(User.id, User.shard).where(User.id.in_(user_ids))).all())
+        db.session.close()
+
+        by_shard = {}
+        for user_id, shard in shards.items():
+            by_shard.setdefault(shard, []).append(user_id)
+
+        newest = {}
+        for shard, ids in by_shard.items():
+            with router.database(shard).begin() as connection:
+                self._lease(connection, ids)
+                newest[shard] = _newest(connection)
+
+        with self._lock:
+            for user_id, shard in shards.items():
+                for subscription in self._subscribers.get(user_id, ()):
+                    if subscription.shard != shard:
+                        self._cursors.setdefault(shard, newest[shard])
+                        subscription.reset(shard, newest[shard])
+
+    def _poll(self):
+        """Hand out new log rows to this process's subscriptions until it has none left."""
+
+        table = Notification.__table__
+
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+                app = self._app
+                followed = {s.shard for subscriptions in self._subscribers.values() for s in subscriptions}
+                self._cursors = {shard: self._cursors[shard] for shard in followed if shard in self._cursors}
+                cursors = dict(self._cursors)
+                user_ids = list(self._subscribers) if time.monotonic() - self._renewed >= RENEW_SECONDS else None
+
+            batches = {}
+            try:
+                with app.app_context():
+                    if user_ids is not None:
+                        self._renew(user_ids)
+                        self._renewed = time.monotonic()
+                    for shard, cursor in cursors.items():
+                        with router.database(shard).connect() as connection:
+                            batches[shard] = connection.execute(
+                                db.select(table.c.seq, table.c.user_id, table.c.event_type, table.c.data)
+                                .where(table.c.seq > cursor)
+                                .order_by(table.c.seq)
+                                .limit(POLL_BATCH_SIZE)
+                            ).all()
+            except (SQLAlchemyError, LookupError):
+                app.logger.exception('Could not read notifications')
+                continue
+
+            with self._lock:
+                for shard, rows in batches.items():
+                    if rows:
+                        self._hand_out(shard, rows)
+                        if len(rows) == POLL_BATCH_SIZE:
+                            self._wake.set()
+
+    def _hand_out(self, shard: int | None, rows) -> None:
+        # Called with the lock held
+        cursor = self._cursors.get(shard)
+        if cursor is None:
+            return
+
+        # Seqs have no gaps, except for rows pruned before this poller read them
+        if rows[0].seq > cursor + 1:
+            for subscriptions in self._subscribers.values():
+                for subscription in subscriptions:
+                    if subscription.shard == shard:
+                        subscription.reset(shard, rows[0].seq - 1)
+
+        for seq, user_id, event_type, data in rows:
+            subscriptions = [
+                s for s in self._subscribers.get(user_id, ())
+                if s.shard == shard and s.seq < seq
+            ]
+            if subscriptions:
+                message = Message(shard, seq, user_id, event_type, data)
+                for subscription in subscriptions:
+                    subscription.deliver(message)
+        self._cursors[shard] = max(cursor, rows[-1].seq)
+
+
+broker = Broker()
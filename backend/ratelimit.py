@@ -0,0 +1,123 @@
+"""
+In-memory rate limiting and admission control for the API blueprint.
+
+Each client gets a token bucket per route, so one noisy client exhausts only
+its own budget (429). On top of that a global cap on in-flight requests
+sheds load (503) before it piles up on SQLite's single writer. Both checks
+are O(1) per request and never touch the database.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g, request, jsonify
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by ``(client, route)``, kept in an LRU so memory stays
+    bounded by ``max_clients`` no matter how many clients show up.
+    """
+
+    def __init__(self, max_clients: int = 10000):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._max_clients = max_clients
+
+    def take(self, key, rate: float, burst: int) -> float:
+        """
+        Take one token from ``key``'s bucket. Returns 0 if the request may
+        proceed, otherwise the seconds until a token becomes available.
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self._max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+
+            tokens = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+
+class AdmissionControl:
+    """Per-app limiter state plus the global in-flight request cap."""
+
+    def __init__(self, app):
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.default_limit = app.config['RATELIMIT_DEFAULT']
+        self.route_limits = app.config['RATELIMIT_ROUTES']
+        self.limiter = RateLimiter(app.config['RATELIMIT_MAX_CLIENTS'])
+        self.slots = threading.BoundedSemaphore(app.config['MAX_CONCURRENT_REQUESTS'])
+
+
+def init_app(app):
+    """Attach admission control state to ``app``."""
+
+    app.extensions['admission'] = AdmissionControl(app)
+
+
+def exempt_from_concurrency_cap(view):
+    """
+    Do not count a view against MAX_CONCURRENT_REQUESTS, for long-lived
+    streams that would otherwise hold a slot while idle.
+    """
+
+    view.exempt_from_concurrency_cap = True
+    return view
+
+
+def _too_many(status, message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit():
+    """
+    ``before_request`` hook, run after authentication: apply the caller's
+    token bucket for this route, then claim a global concurrency slot.
+    """
+
+    control = current_app.extensions['admission']
+    if not control.enabled or request.method == 'OPTIONS':
+        return None
+
+    client = getattr(g, 'user_id', None) or request.remote_addr
+    rate, burst = control.route_limits.get(request.endpoint, control.default_limit)
+
+    retry_after = control.limiter.take((client, request.endpoint), rate, burst)
+    if retry_after:
+        return _too_many(429, 'Too many requests', retry_after)
+
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, 'exempt_from_concurrency_cap', False):
+        return None
+
+    if not control.slots.acquire(blocking=False):
+        return _too_many(503, 'Server is busy, try again shortly', 1)
+    g.admission_slot = True
+
+    return None
+
+
+def release(exc=None):
+    """``teardown_request`` hook: give back the slot claimed by ``admit``."""
+
+    if g.pop('admission_slot', False):
+        current_app.extensions['admission'].slots.release()
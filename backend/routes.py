@@ -1,27 +1,335 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, abort, current_app, g, request, jsonify, stream_with_context
+from werkzeug.security import check_password_hash, generate_password_hash
 from extensions import db
-from models import Event, Task
-from datetime import datetime, timezone
+from sqlalchemy import func, literal
+from sqlalchemy.orm import load_only
+from models import Event, Task, User, UTCDateTime
+from auth import admin_only, allow_query_token, authenticate, encode_token, public
+from ratelimit import admit, exempt_from_concurrency_cap, release
+from formats import negotiate, respond
+from compression import decoded_etag
+from coalesce import coalesced, forget_after_write
+from idempotency import idempotent
+from archive import ARCHIVES, models_for, reaches_archive
+from conflicts import find_conflicts
+from grading import grade_task
+from urgency import next_tasks
+from analytics import METRICS, PERIODS, adjust_rollups, read_rollups
+from bulk import iter_rows
+from backup import BackupError, backup_databases, default_backup_path
+from shards import place_new_user, select_shard
+from groupcommit import save_new
+from search import search
+from ical import ImportResult, import_events, iter_calendar
+from sync import changes_since
+from notifications import broker
+from summary import BUCKET_SIZES, bucket_bounds, summarize
+from validation import (
+    EVENT_SCHEMA, INTERVAL_SCHEMA, LOGIN_SCHEMA, REGISTER_SCHEMA, TASK_SCHEMA, ValidationError, parse_datetime,
+)
+from datetime import date, datetime, timezone
+import heapq
+import os
+import sqlite3
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 api_bp = Blueprint('api', __name__)
+api_bp.before_request(authenticate)
+api_bp.before_request(select_shard)
+api_bp.before_request(admit)
+api_bp.before_request(negotiate)
+api_bp.after_request(forget_after_write)
+api_bp.teardown_request(release)
+
+def parse_fields(model) -> list[str] | None:
+    """
+    Parse the comma separated ``fields`` query parameter against the
+    model's serialized fields. Returns None when it is absent; raises
+    ValueError for unknown field names.
+    """
+
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in model.FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Invalid fields: {', '.join(unknown) or raw!r}. Choose from {', '.join(model.FIELDS)}")
+    return fields
 
-def parse_datetime(date_string: str) -> datetime:
+
+def load_fields(model, fields: list[str] | None, *extra):
     """
-    Parse datetime string and converts to UTC if needed, then returns a UTC datetime object.
+    Loader options that SELECT only the columns behind ``fields`` plus the
+    ``extra`` attributes (e.g. a sort key); no options for all fields.
     """
 
-    dt = datetime.fromisoformat(date_string)
+    if fields is None:
+        return ()
+    columns = dict.fromkeys(getattr(model, model.FIELDS[name][0]) for name in fields)
+    return (load_only(*columns, *extra),)
 
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    else:
-        dt = dt.astimezone(timezone.utc)
-    return dt
+
+def if_match_versions() -> set[int] | None:
+    """
+    Versions accepted by the request's ``If-Match`` header, or None when
+    any version is (no header, or ``*``). Entity tags are row versions.
+    """
+
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    # Tags of compressed responses carry their encoding
+    tags = {decoded_etag(tag) for tag in if_match.as_set()}
+    return {int(tag) for tag in tags if tag.isdigit()}
+
+
+def versioned(payload: dict, status: int, version: int | None = None):
+    """Response (JSON or negotiated format) carrying the row version as its ``ETag``."""
+
+    response = respond(payload, status)
+    version = payload.get('version', version)
+    if version is not None:
+        response.set_etag(str(version))
+    return response
+
+
+def update_owned(model, item_id, values: dict, conditions=(), versions=None):
+    """
+    Apply ``values`` to one of the current user's rows and bump its version
+    in a single ``UPDATE ... RETURNING``. ``conditions`` are extra predicates
+    on the stored row and ``versions`` the accepted If-Match versions.
+    Returns the updated instance, or None if no row matched.
+    """
+
+    stmt = (
+        db.update(model)
+        .where(model.id == item_id, model.user_id == g.user_id, *conditions)
+        .values(**values, version=model.version + 1)
+        .returning(model)
+    )
+    if versions is not None:
+        stmt = stmt.where(model.version.in_(versions))
+    return db.session.scalar(stmt)
+
+
+def write_failure(model, item_id, versions, message=None):
+    """
+    Response for a conditional write that matched no row: 404 if the row
+    does not exist, 412 if its version fails If-Match, otherwise 400 with
+    ``message`` (a failed ``conditions`` check of ``update_owned``).
+    """
+
+    version = db.session.scalar(
+        db.select(model.version).where(model.id == item_id, model.user_id == g.user_id)
+    )
+    db.session.rollback()
+
+    if version is None:
+        return jsonify({'error': 'Resource not found'}), 404
+    if versions is not None and version not in versions:
+        response = jsonify({'error': 'The item was modified by another request; fetch it and retry'})
+        response.status_code = 412
+        response.set_etag(str(version))
+        return response
+    return jsonify({'error': message}), 400
+
+
+def get_owned_or_404(model, item_id, include_archive=False, fields=None):
+    """
+    Fetch one of the current user's rows by id, or abort with 404.
+    Rows owned by other users are indistinguishable from missing ones.
+    With ``include_archive``, rows moved to the archive table are found too;
+    ``fields`` limits the columns loaded (see ``load_fields``).
+    """
+
+    item = db.session.scalar(
+        db.select(model)
+        .where(model.id == item_id, model.user_id == g.user_id)
+        .options(*load_fields(model, fields, model.version))
+    )
+    if item is None and include_archive:
+        archived_model = ARCHIVES[model]
+        item = db.session.scalar(
+            db.select(archived_model)
+            .where(archived_model.id == item_id, archived_model.user_id == g.user_id)
+            .options(*load_fields(archived_model, fields, archived_model.version))
+        )
+    if item is None:
+        abort(404)
+    return item
+
+
+
+##################### Auth Routes #####################
+@api_bp.route('/auth/register', methods=['POST'])
+@public
+def register():
+    """
+    Create a user account and return an access token
+    ---
+    tags:
+      - Auth
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - email
+            - password
+          properties:
+            email:
+              type: string
+              example: "user@example.com"
+            password:
+              type: string
+              description: At least 8 characters
+              example: "correct horse battery"
+    responses:
+      201:
+        description: User created
+        schema:
+          type: object
+          properties:
+            user:
+              type: object
+            access_token:
+              type: string
+      400:
+        description: Invalid input or validation error
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      409:
+        description: Email already registered
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    try:
+        values = REGISTER_SCHEMA.validate(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
+
+    email, password = values['email'], values['password']
+
+    if db.session.scalar(db.select(User.id).where(User.email == email)) is not None:
+        return jsonify({'error': 'Email already registered'}), 409
+
+    try:
+        user = User(email=email, password_hash=generate_password_hash(password))
+        db.session.add(user)
+        db.session.flush()
+        place_new_user(user)
+        db.session.commit()
+
+        return jsonify({'user': user.to_dict(), 'access_token': encode_token(user.id)}), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@api_bp.route('/auth/login', methods=['POST'])
+@public
+def login():
+    """
+    Exchange email and password for an access token
+    ---
+    tags:
+      - Auth
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - email
+            - password
+          properties:
+            email:
+              type: string
+            password:
+              type: string
+    responses:
+      200:
+        description: Access token to send in the Authorization header with the Bearer scheme
+        schema:
+          type: object
+          properties:
+            access_token:
+              type: string
+      400:
+        description: Body is not a JSON object with string email and password
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      401:
+        description: Invalid credentials
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    try:
+        values = LOGIN_SCHEMA.validate(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
+
+    user = db.session.scalar(db.select(User).where(User.email == values['email']))
+    if user is None or not check_password_hash(user.password_hash, values['password']):
+        return jsonify({'error': 'Invalid email or password'}), 401
+
+    return jsonify({'access_token': encode_token(user.id)}), 200
+
+
+@api_bp.route('/auth/me', methods=['GET'])
+def get_current_user():
+    """
+    Get the authenticated user
+    ---
+    tags:
+      - Auth
+    responses:
+      200:
+        description: User details
+        schema:
+          type: object
+          properties:
+            id:
+              type: integer
+            email:
+              type: string
+            created_at:
+              type: string
+              format: date-time
+      401:
+        description: Missing or invalid token
+      404:
+        description: User no longer exists
+    """
+
+    user = db.get_or_404(User, g.user_id)
+    return jsonify(user.to_dict()), 200
 
 
 
 ##################### Event Routes #####################
 @api_bp.route('/events', methods=['GET'])
+@coalesced
 def get_events():
     """
     Get all events, optionally filtered by date range
@@ -39,6 +347,11 @@ def get_events():
         type: string
         required: false
         description: ISO 8601 formatted end time to filter events (e.g., 2025-10-14T23:59:59)
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated event fields to return (e.g. id,title,start_time,end_time); only those columns are read
     responses:
       200:
         description: List of events
@@ -75,26 +388,42 @@ def get_events():
     start = request.args.get('start')
     end = request.args.get('end')
 
-    stmt = db.select(Event)
     start_dt = None
     end_dt = None
 
+    try:
+        fields = parse_fields(Event)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     try:
         if start:
             start_dt = parse_datetime(start)
-            stmt = stmt.where(Event.end_time > start_dt)
         if end:
             end_dt = parse_datetime(end)
-            stmt = stmt.where(Event.start_time < end_dt)
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
 
     if start_dt and end_dt and end_dt < start_dt:
         return jsonify({'error': 'End time cannot be before start time'}), 400
 
-    events = db.session.scalars(stmt.order_by(Event.start_time)).all()
+    events = []
+    for model in models_for(Event, start_dt):
+        stmt = (
+            db.select(model)
+            .where(model.user_id == g.user_id)
+            .options(*load_fields(model, fields, model._start_time))
+        )
+        if start_dt:
+            stmt = stmt.where(model.end_time > start_dt)
+        if end_dt:
+            stmt = stmt.where(model.start_time < end_dt)
+        events.extend(db.session.scalars(stmt.order_by(model.start_time)))
+
+    # Interleave archived events (if any) with the live ones
+    events.sort(key=lambda event: event.start_time)
 
-    return jsonify([event.to_dict() for event in events]), 200
+    return respond([event.to_dict(fields) for event in events], 200)
 
 
 @api_bp.route('/events/<int:event_id>', methods=['GET'])
@@ -110,6 +439,11 @@ def get_event(event_id):
         type: integer
         required: true
         description: ID of the event to retrieve
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated event fields to return (e.g. id,title); only those columns are read
     responses:
       200:
         description: Event details
@@ -136,11 +470,17 @@ def get_event(event_id):
         description: Event not found
     """
 
-    event = db.get_or_404(Event, event_id)
-    return jsonify(event.to_dict()), 200
+    try:
+        fields = parse_fields(Event)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    event = get_owned_or_404(Event, event_id, include_archive=True, fields=fields)
+    return versioned(event.to_dict(fields), 200, event.version)
 
 
 @api_bp.route('/events', methods=['POST'])
+@idempotent
 def create_event():
     """
     Create a new event
@@ -148,6 +488,11 @@ def create_event():
     tags:
       - Events
     parameters:
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Unique key for this request; retries with the same key replay the first response instead of creating a duplicate
       - name: body
         in: body
         required: true
@@ -213,6 +558,9 @@ def create_event():
           properties:
             error:
               type: string
+            errors:
+              type: object
+              description: Message per invalid field
       500:
         description: Server error
         schema:
@@ -222,47 +570,24 @@ def create_event():
               type: string
     """
 
-    data = request.get_json()
-
     try:
-        title = data.get('title', '').strip()
-        if not title:
-            return jsonify({'error': 'Title cannot be empty'}), 400
-
-        if 'start_time' not in data or not data['start_time']:
-            return jsonify({'error': 'Start time is required'}), 400
-        if 'end_time' not in data or not data['end_time']:
-            return jsonify({'error': 'End time is required'}), 400
+        values = EVENT_SCHEMA.validate(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
 
-        try:
-            start_time = parse_datetime(data['start_time'])
-            end_time = parse_datetime(data['end_time'])
-        except ValueError:
-            return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
-
-        if end_time < start_time:
-            return jsonify({'error': 'End time cannot be before start time'}), 400
-
-        event = Event(
-            title=title,
-            description=data.get('description', None),
-            start_time=start_time,
-            end_time=end_time,
-            location=data.get('location', None),
-            all_day=data.get('all_day', False)
-        )
+    try:
+        event = Event(user_id=g.user_id, **values)
 
-        db.session.add(event)
-        db.session.commit()
+        save_new(event, rollups=True, event_type='event.created')
 
-        return jsonify(event.to_dict()), 201
+        return versioned(event.to_dict(), 201)
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
-@api_bp.route('/events/<int:event_id>', methods=['PUT'])
+@api_bp.route('/events/<int:event_id>', methods=['PUT', 'PATCH'])
 def update_event(event_id):
     """
     Update an existing event
@@ -275,6 +600,11 @@ def update_event(event_id):
         type: integer
         required: true
         description: ID of the event to update
+      - name: If-Match
+        in: header
+        type: string
+        required: false
+        description: ETag (version) from a previous response; the write only happens if the event is still at that version
       - name: body
         in: body
         required: true
@@ -335,8 +665,13 @@ def update_event(event_id):
           properties:
             error:
               type: string
+            errors:
+              type: object
+              description: Message per invalid field
       404:
         description: Event not found
+      412:
+        description: The event changed since the If-Match version; the response ETag is its current version
       500:
         description: Server error
         schema:
@@ -346,71 +681,47 @@ def update_event(event_id):
               type: string
     """
 
-    event = db.get_or_404(Event, event_id)
-    data = request.get_json()
+    try:
+        values = EVENT_SCHEMA.validate(request.get_json(silent=True), partial=True)
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
+
+    versions = if_match_versions()
+    conditions = []
+    message = None
 
     try:
-        if 'title' in data:
-            title = data.get('title', '').strip()
-            if not title:
-                db.session.rollback()
-                return jsonify({'error': 'Title cannot be empty'}), 400
-            event.title = title
-
-        new_start_time = None
-        new_end_time = None
-        if 'start_time' in data:
-            try:
-                new_start_time = parse_datetime(data['start_time'])
-            except ValueError:
-                db.session.rollback()
-                return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
-
-        if 'end_time' in data:
-            try:
-                new_end_time = parse_datetime(data['end_time'])
-            except ValueError:
-                db.session.rollback()
-                return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
-
-        if new_start_time and new_end_time:
-            if new_end_time < new_start_time:
-                db.session.rollback()
-                return jsonify({'error': 'End time cannot be before start time'}), 400
-        elif new_start_time and new_start_time > event.end_time:
-            db.session.rollback()
-            return jsonify({'error': 'Start time cannot be after existing end time'}), 400
-        elif new_end_time and new_end_time < event.start_time:
-            db.session.rollback()
-            return jsonify({'error': 'End time cannot be before existing start time'}), 400
+        # Both times given were checked against each other by the schema; a
+        # single one is checked against the stored other by the UPDATE itself
+        new_start_time = values.pop('start_time', None)
+        new_end_time = values.pop('end_time', None)
+        if new_start_time and not new_end_time:
+            conditions.append(Event.end_time >= new_start_time)
+            message = 'Start time cannot be after existing end time'
+        elif new_end_time and not new_start_time:
+            conditions.append(Event.start_time <= new_end_time)
+            message = 'End time cannot be before existing start time'
 
         if new_start_time:
-            event.start_time = new_start_time
+            values['_start_time'] = new_start_time
         if new_end_time:
-            event.end_time = new_end_time
+            values['_end_time'] = new_end_time
 
-        if 'description' in data:
-            description = data.get('description', '').strip()
-            if description:
-                event.description = description
-            else:
-                event.description = None
-
-        if 'location' in data:
-            location = data.get('location', '').strip()
-            if location:
-                event.location = location
-            else:
-                event.location = None
+        # Only time changes move scheduled minutes between rollup periods
+        rescheduled = bool(values.keys() & {'_start_time', '_end_time', 'all_day'})
+        if rescheduled:
+            adjust_rollups(Event, [event_id], sign=-1)
 
-        if 'all_day' in data:
-            if not isinstance(data['all_day'], bool):
-                db.session.rollback()
-                return jsonify({'error': 'all_day must be a boolean'}), 400
-            event.all_day = data['all_day']
+        event = update_owned(Event, event_id, values, conditions, versions)
+        if event is None:
+            return write_failure(Event, event_id, versions, message)
+        if rescheduled:
+            adjust_rollups(Event, [event.id])
 
+        payload = event.to_dict()
+        broker.publish(g.user_id, 'event.updated', payload)
         db.session.commit()
-        return jsonify(event.to_dict()), 200
+        return versioned(payload, 200)
 
     except Exception as e:
         db.session.rollback()
@@ -430,11 +741,18 @@ def delete_event(event_id):
         type: integer
         required: true
         description: ID of the event to delete
+      - name: If-Match
+        in: header
+        type: string
+        required: false
+        description: ETag (version) from a previous response; the write only happens if the event is still at that version
     responses:
       204:
         description: Event deleted successfully
       404:
         description: Event not found
+      412:
+        description: The event changed since the If-Match version; the response ETag is its current version
       500:
         description: Server error
         schema:
@@ -444,10 +762,16 @@ def delete_event(event_id):
               type: string
     """
 
-    event = db.get_or_404(Event, event_id)
+    versions = if_match_versions()
+    stmt = db.delete(Event).where(Event.id == event_id, Event.user_id == g.user_id).returning(Event.id)
+    if versions is not None:
+        stmt = stmt.where(Event.version.in_(versions))
 
     try:
-        db.session.delete(event)
+        adjust_rollups(Event, [event_id], sign=-1)
+        if db.session.scalar(stmt) is None:
+            return write_failure(Event, event_id, versions)
+        broker.publish(g.user_id, 'event.deleted', {'id': event_id})
         db.session.commit()
         return '', 204
 
@@ -457,50 +781,67 @@ def delete_event(event_id):
 
 
 
-##################### Task Routes #####################
-@api_bp.route('/tasks', methods=['GET'])
-def get_tasks():
+@api_bp.route('/events/summary', methods=['GET'])
+@coalesced
+def get_events_summary():
     """
-    Get all tasks, optionally filtered by due date range
+    Get per-day or per-week event counts, busy minutes and task due counts
     ---
     tags:
-      - Tasks
+      - Events
     parameters:
       - name: start
         in: query
         type: string
-        required: false
-        description: ISO 8601 formatted start date to filter tasks
+        required: true
+        description: ISO 8601 formatted start of the range; rounded down to the start of its bucket
       - name: end
         in: query
         type: string
+        required: true
+        description: ISO 8601 formatted end of the range (exclusive)
+      - name: bucket
+        in: query
+        type: string
+        enum: [day, week]
         required: false
-        description: ISO 8601 formatted end date to filter tasks
+        default: day
+        description: Bucket size; weeks start on Monday
+      - name: tz
+        in: query
+        type: string
+        required: false
+        default: UTC
+        description: IANA timezone that bucket boundaries are aligned to (e.g., America/New_York)
     responses:
       200:
-        description: List of tasks
+        description: One entry per bucket, including empty ones
         schema:
-          type: array
-          items:
-            type: object
-            properties:
-              id:
-                type: integer
-              title:
-                type: string
-              description:
-                type: string
-              due_datetime:
-                type: string
-                format: date-time
-              completed:
-                type: boolean
-              priority:
-                type: string
-              category:
-                type: string
+          type: object
+          properties:
+            bucket:
+              type: string
+            tz:
+              type: string
+            buckets:
+              type: array
+              items:
+                type: object
+                properties:
+                  start:
+                    type: string
+                    format: date-time
+                  end:
+                    type: string
+                    format: date-time
+                  event_count:
+                    type: integer
+                  busy_minutes:
+                    type: integer
+                  tasks_due:
+                    type: integer
       400:
-        description: Invalid date format or date range
+        description: Missing or invalid range, bucket or timezone
         schema:
           type: object
           properties:
@@ -508,82 +849,547 @@ def get_tasks():
               type: string
     """
 
-
     start = request.args.get('start')
     end = request.args.get('end')
-
-    stmt = db.select(Task)
-    start_dt = None
-    end_dt = None
+    if not start or not end:
+        return jsonify({'error': 'start and end are required'}), 400
 
     try:
-        if start:
-            start_dt = parse_datetime(start)
-            stmt = stmt.where(Task.due_datetime >= start_dt)
-        if end:
-            end_dt = parse_datetime(end)
-            stmt = stmt.where(Task.due_datetime <= end_dt)
-
+        start_dt = parse_datetime(start)
+        end_dt = parse_datetime(end)
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
 
-    if start_dt and end_dt and end_dt < start_dt:
-        return jsonify({'error': 'End date cannot be before start date'}), 400
+    if end_dt < start_dt:
+        return jsonify({'error': 'End time cannot be before start time'}), 400
 
-    stmt = stmt.order_by(Task.due_datetime.nulls_last())
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKET_SIZES:
+        return jsonify({'error': 'bucket must be "day" or "week"'}), 400
+
+    tz_name = request.args.get('tz', 'UTC')
+    try:
+        tz = ZoneInfo(tz_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return jsonify({'error': f'Unknown timezone: {tz_name}'}), 400
 
-    tasks = db.session.scalars(stmt).all()
+    try:
+        bounds = bucket_bounds(start_dt, end_dt, bucket, tz)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    return jsonify([task.to_dict() for task in tasks]), 200
+    return respond({
+        'bucket': bucket,
+        'tz': tz_name,
+        'buckets': summarize(g.user_id, bounds, include_archive=bool(bounds) and reaches_archive(bounds[0][0]))
+    }, 200)
 
 
-@api_bp.route('/tasks/<int:task_id>', methods=['GET'])
-def get_task(task_id):
+@api_bp.route('/events/conflicts', methods=['POST'])
+def check_event_conflicts():
     """
-    Get a single task by ID
+    Find existing events overlapping one or more proposed intervals
     ---
     tags:
-      - Tasks
+      - Events
     parameters:
-      - name: task_id
-        in: path
-        type: integer
+      - in: body
+        name: body
         required: true
-        description: ID of the task to retrieve
-    responses:
-      200:
-        description: Task details
+        description: A single interval, or a list of them under "intervals"
         schema:
           type: object
           properties:
-            id:
-              type: integer
-            title:
-              type: string
-            description:
-              type: string
-            due_datetime:
+            start_time:
               type: string
               format: date-time
-            completed:
-              type: boolean
-            priority:
-              type: string
-            category:
-              type: string
-            location:
+            end_time:
               type: string
-            link:
+              format: date-time
+            intervals:
+              type: array
+              items:
+                type: object
+                required:
+                  - start_time
+                  - end_time
+                properties:
+                  start_time:
+                    type: string
+                    format: date-time
+                  end_time:
+                    type: string
+                    format: date-time
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated event fields to return for conflicting events
+    responses:
+      200:
+        description: Conflicting events per interval (by index in the request); intervals without conflicts are left out
+        schema:
+          type: object
+          properties:
+            checked:
+              type: integer
+            conflicts:
+              type: array
+              items:
+                type: object
+                properties:
+                  index:
+                    type: integer
+                  events:
+                    type: array
+                    items:
+                      type: object
+      400:
+        description: Invalid intervals
+        schema:
+          type: object
+          properties:
+            error:
               type: string
-      404:
+            errors:
+              type: object
+              description: Messages per invalid field, keyed by interval index
+    """
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    intervals = data['intervals'] if 'intervals' in data else [data]
+    if not isinstance(intervals, list) or not intervals:
+        return jsonify({'error': 'intervals must be a non-empty list'}), 400
+
+    max_intervals = current_app.config['MAX_CONFLICT_INTERVALS']
+    if len(intervals) > max_intervals:
+        return jsonify({'error': f'At most {max_intervals} intervals can be checked at once'}), 400
+
+    try:
+        fields = parse_fields(Event)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        proposals = [
+            (interval['start_time'], interval['end_time'])
+            for interval in INTERVAL_SCHEMA.validate_many(intervals, label='Interval')
+        ]
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
+
+    conflicts = find_conflicts(
+        g.user_id,
+        proposals,
+        options=lambda model: load_fields(model, fields, model._start_time, model._end_time)
+    )
+
+    return respond({
+        'checked': len(proposals),
+        'conflicts': [
+            {'index': i, 'events': [event.to_dict(fields) for event in events]}
+            for i, events in conflicts.items()
+        ]
+    }, 200)
+
+
+@api_bp.route('/events/import', methods=['POST'])
+def import_ical_events():
+    """
+    Bulk import events from an iCalendar (.ics) file
+    ---
+    tags:
+      - Events
+    consumes:
+      - multipart/form-data
+      - text/calendar
+    parameters:
+      - name: file
+        in: formData
+        type: file
+        required: false
+        description: The .ics file to import (alternatively send it as a text/calendar request body)
+    responses:
+      201:
+        description: Import finished; recurring events are expanded into one event per occurrence
+        schema:
+          type: object
+          properties:
+            imported:
+              type: integer
+            skipped:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: string
+      400:
+        description: No calendar was supplied
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      500:
+        description: Server error (chunks committed before the failure are kept)
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+            imported:
+              type: integer
+              description: Events committed before the failure
+            skipped:
+              type: integer
+    """
+
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+    elif request.mimetype == 'text/calendar':
+        stream = request.stream
+    else:
+        return jsonify({'error': 'Upload a .ics file as "file" or send a text/calendar body'}), 400
+
+    lines = (raw.decode('utf-8', errors='replace') for raw in stream)
+    result = ImportResult()
+
+    try:
+        import_events(
+            lines,
+            g.user_id,
+            chunk_size=current_app.config['ICAL_IMPORT_CHUNK_SIZE'],
+            horizon_days=current_app.config['ICAL_RECURRENCE_HORIZON_DAYS'],
+            max_occurrences=current_app.config['ICAL_MAX_OCCURRENCES'],
+            result=result
+        )
+    except Exception as e:
+        db.session.rollback()
+        if result.imported:
+            broker.publish(g.user_id, 'events.imported', {'count': result.imported})
+            db.session.commit()
+        return jsonify({'error': str(e), 'imported': result.imported, 'skipped': result.skipped}), 500
+
+    if result.imported:
+        broker.publish(g.user_id, 'events.imported', {'count': result.imported})
+        db.session.commit()
+
+    return respond({
+        'imported': result.imported,
+        'skipped': result.skipped,
+        'errors': result.errors
+    }, 201)
+
+
+@api_bp.route('/events/export.ics', methods=['GET'])
+def export_ical_events():
+    """
+    Export events as an iCalendar (.ics) file, optionally filtered by date range
+    ---
+    tags:
+      - Events
+    produces:
+      - text/calendar
+    parameters:
+      - name: start
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted start time to filter events (e.g., 2025-10-13T00:00:00)
+      - name: end
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted end time to filter events (e.g., 2025-10-14T23:59:59)
+    responses:
+      200:
+        description: Streamed iCalendar document
+      400:
+        description: Invalid date format or date range
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+
+    start_dt = None
+    end_dt = None
+
+    try:
+        if start:
+            start_dt = parse_datetime(start)
+        if end:
+            end_dt = parse_datetime(end)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
+
+    if start_dt and end_dt and end_dt < start_dt:
+        return jsonify({'error': 'End time cannot be before start time'}), 400
+
+    statements = []
+    for model in models_for(Event, start_dt):
+        # Plain column rows keep the identity map empty while streaming
+        stmt = db.select(
+            model.id,
+            model.title,
+            model.description,
+            model.location,
+            model.all_day,
+            model.start_time.label('start_time'),
+            model.end_time.label('end_time'),
+            model.updated_at.label('updated_at')
+        ).where(model.user_id == g.user_id)
+        if start_dt:
+            stmt = stmt.where(model.end_time > start_dt)
+        if end_dt:
+            stmt = stmt.where(model.start_time < end_dt)
+        statements.append(stmt.order_by(model.start_time))
+
+    def generate():
+        # Both streams are ordered by start time; merge archived rows in
+        rows = heapq.merge(*(iter_rows(stmt) for stmt in statements), key=lambda row: row.start_time)
+        yield from iter_calendar(rows)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/calendar',
+        headers={'Content-Disposition': 'attachment; filename="gamify.ics"'}
+    )
+
+
+##################### Task Routes #####################
+@api_bp.route('/tasks', methods=['GET'])
+@coalesced
+def get_tasks():
+    """
+    Get all tasks, optionally filtered by due date range
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: start
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted start date to filter tasks
+      - name: end
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted end date to filter tasks
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated task fields to return (e.g. id,title); only those columns are read
+    responses:
+      200:
+        description: List of tasks
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              title:
+                type: string
+              description:
+                type: string
+              due_datetime:
+                type: string
+                format: date-time
+              completed:
+                type: boolean
+              estimated_minutes:
+                type: integer
+              points:
+                type: integer
+      400:
+        description: Invalid date format or date range
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+
+    start_dt = None
+    end_dt = None
+
+    try:
+        fields = parse_fields(Task)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if start:
+            start_dt = parse_datetime(start)
+        if end:
+            end_dt = parse_datetime(end)
+
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
+
+    if start_dt and end_dt and end_dt < start_dt:
+        return jsonify({'error': 'End date cannot be before start date'}), 400
+
+    tasks = []
+    for model in models_for(Task, start_dt):
+        stmt = (
+            db.select(model)
+            .where(model.user_id == g.user_id)
+            .options(*load_fields(model, fields, model._due_datetime))
+        )
+        if start_dt:
+            stmt = stmt.where(model.due_datetime >= start_dt)
+        if end_dt:
+            stmt = stmt.where(model.due_datetime <= end_dt)
+        tasks.extend(db.session.scalars(stmt.order_by(model.due_datetime.nulls_last())))
+
+    # Interleave archived tasks (if any) with the live ones, undated last
+    tasks.sort(key=lambda task: (task.due_datetime is None, task.due_datetime and task.due_datetime.timestamp()))
+
+    return respond([task.to_dict(fields) for task in tasks], 200)
+
+
+@api_bp.route('/tasks/next', methods=['GET'])
+@coalesced
+def get_next_tasks():
+    """
+    Get the most urgent open tasks, most urgent first
+    ---
+    tags:
+      - Tasks
+    description: >
+      Ranks open tasks by deadline * urgency + points, where urgency grows
+      as the time left before a task must be started (hours until due minus
+      its estimated duration) runs out, and is 0 for tasks without a due date.
+      Weights are set in NEXT_TASKS_MODEL.
+    parameters:
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Number of tasks to return (1-50, default 5)
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated task fields to return (e.g. id,title); only those columns are read
+    responses:
+      200:
+        description: Open tasks in ranking order
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id:
+                type: integer
+              title:
+                type: string
+              due_datetime:
+                type: string
+                format: date-time
+              estimated_minutes:
+                type: integer
+              points:
+                type: integer
+      400:
+        description: Invalid limit or fields
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    max_tasks = current_app.config['MAX_NEXT_TASKS']
+    limit = request.args.get('limit', 5, type=int)
+    if not 1 <= limit <= max_tasks:
+        return jsonify({'error': f'limit must be between 1 and {max_tasks}'}), 400
+
+    try:
+        fields = parse_fields(Task)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    tasks = next_tasks(g.user_id, limit, options=load_fields(Task, fields))
+    return respond([task.to_dict(fields) for task in tasks], 200)
+
+
+@api_bp.route('/tasks/<int:task_id>', methods=['GET'])
+def get_task(task_id):
+    """
+    Get a single task by ID
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: task_id
+        in: path
+        type: integer
+        required: true
+        description: ID of the task to retrieve
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma separated task fields to return (e.g. id,title); only those columns are read
+    responses:
+      200:
+        description: Task details
+        schema:
+          type: object
+          properties:
+            id:
+              type: integer
+            title:
+              type: string
+            description:
+              type: string
+            due_datetime:
+              type: string
+              format: date-time
+            completed:
+              type: boolean
+            location:
+              type: string
+            link:
+              type: string
+            estimated_minutes:
+              type: integer
+            points:
+              type: integer
+              description: Difficulty grade of the task
+      404:
         description: Task not found
     """
 
-    task = db.get_or_404(Task, task_id)
-    return jsonify(task.to_dict()), 200
+    try:
+        fields = parse_fields(Task)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    task = get_owned_or_404(Task, task_id, include_archive=True, fields=fields)
+    return versioned(task.to_dict(fields), 200, task.version)
 
 
 @api_bp.route('/tasks', methods=['POST'])
+@idempotent
 def create_task():
     """
     Create a new task
@@ -591,6 +1397,11 @@ def create_task():
     tags:
       - Tasks
     parameters:
+      - name: Idempotency-Key
+        in: header
+        type: string
+        required: false
+        description: Unique key for this request; retries with the same key replay the first response instead of creating a duplicate
       - name: body
         in: body
         required: true
@@ -621,6 +1432,10 @@ def create_task():
               type: string
               description: Related link for the task
               example: "https://docs.example.com/proposal"
+            estimated_minutes:
+              type: integer
+              description: Estimated time to complete the task, in minutes
+              example: 90
     responses:
       201:
         description: Task created successfully
@@ -638,14 +1453,15 @@ def create_task():
               format: date-time
             completed:
               type: boolean
-            priority:
-              type: string
-            category:
-              type: string
             location:
               type: string
             link:
               type: string
+            estimated_minutes:
+              type: integer
+            points:
+              type: integer
+              description: Difficulty grade of the task
       400:
         description: Invalid input or validation error
         schema:
@@ -653,6 +1469,9 @@ def create_task():
           properties:
             error:
               type: string
+            errors:
+              type: object
+              description: Message per invalid field
       500:
         description: Server error
         schema:
@@ -662,43 +1481,27 @@ def create_task():
               type: string
     """
 
-    data = request.get_json()
+    try:
+        values = TASK_SCHEMA.validate(request.get_json(silent=True))
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
 
     try:
-        title = data.get('title', '').strip()
-        if not title:
-            return jsonify({'error': 'Title cannot be empty'}), 400
-
-        description = data.get('description', '').strip()
-        if not description:
-            return jsonify({'error': 'Description cannot be empty'}), 400
-
-        due_datetime = None
-        if 'due_datetime' in data and data['due_datetime']:
-            try:
-                due_datetime = parse_datetime(data['due_datetime'])
-            except ValueError:
-                return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
-
-        task = Task(
-            title=title,
-            description=description,
-            location=data.get('location', None),
-            due_datetime=due_datetime,
-            link=data.get('link', None)
-        )
+        # Tasks start out open
+        values.pop('completed', None)
+        task = Task(user_id=g.user_id, **values)
+        grade_task(task)
 
-        db.session.add(task)
-        db.session.commit()
+        save_new(task, event_type='task.created')
 
-        return jsonify(task.to_dict()), 201
+        return versioned(task.to_dict(), 201)
 
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
-@api_bp.route('/tasks/<int:task_id>', methods=['PUT'])
+@api_bp.route('/tasks/<int:task_id>', methods=['PUT', 'PATCH'])
 def update_task(task_id):
     """
     Update an existing task
@@ -711,6 +1514,11 @@ def update_task(task_id):
         type: integer
         required: true
         description: ID of the task to update
+      - name: If-Match
+        in: header
+        type: string
+        required: false
+        description: ETag (version) from a previous response; the write only happens if the task is still at that version
       - name: body
         in: body
         required: true
@@ -738,6 +1546,14 @@ def update_task(task_id):
               type: string
               description: Updated link (empty string sets to None)
               example: "https://docs.example.com/updated-proposal"
+            estimated_minutes:
+              type: integer
+              description: Updated time estimate in minutes (null clears it)
+              example: 120
+            completed:
+              type: boolean
+              description: Mark the task as completed (records completed_at) or not completed
+              example: true
     responses:
       200:
         description: Task updated successfully
@@ -755,14 +1571,15 @@ def update_task(task_id):
               format: date-time
             completed:
               type: boolean
-            priority:
-              type: string
-            category:
-              type: string
             location:
               type: string
             link:
               type: string
+            estimated_minutes:
+              type: integer
+            points:
+              type: integer
+              description: Difficulty grade of the task
       400:
         description: Invalid input or validation error
         schema:
@@ -770,8 +1587,13 @@ def update_task(task_id):
           properties:
             error:
               type: string
+            errors:
+              type: object
+              description: Message per invalid field
       404:
         description: Task not found
+      412:
+        description: The task changed since the If-Match version; the response ETag is its current version
       500:
         description: Server error
         schema:
@@ -781,51 +1603,39 @@ def update_task(task_id):
               type: string
     """
 
-    task = db.get_or_404(Task, task_id)
-    data = request.get_json()
+    try:
+        values = TASK_SCHEMA.validate(request.get_json(silent=True), partial=True)
+    except ValidationError as e:
+        return jsonify(e.to_dict()), 400
+
+    versions = if_match_versions()
 
     try:
-        if 'title' in data:
-            title = data.get('title', '').strip()
-            if not title:
-                db.session.rollback()
-                return jsonify({'error': 'Title cannot be empty'}), 400
-            task.title = title
-
-        if 'description' in data:
-            description = data.get('description', '').strip()
-            if not description:
-                db.session.rollback()
-                return jsonify({'error': 'Description cannot be empty'}), 400
-            task.description = description
-
-        if 'location' in data:
-            location = data.get('location', '').strip()
-            if location:
-                task.location = location
-            else:
-                task.location = None
-
-        if 'due_datetime' in data:
-            due_datetime = data.get('due_datetime', '').strip()
-            if due_datetime:
-                try:
-                    task.due_datetime = parse_datetime(due_datetime)
-                except ValueError:
-                    db.session.rollback()
-                    return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
-            else:
-                task.due_datetime = None
+        if 'due_datetime' in values:
+            values['_due_datetime'] = values.pop('due_datetime')
 
-        if 'link' in data:
-            link = data.get('link', '').strip()
-            if link:
-                task.link = link
+        if 'completed' in values:
+            if not values.pop('completed'):
+                values['_completed_at'] = None
             else:
-                task.link = None
-
+                # Keep the original completion time of an already completed task
+                now = literal(datetime.now(timezone.utc), UTCDateTime)
+                values['_completed_at'] = func.coalesce(Task._completed_at, now)
+
+        # Completion, points and estimate all feed the rollups
+        adjust_rollups(Task, [task_id], sign=-1)
+
+        task = update_owned(Task, task_id, values, versions=versions)
+        if task is None:
+            return write_failure(Task, task_id, versions)
+        grade_task(task)
+        db.session.flush()
+        adjust_rollups(Task, [task.id])
+
+        payload = task.to_dict()
+        broker.publish(g.user_id, 'task.updated', payload)
         db.session.commit()
-        return jsonify(task.to_dict()), 200
+        return versioned(payload, 200)
 
     except Exception as e:
         db.session.rollback()
@@ -845,11 +1655,18 @@ def delete_task(task_id):
         type: integer
         required: true
         description: ID of the task to delete
+      - name: If-Match
+        in: header
+        type: string
+        required: false
+        description: ETag (version) from a previous response; the write only happens if the task is still at that version
     responses:
       204:
         description: Task deleted successfully
       404:
         description: Task not found
+      412:
+        description: The task changed since the If-Match version; the response ETag is its current version
       500:
         description: Server error
         schema:
@@ -859,13 +1676,489 @@ def delete_task(task_id):
               type: string
     """
 
-    task = db.get_or_404(Task, task_id)
+    versions = if_match_versions()
+    stmt = db.delete(Task).where(Task.id == task_id, Task.user_id == g.user_id).returning(Task.id)
+    if versions is not None:
+        stmt = stmt.where(Task.version.in_(versions))
 
     try:
-        db.session.delete(task)
+        adjust_rollups(Task, [task_id], sign=-1)
+        if db.session.scalar(stmt) is None:
+            return write_failure(Task, task_id, versions)
+        broker.publish(g.user_id, 'task.deleted', {'id': task_id})
         db.session.commit()
         return '', 204
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+##################### Analytics Routes #####################
+@api_bp.route('/analytics', methods=['GET'])
+@coalesced
+def get_analytics():
+    """
+    Get daily or weekly progress totals from the rollup tables
+    ---
+    tags:
+      - Analytics
+    parameters:
+      - name: start
+        in: query
+        type: string
+        format: date
+        required: true
+        description: First UTC day of the range (YYYY-MM-DD); rounded down to its Monday for weekly periods
+      - name: end
+        in: query
+        type: string
+        format: date
+        required: true
+        description: UTC day after the range (exclusive)
+      - name: period
+        in: query
+        type: string
+        enum: [day, week]
+        required: false
+        default: day
+        description: Period size; weeks start on Monday
+    responses:
+      200:
+        description: One entry per period, including empty ones, plus totals over the range
+        schema:
+          type: object
+          properties:
+            period:
+              type: string
+            periods:
+              type: array
+              items:
+                type: object
+                properties:
+                  period_start:
+                    type: string
+                    format: date
+                  tasks_completed:
+                    type: integer
+                  points_earned:
+                    type: integer
+                  completed_minutes:
+                    type: integer
+                    description: Estimated minutes of the tasks completed
+                  scheduled_minutes:
+                    type: integer
+                    description: Minutes of timed events starting in the period
+            totals:
+              type: object
+      400:
+        description: Missing or invalid range or period
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+    if not start or not end:
+        return jsonify({'error': 'start and end are required'}), 400
+
+    try:
+        start_date = date.fromisoformat(start)
+        end_date = date.fromisoformat(end)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DD)'}), 400
+
+    if end_date < start_date:
+        return jsonify({'error': 'End date cannot be before start date'}), 400
+
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'error': 'period must be "day" or "week"'}), 400
+
+    try:
+        periods = read_rollups(g.user_id, period, start_date, end_date)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    totals = {
+        name: sum(row[name] for row in periods)
+        for name in METRICS
+    }
+    return respond({'period': period, 'periods': periods, 'totals': totals}, 200)
+
+
+##################### Search Routes #####################
+@api_bp.route('/search', methods=['GET'])
+@coalesced
+def search_items():
+    """
+    Full-text search over event and task titles, descriptions and locations
+    ---
+    tags:
+      - Search
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Search terms; every term is matched as a word prefix (e.g., "team meet")
+      - name: type
+        in: query
+        type: string
+        enum: [event, task]
+        required: false
+        description: Restrict results to events or tasks
+      - name: start
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted start time; events must end after it, tasks must be due at or after it
+      - name: end
+        in: query
+        type: string
+        required: false
+        description: ISO 8601 formatted end time; events must start before it, tasks must be due at or before it
+      - name: page
+        in: query
+        type: integer
+        required: false
+        default: 1
+        description: Page number (1-based)
+      - name: per_page
+        in: query
+        type: integer
+        required: false
+        default: 20
+        description: Results per page (max 100)
+    responses:
+      200:
+        description: Ranked search results, best match first
+        schema:
+          type: object
+          properties:
+            page:
+              type: integer
+            per_page:
+              type: integer
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  type:
+                    type: string
+                  rank:
+                    type: number
+                  item:
+                    type: object
+      400:
+        description: Missing query, invalid type, pagination or date range
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query cannot be empty'}), 400
+
+    kind = request.args.get('type')
+    if kind is None:
+        kinds = ('event', 'task')
+    elif kind in ('event', 'task'):
+        kinds = (kind,)
+    else:
+        return jsonify({'error': 'type must be "event" or "task"'}), 400
+
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    if page < 1 or not 1 <= per_page <= 100:
+        return jsonify({'error': 'page must be >= 1 and per_page between 1 and 100'}), 400
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+    start_dt = None
+    end_dt = None
+
+    try:
+        if start:
+            start_dt = parse_datetime(start)
+        if end:
+            end_dt = parse_datetime(end)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'}), 400
+
+    if start_dt and end_dt and end_dt < start_dt:
+        return jsonify({'error': 'End time cannot be before start time'}), 400
+
+    hits = search(g.user_id, query, kinds=kinds, start_dt=start_dt, end_dt=end_dt, page=page, per_page=per_page)
+
+    return respond({
+        'page': page,
+        'per_page': per_page,
+        'results': [
+            {'type': kind, 'rank': rank, 'item': item.to_dict()}
+            for kind, rank, item in hits
+        ]
+    }, 200)
+
+
+
+##################### Sync Routes #####################
+@api_bp.route('/sync', methods=['GET'])
+def sync_changes():
+    """
+    Get events and tasks changed since a sync token, plus tombstones for deleted ones
+    ---
+    tags:
+      - Sync
+    parameters:
+      - name: since
+        in: query
+        type: string
+        required: false
+        description: Token returned by the previous sync; omit (or send 0) for a full sync
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 500
+        description: Maximum number of changes to return (max 1000); page with the returned token while has_more is true
+    responses:
+      200:
+        description: Changes since the token, oldest first
+        schema:
+          type: object
+          properties:
+            events:
+              type: array
+              items:
+                type: object
+            tasks:
+              type: array
+              items:
+                type: object
+            deleted:
+              type: object
+              properties:
+                events:
+                  type: array
+                  items:
+                    type: integer
+                tasks:
+                  type: array
+                  items:
+                    type: integer
+            token:
+              type: string
+            has_more:
+              type: boolean
+      400:
+        description: Invalid token or limit
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    since = request.args.get('since', '0')
+    if not since.isdigit():
+        return jsonify({'error': 'Invalid sync token'}), 400
+
+    limit = request.args.get('limit', 500, type=int)
+    if not 1 <= limit <= 1000:
+        return jsonify({'error': 'limit must be between 1 and 1000'}), 400
+
+    result = changes_since(g.user_id, int(since), limit)
+
+    return respond({
+        'events': [event.to_dict() for event in result['events']],
+        'tasks': [task.to_dict() for task in result['tasks']],
+        'deleted': result['deleted'],
+        'token': str(result['token']),
+        'has_more': result['has_more']
+    }, 200)
+
+
+
+##################### Stream Routes #####################
+@api_bp.route('/stream', methods=['GET'])
+@allow_query_token
+@exempt_from_concurrency_cap
+def stream_changes():
+    """
+    Server-Sent Events stream of create/update/delete notifications
+    ---
+    tags:
+      - Sync
+    produces:
+      - text/event-stream
+    parameters:
+      - name: access_token
+        in: query
+        type: string
+        required: false
+        description: Access token, for EventSource clients that cannot send an Authorization header
+      - name: Last-Event-ID
+        in: header
+        type: string
+        required: false
+        description: Id of the last event received, from any worker; missed events are replayed while still in the notification log
+    responses:
+      200:
+        description: >
+          Event stream. Event types are event.created, event.updated, event.deleted,
+          task.created, task.updated, task.deleted and events.imported. A "reset" event
+          means notifications were missed and the client should resync via /api/sync.
+    """
+
+    subscription = broker.subscribe(g.user_id, request.headers.get('Last-Event-ID'))
+    heartbeat = broker.heartbeat
+
+    def generate():
+        try:
+            yield f'retry: {int(heartbeat * 1000)}\n\n'
+            yield from subscription.iter_encoded(heartbeat)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+##################### Admin Routes #####################
+@api_bp.route('/admin/backups', methods=['POST'])
+@admin_only
+def create_backup():
+    """
+    Back up the database to the server's BACKUP_DIR while it keeps serving (admins only)
+    ---
+    tags:
+      - Admin
+    parameters:
+      - name: body
+        in: body
+        required: false
+        schema:
+          type: object
+          properties:
+            compress:
+              type: boolean
+              default: false
+              description: Gzip-compress the backup
+    responses:
+      201:
+        description: Backup written
+        schema:
+          type: object
+          properties:
+            file:
+              type: string
+              description: File name within BACKUP_DIR
+            bytes:
+              type: integer
+            pages:
+              type: integer
+              description: Database pages copied
+            seconds:
+              type: number
+            shards:
+              type: array
+              description: With sharding, the same for each shard's backup, plus its shard number
+              items:
+                type: object
+      400:
+        description: Invalid body
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      403:
+        description: Not an admin
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+      500:
+        description: Backup failed
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+
+    compress = data.get('compress', False)
+    if not isinstance(compress, bool):
+        return jsonify({'error': 'compress must be a boolean'}), 400
+
+    try:
+        results = backup_databases(default_backup_path(compress), compress=compress)
+    except (BackupError, OSError, sqlite3.Error) as e:
+        return jsonify({'error': str(e)}), 500
+
+    for result in results:
+        result['file'] = os.path.basename(result['file'])
+    result, *shards = results
+    del result['shard']
+    if shards:
+        result['shards'] = shards
+    return respond(result, 201)
+
+
+@api_bp.route('/admin/metrics', methods=['GET'])
+@admin_only
+def get_metrics():
+    """
+    Request coalescing counters of the worker process that answers (admins only)
+    ---
+    tags:
+      - Admin
+    responses:
+      200:
+        description: Counters since the worker started
+        schema:
+          type: object
+          properties:
+            coalescing:
+              type: object
+              properties:
+                enabled:
+                  type: boolean
+                in_flight:
+                  type: integer
+                  description: Distinct reads running right now
+                executed:
+                  type: integer
+                  description: Reads that ran their query
+                coalesced:
+                  type: integer
+                  description: Reads answered with the response of an identical one already running
+                fallbacks:
+                  type: integer
+                  description: Coalesced reads that ran the query themselves because the shared one failed
+      403:
+        description: Not an admin
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+    """
+
+    return respond({'coalescing': current_app.extensions['coalescing'].stats()}, 200)
@@ -0,0 +1,133 @@
+"""
+Full-text search over events and tasks.
+
+Each searchable table gets an external-content FTS5 index (``<table>_fts``)
+that is kept in sync by SQLite triggers, so every write path - ORM or raw
+SQL - updates the index in the same transaction as the row itself.
+"""
+
+import re
+
+from sqlalchemy import func, literal_column, table, column, text
+from extensions import db
+from models import Event, Task
+
+
+# Searchable columns per table, in bm25 weight order
+SEARCH_COLUMNS = {
+    'events': ('title', 'description', 'location'),
+    'tasks': ('title', 'description', 'location'),
+}
+
+# Relative bm25 weights: a hit in the title outranks one in the description
+COLUMN_WEIGHTS = (10.0, 1.0, 2.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def install_search_index(connection):
+    """
+    Create the FTS5 tables and sync triggers if they do not exist yet.
+    Newly created indexes are rebuilt from the existing rows.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for table_name, columns in SEARCH_COLUMNS.items():
+        fts = f'{table_name}_fts'
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f'new.{c}' for c in columns)
+        old_cols = ', '.join(f'old.{c}' for c in columns)
+
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': fts}
+        ).first()
+
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{table_name}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); "
+            f"END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); "
+            f"END"
+        ))
+
+        if not exists:
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    Turn free text into an FTS5 MATCH expression where every term must
+    match as a prefix, e.g. ``team meet`` -> ``"team"* "meet"*``.
+    Returns None if the query contains no searchable terms.
+    """
+
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _ranked_statement(model, user_id, match, start_dt, end_dt):
+    fts_name = f'{model.__tablename__}_fts'
+    fts = table(fts_name, column('rowid'))
+    rank = func.bm25(literal_column(fts_name), *COLUMN_WEIGHTS).label('rank')
+
+    stmt = (
+        db.select(model, rank)
+        .join(fts, fts.c.rowid == model.id)
+        .where(literal_column(fts_name).op('MATCH')(match), model.user_id == user_id)
+    )
+
+    if model is Event:
+        if start_dt:
+            stmt = stmt.where(Event.end_time > start_dt)
+        if end_dt:
+            stmt = stmt.where(Event.start_time < end_dt)
+    else:
+        if start_dt:
+            stmt = stmt.where(Task.due_datetime >= start_dt)
+        if end_dt:
+            stmt = stmt.where(Task.due_datetime <= end_dt)
+
+    return stmt.order_by(rank, model.id)
+
+
+def search(user_id: int, query: str, kinds=('event', 'task'), start_dt=None, end_dt=None, page=1, per_page=20):
+    """
+    Run a ranked prefix search over the user's items and return one page of
+    ``(kind, rank, item)`` tuples, best match first. Results of both kinds
+    share one bm25 ranking.
+    """
+
+    match = build_match_query(query)
+    if match is None:
+        return []
+
+    offset = (page - 1) * per_page
+    models = {'event': Event, 'task': Task}
+
+    # Each kind only needs to contribute up to the end of the requested page
+    hits = []
+    for kind in kinds:
+        stmt = _ranked_statement(models[kind], user_id, match, start_dt, end_dt).limit(offset + per_page)
+        hits.extend((kind, rank, item) for item, rank in db.session.execute(stmt))
+
+    hits.sort(key=lambda hit: hit[1])
+    return hits[offset:offset + per_page]
@@ -0,0 +1,569 @@
+"""
+Optional per-tenant sharding of the SQLite database.
+
+SQLite runs one write transaction at a time per database file, so with every
+user in ``database.db`` all writers queue behind each other. With
+SHARD_COUNT > 0 each user's events, tasks, archives, rollups, idempotency
+records and change log live in one of SHARD_COUNT shard files instead, and
+users on different shards write in parallel. The main database keeps the
+users table, which doubles as the directory: ``users.shard`` names each
+user's shard. Users from before sharding was turned on (``shard`` NULL) stay
+in the main database until they are moved.
+
+Routing: ``select_shard`` finds the authenticated user's shard once per
+request and stores it in ``g.shard`` and its engine in ``g.shard_engine``;
+``extensions.RoutingSession`` then sends every statement that does not touch
+the users table to that engine. Each process caches the directory
+(``DirectoryCache``) and drops it whenever a move, made by any process,
+bumps the ``directory.stamp`` file in SHARD_DIR. Shard engines are opened on demand and at
+most SHARD_MAX_ENGINES are kept open per process (least recently used first
+out). A request keeps the engine it started with even if it is evicted
+meanwhile, so its transaction never spans two engines (and connections);
+evicted engines are disposed once no connection of theirs is checked out.
+
+Moving: ``move_tenant`` copies a user's rows to another shard while holding
+the source's write lock, points the directory at the new shard and deletes
+the old rows. Event and task ids come from one allocator shared by all
+shards (``allocate_id``), so they survive the move unchanged. Guard
+triggers reject inserts for users a database does not host, so a request
+that looked up the old shard just before a move fails instead of writing
+rows nobody would see. The new shard's change log numbering is moved past
+the old one's, so sync tokens stay valid and the next sync returns the
+moved rows.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from flask import current_app, g
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, text
+from extensions import GLOBAL_TABLES, db
+from models import SHARDED, ArchivedEvent, ArchivedTask, Change, Event, Notification, Task, User
+
+
+# Shard-local list of the users a shard hosts, checked by the guard triggers
+tenants = Table('tenants', MetaData(), Column('user_id', Integer, primary_key=True))
+
+# Users whose shard each process keeps cached
+DIRECTORY_CACHE_SIZE = 10_000
+
+# Tables whose ids come from the shared allocator, with their archives
+ALLOCATED_TABLES = {
+    Event.__tablename__: ArchivedEvent.__tablename__,
+    Task.__tablename__: ArchivedTask.__tablename__,
+}
+
+
+def shard_tables() -> list[Table]:
+    """Tables a shard holds: all but GLOBAL_TABLES."""
+
+    return [table for table in db.metadata.sorted_tables if table.name not in GLOBAL_TABLES]
+
+
+def drop_global_copies(connection) -> None:
+    """Drop the empty GLOBAL_TABLES that shards created before they were left out."""
+
+    for name in GLOBAL_TABLES:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+        ).first()
+        if exists and connection.execute(text(f'SELECT 1 FROM {name} LIMIT 1')).first() is None:
+            connection.execute(text(f'DROP TABLE {name}'))
+
+
+# Per-user logs numbered per database, which do not move with their user
+LOCAL_LOGS = frozenset({Change.__tablename__, Notification.__tablename__})
+
+
+def tenant_tables() -> list[Table]:
+    """Tables holding per-user rows that move with their user (all but the change and notification logs)."""
+
+    return [
+        table for table in db.metadata.sorted_tables
+        if 'user_id' in table.c and table.name not in GLOBAL_TABLES and table.name not in LOCAL_LOGS
+    ]
+
+
+class IdAllocator:
+    """
+    Event and task ids for all databases, reserved SHARD_ID_BLOCK_SIZE at a
+    time from the ``id_blocks`` table in ``ids.db``. That file is written
+    once per block and never inside a tenant's transaction.
+    """
+
+    def __init__(self, path: str, block_size: int, engine_options: dict):
+        self._engine = create_engine(f'sqlite:///{path}', **engine_options)
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+        with self._engine.begin() as connection:
+            connection.exec_driver_sql(
+                'CREATE TABLE IF NOT EXISTS id_blocks (name TEXT PRIMARY KEY, next_id INTEGER NOT NULL)'
+            )
+
+    def next_id(self, name: str) -> int:
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] == block[1]:
+                block = self._blocks[name] = self._reserve(name)
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def _reserve(self, name: str) -> list[int]:
+        with self._engine.begin() as connection:
+            connection.exec_driver_sql('INSERT OR IGNORE INTO id_blocks (name, next_id) VALUES (?, 1)', (name,))
+            end = connection.exec_driver_sql(
+                'UPDATE id_blocks SET next_id = next_id + ? WHERE name = ? RETURNING next_id',
+                (self._block_size, name)
+            ).scalar()
+        return [end - self._block_size, end]
+
+    def raise_floor(self, name: str, floor: int) -> None:
+        """Never hand out ids below ``floor`` for ``name`` (e.g. ids assigned before sharding)."""
+
+        with self._engine.connect() as connection:
+            current = connection.exec_driver_sql('SELECT next_id FROM id_blocks WHERE name = ?', (name,)).scalar()
+            if current is not None and current >= floor:
+                # Nothing to do: a restart next to running workers takes no write lock
+                return
+            connection.exec_driver_sql(
+                'INSERT INTO id_blocks (name, next_id) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET next_id = max(next_id, excluded.next_id)',
+                (name, floor)
+            )
+            connection.commit()
+
+    def after_fork(self) -> None:
+        # Blocks reserved by the parent must not be handed out by every worker
+        with self._lock:
+            self._blocks.clear()
+        self._engine.dispose(close=False)
+
+
+class DirectoryCache:
+    """
+    Per-process LRU of ``users.shard``. ``moved`` appends a byte to the
+    stamp file once a move has committed, and a process that finds the
+    file's size changed forgets everything it cached, so a lookup costs a
+    stat() call and only reads the main database on a miss.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self._path = path
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stamp = None
+
+    def _current_stamp(self) -> int:
+        try:
+            return os.stat(self._path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def shard_of(self, user_id: int) -> int | None:
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            elif user_id in self._entries:
+                self._entries.move_to_end(user_id)
+                return self._entries[user_id]
+
+        shard = db.session.scalar(db.select(User.shard).where(User.id == user_id))
+
+        with self._lock:
+            # Not if a move was seen meanwhile: the value may predate it
+            if self._stamp == stamp:
+                self._entries[user_id] = shard
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return shard
+
+    def moved(self) -> None:
+        """Make every process re-read the directory; call after a move commits."""
+
+        with open(self._path, 'ab') as stamp:
+            stamp.write(b'.')
+
+    def after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+class ShardRouter:
+    """Shard engines (an LRU of at most SHARD_MAX_ENGINES), the id allocator and the directory cache."""
+
+    def __init__(self):
+        self.count = 0
+        self.allocator = None
+        self.directory_cache = None
+        self._lock = threading.Lock()
+        self._engines = OrderedDict()
+        # Evicted engines with connections still checked out
+        self._retired = []
+
+    def init_app(self, app):
+        self.count = app.config['SHARD_COUNT']
+        app.extensions['shards'] = self
+        self.after_fork()
+        self.allocator = None
+        self.directory_cache = None
+
+        # The models pick their id defaults at import time
+        if bool(self.count) != SHARDED:
+            raise RuntimeError(
+                f"SHARD_COUNT is {self.count} but the models were imported with sharding "
+                f"{'on' if SHARDED else 'off'}; set it in the environment, not in a config class"
+            )
+        if not self.count:
+            return
+
+        if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+            raise RuntimeError('Sharding is only supported for SQLite databases')
+
+        self.directory = app.config['SHARD_DIR']
+        self.max_engines = app.config['SHARD_MAX_ENGINES']
+        self.engine_options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        os.makedirs(self.directory, exist_ok=True)
+        self.allocator = IdAllocator(
+            os.path.join(self.directory, 'ids.db'),
+            app.config['SHARD_ID_BLOCK_SIZE'],
+            self.engine_options
+        )
+        self.directory_cache = DirectoryCache(os.path.join(self.directory, 'directory.stamp'), DIRECTORY_CACHE_SIZE)
+
+    def path(self, shard: int) -> str:
+        return os.path.join(self.directory, f'shard-{shard}.db')
+
+    def engine(self, shard: int, create: bool = False):
+        """
+        Engine of ``shard``. Only shards that exist on disk are opened unless
+        ``create`` is set.
+        """
+
+        with self._lock:
+            engine = self._engines.get(shard)
+            if engine is not None:
+                self._engines.move_to_end(shard)
+                return engine
+
+            if not create and not os.path.exists(self.path(shard)):
+                raise LookupError(f'Shard {shard} does not exist')
+
+            engine = self._engines[shard] = create_engine(f'sqlite:///{self.path(shard)}', **self.engine_options)
+            while len(self._engines) > self.max_engines:
+                self._retired.append(self._engines.popitem(last=False)[1])
+
+            # Requests still using an evicted engine keep it until they are done
+            in_use = []
+            for evicted in self._retired:
+                if evicted.pool.checkedout():
+                    in_use.append(evicted)
+                else:
+                    evicted.dispose()
+            self._retired = in_use
+            return engine
+
+    def database(self, shard: int | None):
+        """Engine of ``shard``, or of the main database for None."""
+
+        return db.engine if shard is None else self.engine(shard)
+
+    def shard_ids(self) -> list[int | None]:
+        """The main database (None) and every shard that is configured or hosts users."""
+
+        if not self.count:
+            return [None]
+        placed = db.session.scalars(db.select(User.shard).where(User.shard.is_not(None)).distinct())
+        return [None, *sorted(set(range(self.count)) | set(placed))]
+
+    def after_fork(self) -> None:
+        with self._lock:
+            engines = [*self._engines.values(), *self._retired]
+            self._engines.clear()
+            self._retired = []
+        for engine in engines:
+            engine.dispose(close=False)
+        if self.allocator is not None:
+            self.allocator.after_fork()
+        if self.directory_cache is not None:
+            self.directory_cache.after_fork()
+
+
+router = ShardRouter()
+
+
+def allocate_id(table_name: str) -> int:
+    """A new id for ``table_name`` that no database has handed out before."""
+
+    return router.allocator.next_id(table_name)
+
+
+def select_shard():
+    """
+    ``before_request`` hook, run after authentication: route the request's
+    statements to the user's shard, from the directory cache. Moves take
+    effect on the next request.
+    """
+
+    if router.count and g.get('user_id') is not None:
+        g.shard = router.directory_cache.shard_of(g.user_id)
+        g.shard_engine = None if g.shard is None else router.engine(g.shard)
+
+
+@contextmanager
+def use_shard(shard: int | None):
+    """
+    Route the session to ``shard`` (None: the main database) inside the
+    block, e.g. for maintenance jobs. Uncommitted work is discarded on exit.
+    """
+
+    previous = g.get('shard'), g.get('shard_engine')
+    db.session.close()
+    g.shard = shard
+    g.shard_engine = None if shard is None else router.engine(shard)
+    try:
+        yield shard
+    finally:
+        db.session.close()
+        g.shard, g.shard_engine = previous
+
+
+def each_database():
+    """Run the body of a ``for`` loop once per database, routed to it; yields the shard."""
+
+    for shard in router.shard_ids():
+        with use_shard(shard):
+            yield shard
+
+
+def shard_label(shard: int | None) -> str:
+    return 'main' if shard is None else f'shard {shard}'
+
+
+def _guard_triggers(shard: int | None) -> dict[str, str]:
+    # CREATE TRIGGER statement per trigger name, as stored in sqlite_master
+    if shard is None:
+        condition = (
+            f"EXISTS (SELECT 1 FROM {User.__tablename__} "
+            f"WHERE id = new.user_id AND shard IS NOT NULL)"
+        )
+    else:
+        condition = f"new.user_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM tenants WHERE user_id = new.user_id)"
+
+    return {
+        f'{table.name}_tenant_guard': (
+            f"CREATE TRIGGER {table.name}_tenant_guard BEFORE INSERT ON {table.name} "
+            f"WHEN {condition} BEGIN "
+            f"SELECT RAISE(ABORT, 'user is not hosted by this database'); "
+            f"END"
+        )
+        for table in tenant_tables()
+    }
+
+
+def install_tenant_guard(connection, shard: int | None):
+    """
+    Create the tenants table of a shard and (re)create the guard triggers
+    of a database, or drop the main database's guards when sharding is off.
+    Read only when everything is already in place.
+    """
+
+    if shard is not None:
+        tenants.create(connection, checkfirst=True)
+
+    triggers = _guard_triggers(shard) if router.count else {}
+    installed = dict(connection.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%\\_tenant\\_guard' ESCAPE '\\'")
+    ).all())
+    if installed == triggers:
+        return
+
+    for name in installed:
+        connection.execute(text(f'DROP TRIGGER {name}'))
+    for sql in triggers.values():
+        connection.execute(text(sql))
+
+
+def seed_allocator():
+    """Start the allocator above every id already used in any database."""
+
+    for table_name, archive_name in ALLOCATED_TABLES.items():
+        floor = 1
+        for shard in router.shard_ids():
+            with router.database(shard).connect() as connection:
+                for name in (table_name, archive_name):
+                    highest = connection.execute(text(f'SELECT max(id) FROM {name}')).scalar()
+                    floor = max(floor, (highest or 0) + 1)
+        router.allocator.raise_floor(table_name, floor)
+
+
+def place_new_user(user) -> None:
+    """Pick a shard for a just-flushed ``user`` and register them with it."""
+
+    if not router.count:
+        return
+
+    user.shard = user.id % router.count
+    with router.engine(user.shard).begin() as connection:
+        connection.execute(tenants.insert().prefix_with('OR IGNORE'), {'user_id': user.id})
+
+
+def _set_directory(connection, user_id: int, shard: int | None) -> None:
+    connection.execute(db.update(User).where(User.id == user_id).values(shard=shard))
+
+
+def _delete_rows(connection, user_id: int) -> None:
+    for table in reversed(tenant_tables()):
+        connection.execute(table.delete().where(table.c.user_id == user_id))
+    # After the rows, whose deletes log tombstones
+    connection.execute(Change.__table__.delete().where(Change.user_id == user_id))
+    # Streams of a moved user are reset onto the new database
+    connection.execute(Notification.__table__.delete().where(Notification.user_id == user_id))
+
+
+def move_tenant(user, target: int | None) -> dict:
+    """
+    Move ``user``'s rows from their shard to ``target`` (None: the main
+    database). Writes to both databases wait until the move is done.
+    Returns the number of rows copied per table.
+    """
+
+    source = user.shard
+    if source == target:
+        return {}
+    if target is not None and not 0 <= target < router.count:
+        raise ValueError(f'Shard must be between 0 and {router.count - 1}')
+
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    changes = Change.__table__
+    copied = {}
+
+    with router.database(source).connect() as src, router.database(target).connect() as dst:
+        # Holding the source's write lock keeps the user's rows still until they are gone
+        src.exec_driver_sql('BEGIN IMMEDIATE')
+        dst.exec_driver_sql('BEGIN IMMEDIATE')
+        try:
+            # Leftovers of an earlier, interrupted move
+            _delete_rows(dst, user.id)
+
+            if target is None:
+                _set_directory(dst, user.id, None)
+            else:
+                dst.execute(tenants.insert().prefix_with('OR IGNORE'), {'user_id': user.id})
+
+            # Number the copied rows' changes past every token the source handed out
+            last_seq = src.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")).scalar() or 0
+            dst.execute(text("INSERT OR IGNORE INTO sqlite_sequence (name, seq) SELECT 'changes', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'changes')"))
+            dst.execute(text("UPDATE sqlite_sequence SET seq = max(seq, :seq) WHERE name = 'changes'"), {'seq': last_seq})
+
+            for table in tenant_tables():
+                copied[table.name] = 0
+                result = src.execute(
+                    table.select().where(table.c.user_id == user.id).execution_options(yield_per=chunk_size)
+                )
+                for rows in result.partitions():
+                    dst.execute(table.insert(), [row._mapping for row in rows])
+                    copied[table.name] += len(rows)
+
+            # Tombstones of rows deleted before the move; live rows were logged on insert
+            tombstones = src.execute(
+                db.select(changes.c.entity, changes.c.entity_id, changes.c.user_id, changes.c.deleted)
+                .where(changes.c.user_id == user.id, changes.c.deleted.is_(True))
+                .order_by(changes.c.seq)
+            ).mappings().all()
+            if tombstones:
+                dst.execute(changes.insert().prefix_with('OR REPLACE'), tombstones)
+            dst.commit()
+        except BaseException:
+            dst.rollback()
+            src.rollback()
+            raise
+
+        try:
+            if source is None:
+                _set_directory(src, user.id, target)
+            elif target is not None:
+                with db.engine.begin() as main:
+                    _set_directory(main, user.id, target)
+
+            _delete_rows(src, user.id)
+            if source is not None:
+                src.execute(tenants.delete().where(tenants.c.user_id == user.id))
+            src.commit()
+        except BaseException:
+            src.rollback()
+            raise
+        finally:
+            # The directory may have changed even if the cleanup failed
+            router.directory_cache.moved()
+
+    db.session.expire(user)
+    return copied
+
+
+def tenant_loads() -> dict:
+    """``{shard: {user_id: rows}}`` with the events and tasks (archives included) of each user."""
+
+    loads = {}
+    for shard in router.shard_ids():
+        hosted = db.session.scalars(
+            db.select(User.id).where(User.shard.is_(None) if shard is None else User.shard == shard)
+        ).all()
+        counts = dict.fromkeys(hosted, 0)
+        with router.database(shard).connect() as connection:
+            for table_name, archive_name in ALLOCATED_TABLES.items():
+                for name in (table_name, archive_name):
+                    for user_id, rows in connection.execute(
+                        text(f'SELECT user_id, count(*) FROM {name} WHERE user_id IS NOT NULL GROUP BY user_id')
+                    ):
+                        if user_id in counts:
+                            counts[user_id] += rows
+        loads[shard] = counts
+    return loads
+
+
+def plan_rebalance(loads: dict) -> list[tuple[int, int | None, int]]:
+    """
+    Moves ``(user_id, source, target)`` that empty the main database and
+    then even out the rows per shard: every move takes a user from the
+    fullest shard to the emptiest one, picking the user that best halves
+    the gap, until no move narrows it.
+    """
+
+    totals = {shard: sum(loads.get(shard, {}).values()) for shard in range(router.count)}
+    members = {shard: dict(loads.get(shard, {})) for shard in range(router.count)}
+    moves = []
+
+    # Largest first, onto whichever shard is emptiest at the time
+    for user_id, rows in sorted(loads.get(None, {}).items(), key=lambda item: -item[1]):
+        target = min(totals, key=totals.get)
+        moves.append((user_id, None, target))
+        totals[target] += rows
+        members[target][user_id] = rows
+
+    for _ in range(sum(len(users) for users in members.values())):
+        fullest = max(totals, key=totals.get)
+        emptiest = min(totals, key=totals.get)
+        gap = totals[fullest] - totals[emptiest]
+        candidates = [(user_id, rows) for user_id, rows in members[fullest].items() if 0 < rows < gap]
+        if not candidates:
+            break
+        user_id, rows = min(candidates, key=lambda item: abs(gap / 2 - item[1]))
+        moves.append((user_id, fullest, emptiest))
+        del members[fullest][user_id]
+        members[emptiest][user_id] = rows
+        totals[fullest] -= rows
+        totals[emptiest] += rows
+
+    # A user moved twice only needs to go straight to the last shard
+    final = {}
+    for user_id, source, target in moves:
+        first_source = final.get(user_id, (source, None))[0]
+        final[user_id] = (first_source, target)
+    return [(user_id, source, target) for user_id, (source, target) in final.items() if source != target]
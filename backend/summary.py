@@ -0,0 +1,157 @@
+"""
+Per-day/per-week calendar summaries computed in the database.
+
+Bucket boundaries are computed in Python in the client's timezone (so DST
+days are 23 or 25 hours long) and handed to SQLite as one JSON parameter;
+the counting, clipping of events that span bucket boundaries and the busy
+time union all happen in a single GROUP BY query per table.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, case, and_, or_, union_all
+from extensions import db
+from models import DATETIME_STORAGE, ArchivedEvent, ArchivedTask, Event, Task, to_epoch_micros, to_utc_naive
+
+
+BUCKET_SIZES = ('day', 'week')
+
+# Upper bound on buckets per request (a bit more than a year of days)
+MAX_BUCKETS = 400
+
+
+def bucket_bounds(start_dt: datetime, end_dt: datetime, bucket: str, tz) -> list[tuple[datetime, datetime]]:
+    """
+    Split ``[start_dt, end_dt)`` into local-midnight aligned day or week
+    (Monday based) buckets in ``tz``. Returns aware ``(start, end)`` pairs.
+    Raises ValueError if more than MAX_BUCKETS would be needed.
+    """
+
+    local_start = start_dt.astimezone(tz)
+    day = local_start.date()
+    if bucket == 'week':
+        day -= timedelta(days=day.weekday())
+    step = timedelta(days=7 if bucket == 'week' else 1)
+
+    bounds = []
+    current = datetime.combine(day, datetime.min.time(), tz)
+    while current < end_dt:
+        following = datetime.combine(current.date() + step, datetime.min.time(), tz)
+        bounds.append((current, following))
+        if len(bounds) > MAX_BUCKETS:
+            raise ValueError(f'Range spans more than {MAX_BUCKETS} buckets')
+        current = following
+
+    return bounds
+
+
+def _storage_value(dt: datetime) -> str | int:
+    # Matches how UTCDateTime stores values in SQLite
+    if DATETIME_STORAGE == 'epoch':
+        return to_epoch_micros(dt)
+    return to_utc_naive(dt).isoformat(sep=' ', timespec='microseconds')
+
+
+def _minutes_between(start, end):
+    if DATETIME_STORAGE == 'epoch':
+        return (end - start) / 60000000.0
+    return (func.julianday(end) - func.julianday(start)) * 1440
+
+
+def _user_rows(user_id: int, tables, *names):
+    """
+    The user's rows of ``tables`` as one FROM item with the named columns,
+    a UNION ALL when the archive table is included.
+    """
+
+    if len(tables) == 1:
+        return tables[0]
+    return union_all(*(
+        db.select(*(table.c[name] for name in names)).where(table.c.user_id == user_id)
+        for table in tables
+    )).subquery()
+
+
+def summarize(user_id: int, bounds: list[tuple[datetime, datetime]], include_archive: bool = False) -> list[dict]:
+    """
+    Return the user's per-bucket ``event_count``, ``busy_minutes`` (union of
+    timed events clipped to the bucket, so overlaps are not double counted)
+    and ``tasks_due`` for the given bucket bounds. ``include_archive`` also
+    counts archived events and tasks.
+    """
+
+    if not bounds:
+        return []
+
+    event_tables = [Event.__table__, ArchivedEvent.__table__] if include_archive else [Event.__table__]
+    task_tables = [Task.__table__, ArchivedTask.__table__] if include_archive else [Task.__table__]
+    events = _user_rows(user_id, event_tables, 'user_id', 'start_time', 'end_time', 'all_day')
+    tasks = _user_rows(user_id, task_tables, 'id', 'user_id', 'due_datetime')
+
+    payload = json.dumps([[_storage_value(start), _storage_value(end)] for start, end in bounds])
+    buckets = func.json_each(payload).table_valued('key', 'value').alias('buckets')
+    idx = buckets.c.key
+    b_start = func.json_extract(buckets.c.value, '$[0]')
+    b_end = func.json_extract(buckets.c.value, '$[1]')
+
+    # Events overlapping each bucket, clipped to it; all-day events take no busy time
+    clip_start = func.max(events.c.start_time, b_start)
+    clipped = (
+        db.select(
+            idx.label('idx'),
+            clip_start.label('s'),
+            case((events.c.all_day, clip_start), else_=func.min(events.c.end_time, b_end)).label('t')
+        )
+        .select_from(buckets)
+        .join(events, and_(
+            events.c.user_id == user_id,
+            events.c.start_time < b_end,
+            or_(events.c.end_time > b_start, events.c.start_time >= b_start)
+        ))
+        .subquery()
+    )
+
+    # Latest end among the earlier intervals of the same bucket
+    prev_end = func.max(clipped.c.t).over(
+        partition_by=clipped.c.idx,
+        order_by=(clipped.c.s, clipped.c.t),
+        rows=(None, -1)
+    )
+    ordered = db.select(clipped, prev_end.label('prev_end')).subquery()
+
+    # Only the part of each interval beyond everything before it is new busy time
+    fresh_start = func.max(ordered.c.s, func.coalesce(ordered.c.prev_end, ordered.c.s))
+    event_rows = db.session.execute(
+        db.select(
+            ordered.c.idx,
+            func.count(),
+            func.sum(func.max(0, _minutes_between(fresh_start, ordered.c.t)))
+        ).group_by(ordered.c.idx)
+    ).all()
+
+    task_rows = db.session.execute(
+        db.select(idx, func.count(tasks.c.id))
+        .select_from(buckets)
+        .join(tasks, and_(
+            tasks.c.user_id == user_id,
+            tasks.c.due_datetime >= b_start,
+            tasks.c.due_datetime < b_end
+        ))
+        .group_by(idx)
+    ).all()
+
+    events_by_bucket = {int(i): (count, minutes) for i, count, minutes in event_rows}
+    tasks_by_bucket = {int(i): count for i, count in task_rows}
+
+    summary = []
+    for i, (start, end) in enumerate(bounds):
+        count, minutes = events_by_bucket.get(i, (0, 0))
+        summary.append({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'event_count': count,
+            'busy_minutes': round(minutes or 0),
+            'tasks_due': tasks_by_bucket.get(i, 0)
+        })
+    return summary
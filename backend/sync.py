@@ -0,0 +1,148 @@
+"""
+Delta sync support.
+
+Triggers on ``events`` and ``tasks`` upsert a row into the ``changes`` log on
+every insert, update and delete. A client's sync token is simply the highest
+``seq`` it has seen, so "what changed since my token" is a primary-key range
+seek on ``changes`` followed by one ``IN`` lookup per table.
+"""
+
+from sqlalchemy import text
+from extensions import db
+from models import Change, Event, Task
+from archive import ARCHIVES
+
+
+# Change log entity name per tracked table
+TRACKED_TABLES = {
+    'events': 'event',
+    'tasks': 'task',
+}
+
+
+# (suffix, timing, row alias, deleted flag, condition) of each change log
+# trigger. Rows deleted because they moved to the archive table are not
+# deleted for the client, so they leave no tombstone
+TRIGGERS = (
+    ('ai', 'AFTER INSERT', 'new', 0, ''),
+    ('au', 'AFTER UPDATE', 'new', 0, ''),
+    ('ad', 'AFTER DELETE', 'old', 1, 'WHEN NOT EXISTS (SELECT 1 FROM {table}_archive WHERE id = old.id) '),
+)
+
+
+def drop_change_log_triggers(connection):
+    """
+    Drop the change log triggers, e.g. so bulk maintenance rewrites that do
+    not change any data are not reported to syncing clients.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    for table_name in TRACKED_TABLES:
+        for suffix, *_ in TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {table_name}_changes_{suffix}"))
+
+
+def _change_log_triggers() -> dict[str, str]:
+    # CREATE TRIGGER statement per trigger name, as stored in sqlite_master
+    triggers = {}
+    for table_name, entity in TRACKED_TABLES.items():
+        for suffix, timing, row, deleted, condition in TRIGGERS:
+            name = f'{table_name}_changes_{suffix}'
+            triggers[name] = (
+                f"CREATE TRIGGER {name} {timing} ON {table_name} "
+                f"{condition.format(table=table_name)}BEGIN "
+                f"INSERT OR REPLACE INTO changes(entity, entity_id, user_id, deleted) "
+                f"VALUES ('{entity}', {row}.id, {row}.user_id, {deleted}); "
+                f"END"
+            )
+    return triggers
+
+
+def install_change_log(connection):
+    """
+    (Re)create the change log triggers unless they are already installed
+    as defined here. While the log is still empty, every existing row is
+    recorded so the initial sync (token 0) returns the full data set.
+    """
+
+    if connection.dialect.name != 'sqlite':
+        return
+
+    triggers = _change_log_triggers()
+    installed = dict(connection.execute(
+        text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    ).all())
+    if all(installed.get(name) == sql for name, sql in triggers.items()):
+        # Up to date: a restart next to running workers takes no write lock
+        return
+
+    empty = connection.execute(text("SELECT 1 FROM changes LIMIT 1")).first() is None
+
+    # Dropped first so trigger changes reach existing databases
+    drop_change_log_triggers(connection)
+    for sql in triggers.values():
+        connection.execute(text(sql))
+
+    if empty:
+        for table_name, entity in TRACKED_TABLES.items():
+            connection.execute(text(
+                f"INSERT OR IGNORE INTO changes(entity, entity_id, user_id, deleted) "
+                f"SELECT '{entity}', id, user_id, 0 FROM {table_name} ORDER BY id"
+            ))
+
+
+def _load_changed(model, user_id: int, ids: list[int]) -> list:
+    """Rows of ``model`` with the given ids, falling back to its archive table."""
+
+    if not ids:
+        return []
+
+    rows = db.session.scalars(
+        db.select(model).where(model.user_id == user_id, model.id.in_(ids)).order_by(model.id)
+    ).all()
+
+    missing = set(ids).difference(row.id for row in rows)
+    if missing:
+        archived_model = ARCHIVES[model]
+        rows += db.session.scalars(
+            db.select(archived_model)
+            .where(archived_model.user_id == user_id, archived_model.id.in_(missing))
+            .order_by(archived_model.id)
+        ).all()
+    return rows
+
+
+def changes_since(user_id: int, since: int, limit: int):
+    """
+    Collect the user's changes with ``seq > since``, oldest first, at most
+    ``limit`` of them.
+
+    Returns a dict with the changed ``events``/``tasks`` (model instances),
+    tombstone ids under ``deleted``, the ``token`` to send next time and
+    whether ``has_more`` changes remain.
+    """
+
+    rows = db.session.execute(
+        db.select(Change.seq, Change.entity, Change.entity_id, Change.deleted)
+        .where(Change.user_id == user_id, Change.seq > since)
+        .order_by(Change.seq)
+        .limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changed = {'event': [], 'task': []}
+    deleted = {'event': [], 'task': []}
+    for row in rows:
+        (deleted if row.deleted else changed)[row.entity].append(row.entity_id)
+
+    return {
+        'events': _load_changed(Event, user_id, changed['event']),
+        'tasks': _load_changed(Task, user_id, changed['task']),
+        'deleted': {'events': deleted['event'], 'tasks': deleted['task']},
+        'token': rows[-1].seq if rows else since,
+        'has_more': has_more,
+    }
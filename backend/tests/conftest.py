@@ -0,0 +1,38 @@
+import itertools
+
+import pytest
+
+from app import create_app
+from config import TestingConfig, config
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a fresh database file, so tests can use several threads and connections."""
+
+    class PytestConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        BACKUP_DIR = str(tmp_path / 'backups')
+        SHARD_DIR = str(tmp_path / 'shards')
+        RATELIMIT_ROUTES = {**TestingConfig.RATELIMIT_ROUTES, 'api.register': TestingConfig.RATELIMIT_DEFAULT}
+
+    monkeypatch.setitem(config, 'pytest', PytestConfig)
+    return create_app('pytest')
+
+
+_emails = itertools.count()
+
+
+@pytest.fixture
+def make_client(app):
+    """Register a new user and return a test client that sends their token."""
+
+    def make(email=None):
+        client = app.test_client()
+        email = email or f'user{next(_emails)}@example.com'
+        response = client.post('/api/auth/register', json={'email': email, 'password': 'password123'})
+        assert response.status_code == 201, response.json
+        client.environ_base['HTTP_AUTHORIZATION'] = 'Bearer ' + response.json['access_token']
+        return client
+
+    return make
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+
+from archive import archive_old_rows
+from extensions import db
+from models import ArchivedEvent, ArchivedTask, Event, Task
+
+
+def _ids(model):
+    return set(db.session.scalars(db.select(model.id)))
+
+
+def test_archive_moves_old_rows_and_keeps_recent_ones(app, make_client):
+    user_id = make_client().get('/api/auth/me').json['id']
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'] + 30)
+    app.config['ARCHIVE_BATCH_SIZE'] = 2
+
+    with app.app_context():
+        events = {
+            name: db.session.execute(db.insert(Event).returning(Event.id), {
+                'user_id': user_id,
+                'title': name,
+                '_start_time': start,
+                '_end_time': start + timedelta(hours=1),
+                'all_day': False,
+            }).scalar()
+            for name, start in [('old 1', old), ('old 2', old), ('old 3', old), ('recent', now)]
+        }
+        tasks = {
+            name: db.session.execute(db.insert(Task).returning(Task.id), {
+                'user_id': user_id,
+                'title': name,
+                'description': name,
+                '_completed_at': completed_at,
+                '_due_datetime': due,
+            }).scalar()
+            for name, completed_at, due in [
+                ('done long ago', old, old),
+                ('done long ago, no due date', old, None),
+                ('done long ago, due soon', old, now),
+                ('open, overdue', None, old),
+                ('done today', now, old),
+            ]
+        }
+        db.session.commit()
+
+        moved = archive_old_rows()
+
+        assert moved == {'events': 3, 'tasks': 2}
+        assert _ids(Event) == {events['recent']}
+        assert _ids(ArchivedEvent) == {events['old 1'], events['old 2'], events['old 3']}
+        assert _ids(ArchivedTask) == {tasks['done long ago'], tasks['done long ago, no due date']}
+        assert _ids(Task) == {tasks['done long ago, due soon'], tasks['open, overdue'], tasks['done today']}
+
+        # Nothing left to move
+        assert archive_old_rows() == {'events': 0, 'tasks': 0}
@@ -0,0 +1,49 @@
+import pytest
+
+BAD_BODIES = [[1], 'x', 7, None]
+
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_register_rejects_non_object_bodies(app, body):
+    response = app.test_client().post('/api/auth/register', json=body)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Request body must be a JSON object'
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'email': 5, 'password': 'password123'}, 'email must be a string'),
+    ({'email': 'a@example.com', 'password': ['password123']}, 'password must be a string'),
+    ({'email': 'nobody', 'password': 'password123'}, 'A valid email is required'),
+    ({'email': 'a@example.com', 'password': 'short'}, 'Password must be at least 8 characters'),
+    ({'password': 'password123'}, 'A valid email is required'),
+])
+def test_register_validates_fields(app, body, message):
+    response = app.test_client().post('/api/auth/register', json=body)
+
+    assert response.status_code == 400
+    assert response.json['error'] == message
+
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_login_rejects_non_object_bodies(app, body):
+    response = app.test_client().post('/api/auth/login', json=body)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Request body must be a JSON object'
+
+
+def test_login_validates_fields_and_credentials(app, make_client):
+    make_client('Someone@Example.com')
+    client = app.test_client()
+
+    response = client.post('/api/auth/login', json={'email': 'someone@example.com', 'password': 1})
+    assert response.status_code == 400
+    assert response.json['error'] == 'password must be a string'
+
+    response = client.post('/api/auth/login', json={'email': 'someone@example.com', 'password': 'wrong-password'})
+    assert response.status_code == 401
+
+    response = client.post('/api/auth/login', json={'email': ' SOMEONE@example.com ', 'password': 'password123'})
+    assert response.status_code == 200
+    assert response.json['access_token']
@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+from backup import backup_database
+from extensions import db
+from models import Event
+
+SEED_EVENTS = 4000
+
+
+def test_backup_under_writes_is_consistent(app, make_client, tmp_path):
+    user_id = make_client().get('/api/auth/me').json['id']
+    # Small steps, so the copy spans many of the writer's transactions
+    app.config['BACKUP_STEP_PAGES'] = 8
+    app.config['BACKUP_STEP_PAUSE_MS'] = 1
+
+    with app.app_context():
+        db.session.execute(db.insert(Event), [
+            {
+                'user_id': user_id,
+                'title': f'event {i}',
+                '_start_time': datetime(2025, 1, 1, 10),
+                '_end_time': datetime(2025, 1, 1, 11),
+                'all_day': False,
+            }
+            for i in range(SEED_EVENTS)
+        ])
+        db.session.commit()
+        path = db.engine.url.database
+
+    stop = threading.Event()
+    commits = []
+
+    def write():
+        # Every transaction adds two events, so any consistent snapshot holds an even number
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        try:
+            while not stop.is_set():
+                connection.execute('BEGIN IMMEDIATE')
+                for _ in range(2):
+                    connection.execute(
+                        'INSERT INTO events (user_id, title, start_time, end_time, all_day, version, created_at, updated_at) '
+                        'SELECT user_id, title, start_time, end_time, all_day, version, created_at, updated_at '
+                        'FROM events WHERE id = 1'
+                    )
+                connection.execute('COMMIT')
+                commits.append(None)
+        finally:
+            connection.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        with app.app_context():
+            before = len(commits)
+            result = backup_database(str(tmp_path / 'backup.db'))
+            during = len(commits) - before
+    finally:
+        stop.set()
+        writer.join()
+
+    # The writer was not blocked by the copy
+    assert during > 0
+
+    copy = sqlite3.connect(result['file'])
+    try:
+        assert copy.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+        count = copy.execute('SELECT count(*) FROM events').fetchone()[0]
+    finally:
+        copy.close()
+    assert count >= SEED_EVENTS
+    assert count % 2 == 0
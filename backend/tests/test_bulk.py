@@ -0,0 +1,52 @@
+import tracemalloc
+from datetime import datetime
+
+from bulk import iter_rows
+from extensions import db
+from models import Event
+
+CHUNK_SIZE = 200
+
+
+def _add_events(user_id, count):
+    db.session.execute(db.insert(Event), [
+        {
+            'user_id': user_id,
+            'title': f'event {i}',
+            '_start_time': datetime(2025, 1, 1, 10),
+            '_end_time': datetime(2025, 1, 1, 11),
+            'all_day': False,
+        }
+        for i in range(count)
+    ])
+    db.session.commit()
+
+
+def _iteration_peak() -> tuple[int, int]:
+    """Rows seen and peak traced memory while walking every event with ``iter_rows``."""
+
+    tracemalloc.start()
+    try:
+        seen = sum(1 for _ in iter_rows(db.select(Event), CHUNK_SIZE))
+        db.session.commit()
+        return seen, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_iter_rows_memory_does_not_grow_with_the_table(app, make_client):
+    user_id = make_client().get('/api/auth/me').json['id']
+
+    with app.app_context():
+        _add_events(user_id, 2000)
+        # One walk first, so caches filled on first use are not counted
+        _iteration_peak()
+        seen, small_peak = _iteration_peak()
+        assert seen == 2000
+
+        _add_events(user_id, 8000)
+        seen, large_peak = _iteration_peak()
+        assert seen == 10000
+
+    # Five times the rows, about the same peak: one chunk is held at a time
+    assert large_peak < small_peak * 1.5
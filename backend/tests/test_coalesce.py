@@ -0,0 +1,157 @@
+import threading
+import time
+
+import pytest
+
+import routes
+
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers', 'points': 3}
+
+
+@pytest.fixture
+def gated(app, monkeypatch):
+    """
+    Make GET /api/tasks/next block in the view until ``release`` is set,
+    counting the calls that actually ran the query.
+    """
+
+    app.extensions['admission'].enabled = False
+    entered = threading.Event()
+    release = threading.Event()
+    calls = []
+    next_tasks = routes.next_tasks
+
+    def blocking_next_tasks(*args, **kwargs):
+        calls.append(None)
+        entered.set()
+        assert release.wait(10)
+        return next_tasks(*args, **kwargs)
+
+    monkeypatch.setattr(routes, 'next_tasks', blocking_next_tasks)
+    return entered, release, calls
+
+
+def _get_in_thread(app, client, url):
+    """Start ``url`` on its own test client; join the thread for the response."""
+
+    result = {}
+    headers = {'Authorization': client.environ_base['HTTP_AUTHORIZATION']}
+
+    def get():
+        result['response'] = app.test_client().get(url, headers=headers)
+
+    thread = threading.Thread(target=get)
+    thread.start()
+    return thread, result
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 10
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_identical_concurrent_reads_share_one_call(app, make_client, gated):
+    entered, release, calls = gated
+    flights = app.extensions['coalescing']
+    client = make_client()
+    client.post('/api/tasks', json=TASK)
+
+    leader, leader_result = _get_in_thread(app, client, '/api/tasks/next')
+    assert entered.wait(10)
+    followers = [_get_in_thread(app, client, '/api/tasks/next') for _ in range(3)]
+    _wait_for(lambda: flights.stats()['coalesced'] == 3)
+    release.set()
+    for thread, _ in [(leader, leader_result), *followers]:
+        thread.join()
+
+    assert len(calls) == 1
+    responses = [leader_result['response']] + [result['response'] for _, result in followers]
+    assert [response.status_code for response in responses] == [200] * 4
+    assert all(response.data == responses[0].data for response in responses)
+    assert all(response.mimetype == responses[0].mimetype for response in responses)
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_different_users_and_urls_do_not_share(app, make_client, gated):
+    entered, release, calls = gated
+    client = make_client()
+    other = make_client()
+
+    first, _ = _get_in_thread(app, client, '/api/tasks/next')
+    assert entered.wait(10)
+    others = [
+        _get_in_thread(app, other, '/api/tasks/next'),
+        _get_in_thread(app, client, '/api/tasks/next?limit=3'),
+    ]
+    _wait_for(lambda: len(calls) == 3)
+    release.set()
+    for thread, _ in [(first, None), *others]:
+        thread.join()
+
+    assert app.extensions['coalescing'].stats()['coalesced'] == 0
+
+
+def test_write_detaches_in_flight_reads(app, make_client, gated):
+    entered, release, calls = gated
+    client = make_client()
+
+    before, _ = _get_in_thread(app, client, '/api/tasks/next')
+    assert entered.wait(10)
+    task = client.post('/api/tasks', json=TASK).json
+
+    # Sent after the write answered, so it must not join the older read
+    after, after_result = _get_in_thread(app, client, '/api/tasks/next')
+    _wait_for(lambda: len(calls) == 2)
+    release.set()
+    before.join()
+    after.join()
+
+    assert [item['id'] for item in after_result['response'].json] == [task['id']]
+    assert app.extensions['coalescing'].stats()['coalesced'] == 0
+
+
+def test_followers_run_the_view_when_the_leader_fails(app, make_client, monkeypatch):
+    app.extensions['admission'].enabled = False
+    flights = app.extensions['coalescing']
+    client = make_client()
+    entered = threading.Event()
+    release = threading.Event()
+    next_tasks = routes.next_tasks
+
+    def failing_first(*args, **kwargs):
+        if not entered.is_set():
+            entered.set()
+            assert release.wait(10)
+            raise RuntimeError('query failed')
+        return next_tasks(*args, **kwargs)
+
+    monkeypatch.setattr(routes, 'next_tasks', failing_first)
+    # Answer the leader's error with a 500 instead of raising it in its thread
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    leader, leader_result = _get_in_thread(app, client, '/api/tasks/next')
+    assert entered.wait(10)
+    follower, follower_result = _get_in_thread(app, client, '/api/tasks/next')
+    _wait_for(lambda: flights.stats()['coalesced'] == 1)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert leader_result['response'].status_code == 500
+    assert follower_result['response'].status_code == 200
+    assert flights.stats()['fallbacks'] == 1
+
+
+def test_disabled_coalescing_runs_every_request(app, make_client, gated):
+    entered, release, calls = gated
+    app.extensions['coalescing'].enabled = False
+    client = make_client()
+
+    threads = [_get_in_thread(app, client, '/api/tasks/next') for _ in range(3)]
+    _wait_for(lambda: len(calls) == 3)
+    release.set()
+    for thread, _ in threads:
+        thread.join()
+
+    assert app.extensions['coalescing'].stats()['executed'] == 0
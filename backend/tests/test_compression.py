@@ -0,0 +1,86 @@
+import gzip
+
+import pytest
+
+from compression import decoded_etag
+
+brotli = pytest.importorskip('brotli')
+zstandard = pytest.importorskip('zstandard')
+
+EVENT = {
+    'title': 'Standup',
+    # Long enough to be compressed
+    'description': 'Daily sync on the release. ' * 40,
+    'start_time': '2025-01-01T10:00:00Z',
+    'end_time': '2025-01-01T11:00:00Z',
+}
+
+DECOMPRESS = {
+    'gzip': gzip.decompress,
+    'br': lambda data: brotli.decompress(data),
+    'zstd': lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+}
+
+
+@pytest.mark.parametrize('encoding', DECOMPRESS)
+def test_responses_are_compressed_per_accept_encoding(make_client, encoding):
+    client = make_client()
+    event_id = client.post('/api/events', json=EVENT).json['id']
+
+    plain = client.get(f'/api/events/{event_id}', headers={'Accept-Encoding': 'identity'})
+    compressed = client.get(f'/api/events/{event_id}', headers={'Accept-Encoding': encoding})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == encoding
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert DECOMPRESS[encoding](compressed.get_data()) == plain.get_data()
+    # Each encoding is its own representation
+    assert plain.headers['ETag'] == '"1"'
+    assert compressed.headers['ETag'] == f'"1-{encoding}"'
+
+
+def test_preferred_encoding_wins_and_small_bodies_stay_plain(make_client):
+    client = make_client()
+    big = client.post('/api/events', json=EVENT).json['id']
+    small = client.post('/api/events', json={**EVENT, 'description': None}).json['id']
+    headers = {'Accept-Encoding': 'gzip, br, zstd'}
+
+    assert client.get(f'/api/events/{big}', headers=headers).headers['Content-Encoding'] == 'zstd'
+    response = client.get(f'/api/events/{small}', headers=headers)
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == '"1"'
+
+
+def test_streamed_export_is_compressed(make_client):
+    client = make_client()
+    for _ in range(20):
+        client.post('/api/events', json=EVENT)
+
+    plain = client.get('/api/events/export.ics', headers={'Accept-Encoding': 'identity'})
+    compressed = client.get('/api/events/export.ics', headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in compressed.headers
+    assert gzip.decompress(compressed.get_data()).count(b'BEGIN:VEVENT') == 20
+    # Timestamps aside, the same calendar
+    assert len(gzip.decompress(compressed.get_data())) == len(plain.get_data())
+
+
+def test_if_match_accepts_compressed_etags(make_client):
+    client = make_client()
+    event_id = client.post('/api/events', json=EVENT).json['id']
+    etag = client.get(f'/api/events/{event_id}', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+    response = client.put(f'/api/events/{event_id}', json={'title': 'Retro'}, headers={'If-Match': etag})
+    assert response.status_code == 200
+    # The old tag, compressed or not, is stale now
+    response = client.put(f'/api/events/{event_id}', json={'title': 'Again'}, headers={'If-Match': etag})
+    assert response.status_code == 412
+
+
+def test_decoded_etag():
+    assert decoded_etag('3-gzip') == '3'
+    assert decoded_etag('3-zstd') == '3'
+    assert decoded_etag('3') == '3'
+    assert decoded_etag('-gzip') == '-gzip'
+    assert decoded_etag('3-deflate') == '3-deflate'
@@ -0,0 +1,93 @@
+import pytest
+
+EVENTS = [('2025-01-01T10:00:00Z', '2025-01-01T11:00:00Z'), ('2025-01-01T13:00:00Z', '2025-01-01T14:00:00Z')]
+
+
+def _interval(start, end):
+    return {'start_time': start, 'end_time': end}
+
+
+@pytest.fixture
+def client(make_client):
+    client = make_client()
+    for start, end in EVENTS:
+        client.post('/api/events', json={'title': 'Busy', 'start_time': start, 'end_time': end})
+    # Someone else's event never conflicts
+    make_client().post('/api/events', json={'title': 'Theirs', **_interval(*EVENTS[0])})
+    return client
+
+
+def test_conflicts_per_interval_in_any_order(client):
+    morning, afternoon = (event['id'] for event in client.get('/api/events').json)
+
+    response = client.post('/api/events/conflicts?fields=id,title', json={'intervals': [
+        _interval('2025-01-01T13:30:00Z', '2025-01-01T13:45:00Z'),
+        # Touching both events without overlapping either
+        _interval('2025-01-01T11:00:00Z', '2025-01-01T13:00:00Z'),
+        _interval('2025-01-01T09:00:00Z', '2025-01-01T15:00:00Z'),
+        _interval('2025-01-02T09:00:00Z', '2025-01-02T10:00:00Z'),
+    ]})
+
+    assert response.status_code == 200
+    assert response.json == {'checked': 4, 'conflicts': [
+        {'index': 0, 'events': [{'id': afternoon, 'title': 'Busy'}]},
+        {'index': 2, 'events': [{'id': morning, 'title': 'Busy'}, {'id': afternoon, 'title': 'Busy'}]},
+    ]}
+
+
+def test_single_interval_body(client):
+    response = client.post('/api/events/conflicts', json=_interval('2025-01-01T10:30:00', '2025-01-01T10:31:00'))
+
+    assert response.status_code == 200
+    assert [len(conflict['events']) for conflict in response.json['conflicts']] == [1]
+    assert response.json['conflicts'][0]['events'][0]['start_time'] == '2025-01-01T10:00:00+00:00'
+
+
+def test_every_bad_interval_is_reported(client):
+    response = client.post('/api/events/conflicts', json={'intervals': [
+        {'start_time': '2025-01-01T10:30:00'},
+        5,
+        _interval('soon', 'later'),
+        _interval('2025-01-02T00:00:00Z', '2025-01-01T00:00:00Z'),
+    ]})
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Interval 0: start_time and end_time are required'
+    invalid = 'invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'
+    assert response.json['errors'] == {
+        '0': {'end_time': 'start_time and end_time are required'},
+        '1': {'item': 'Interval must be a JSON object'},
+        '2': {'start_time': invalid, 'end_time': invalid},
+        '3': {'end_time': 'end time cannot be before start time'},
+    }
+
+
+def test_non_object_interval_first(client):
+    response = client.post('/api/events/conflicts', json={'intervals': [
+        _interval('2025-01-01T10:30:00Z', '2025-01-01T10:45:00Z'), [1],
+    ]})
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Interval 1 must be a JSON object'
+
+
+@pytest.mark.parametrize('body, message', [
+    ([1], 'Request body must be a JSON object'),
+    ({'intervals': []}, 'intervals must be a non-empty list'),
+    ({'intervals': 'x'}, 'intervals must be a non-empty list'),
+])
+def test_bad_bodies(client, body, message):
+    response = client.post('/api/events/conflicts', json=body)
+
+    assert response.status_code == 400
+    assert response.json['error'] == message
+
+
+def test_interval_limit(app, client):
+    limit = app.config['MAX_CONFLICT_INTERVALS']
+    interval = _interval('2025-01-01T10:30:00Z', '2025-01-01T10:45:00Z')
+
+    assert client.post('/api/events/conflicts', json={'intervals': [interval] * limit}).status_code == 200
+    response = client.post('/api/events/conflicts', json={'intervals': [interval] * (limit + 1)})
+    assert response.status_code == 400
+    assert response.json['error'] == f'At most {limit} intervals can be checked at once'
@@ -0,0 +1,36 @@
+import pytest
+
+EVENT = {'title': 'Standup', 'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T10:15:00Z'}
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers', 'due_datetime': '2025-01-03T17:00:00Z'}
+
+
+def test_task_list_and_detail_return_only_requested_fields(make_client):
+    client = make_client()
+    task_id = client.post('/api/tasks', json=TASK).json['id']
+
+    listed = client.get('/api/tasks?fields=id,title,due_datetime')
+    assert listed.status_code == 200
+    assert listed.json == [{'id': task_id, 'title': 'Write report', 'due_datetime': '2025-01-03T17:00:00+00:00'}]
+
+    detail = client.get(f'/api/tasks/{task_id}?fields=points,completed')
+    assert detail.status_code == 200
+    assert set(detail.json) == {'points', 'completed'}
+    assert detail.json['completed'] is False
+
+
+def test_event_list_returns_only_requested_fields(make_client):
+    client = make_client()
+    event_id = client.post('/api/events', json=EVENT).json['id']
+
+    listed = client.get('/api/events?fields=id, title,id')
+    assert listed.status_code == 200
+    assert listed.json == [{'id': event_id, 'title': 'Standup'}]
+
+
+@pytest.mark.parametrize('path', ['/api/tasks', '/api/events'])
+@pytest.mark.parametrize('fields', ['priority', 'id,category', ','])
+def test_unknown_fields_are_rejected(make_client, path, fields):
+    response = make_client().get(f'{path}?fields={fields}')
+
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Invalid fields: ')
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from grading import regrade_tasks
+
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers', 'estimated_minutes': 45}
+
+
+def _points_earned(client):
+    today = date.today()
+    response = client.get(f'/api/analytics?start={today - timedelta(days=1)}&end={today + timedelta(days=2)}')
+    assert response.status_code == 200
+    return response.json['totals']['points_earned']
+
+
+def test_regrade_moves_completed_points_in_the_rollups(app, make_client):
+    client = make_client()
+    app.extensions['admission'].enabled = False
+
+    ids = [client.post('/api/tasks', json=TASK).json['id'] for _ in range(3)]
+    for task_id in ids[:2]:
+        assert client.put(f'/api/tasks/{task_id}', json={'completed': True}).status_code == 200
+
+    before = _points_earned(client)
+    assert before == sum(client.get(f'/api/tasks/{task_id}').json['points'] for task_id in ids[:2])
+
+    model = app.config['GRADING_MODEL']
+    app.config['GRADING_MODEL'] = {**model, 'bias': model['bias'] + 10}
+    with app.app_context():
+        assert regrade_tasks() == (3, 3)
+
+    points = [client.get(f'/api/tasks/{task_id}').json['points'] for task_id in ids]
+    # Only the two completed tasks count, with their new points
+    assert _points_earned(client) == sum(points[:2]) == before + 20
@@ -0,0 +1,92 @@
+import io
+
+CALENDAR = '\r\n'.join([
+    'BEGIN:VCALENDAR',
+    'VERSION:2.0',
+    'BEGIN:VEVENT',
+    'UID:standup@example.com',
+    'SUMMARY:Standup',
+    'DTSTART;TZID=Europe/Paris:20250106T093000',
+    'DURATION:PT15M',
+    'RRULE:FREQ=DAILY;COUNT=3',
+    'EXDATE;TZID=Europe/Paris:20250107T093000',
+    'END:VEVENT',
+    'BEGIN:VEVENT',
+    'SUMMARY:Offsite with a description long enough to need fold',
+    ' ing on export',
+    'DESCRIPTION:Line one\\nLine two\\, with a comma',
+    'DTSTART;VALUE=DATE:20250110',
+    'DTEND;VALUE=DATE:20250111',
+    'BEGIN:VALARM',
+    'ACTION:DISPLAY',
+    'END:VALARM',
+    'END:VEVENT',
+    'BEGIN:VEVENT',
+    'SUMMARY:Broken',
+    'DTSTART:not-a-date',
+    'END:VEVENT',
+    'END:VCALENDAR',
+    '',
+])
+
+
+def test_import_expands_recurrences_and_skips_bad_events(make_client):
+    client = make_client()
+
+    response = client.post('/api/events/import', data=CALENDAR, content_type='text/calendar')
+    assert response.status_code == 201
+    assert response.json['imported'] == 3
+    assert response.json['skipped'] == 1
+    assert len(response.json['errors']) == 1
+
+    events = {(event['title'], event['start_time']) for event in client.get('/api/events').json}
+    assert events == {
+        ('Standup', '2025-01-06T08:30:00+00:00'),
+        ('Standup', '2025-01-08T08:30:00+00:00'),
+        ('Offsite with a description long enough to need folding on export', '2025-01-10T00:00:00+00:00'),
+    }
+    offsite = next(event for event in client.get('/api/events').json if event['all_day'])
+    assert offsite['description'] == 'Line one\nLine two, with a comma'
+
+
+def test_import_accepts_file_uploads(make_client):
+    client = make_client()
+
+    response = client.post('/api/events/import', data={'file': (io.BytesIO(CALENDAR.encode()), 'cal.ics')})
+    assert response.status_code == 201
+    assert response.json['imported'] == 3
+
+    assert client.post('/api/events/import', json={}).status_code == 400
+
+
+def test_export_round_trips(make_client):
+    client = make_client()
+    client.post('/api/events/import', data=CALENDAR, content_type='text/calendar')
+
+    exported = client.get('/api/events/export.ics')
+    assert exported.status_code == 200
+    assert exported.mimetype == 'text/calendar'
+    body = exported.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n')
+    assert body.count('BEGIN:VEVENT') == 3
+    assert all(len(line.encode()) <= 75 for line in body.split('\r\n'))
+
+    other = make_client()
+    response = other.post('/api/events/import', data=body, content_type='text/calendar')
+    assert response.json == {'imported': 3, 'skipped': 0, 'errors': []}
+    assert sorted(
+        (event['title'], event['start_time'], event['end_time'], event['description'])
+        for event in other.get('/api/events').json
+    ) == sorted(
+        (event['title'], event['start_time'], event['end_time'], event['description'])
+        for event in client.get('/api/events').json
+    )
+
+
+def test_export_filters_by_range(make_client):
+    client = make_client()
+    client.post('/api/events/import', data=CALENDAR, content_type='text/calendar')
+
+    exported = client.get('/api/events/export.ics?start=2025-01-07T00:00:00Z&end=2025-01-09T00:00:00Z')
+    assert exported.get_data(as_text=True).count('BEGIN:VEVENT') == 1
+    assert client.get('/api/events/export.ics?start=never').status_code == 400
@@ -0,0 +1,93 @@
+import gzip
+import threading
+
+from extensions import db
+from models import Event
+
+REQUESTS = 8
+
+EVENT = {
+    'title': 'Standup',
+    # Long enough to be compressed
+    'description': 'Daily sync on the release. ' * 40,
+    'start_time': '2025-01-01T10:00:00Z',
+    'end_time': '2025-01-01T11:00:00Z',
+}
+
+
+def _event_count(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count()).select_from(Event))
+
+
+def test_retry_replays_response_and_headers(app, make_client):
+    client = make_client()
+    headers = {'Idempotency-Key': 'create-standup'}
+
+    first = client.post('/api/events', json=EVENT, headers=headers)
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    retry = client.post('/api/events', json=EVENT, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_data() == first.get_data()
+    assert retry.headers['ETag'] == first.headers['ETag']
+    assert retry.headers['Content-Type'] == first.headers['Content-Type']
+    assert 'Accept' in retry.headers['Vary']
+    assert _event_count(app) == 1
+
+
+def test_replay_is_compressed_for_the_retry(app, make_client):
+    client = make_client()
+    headers = {'Idempotency-Key': 'create-standup'}
+
+    first = client.post('/api/events', json=EVENT, headers=headers)
+    retry = client.post('/api/events', json=EVENT, headers={**headers, 'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in first.headers
+    assert retry.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in retry.headers['Vary']
+    assert gzip.decompress(retry.get_data()) == first.get_data()
+
+
+def test_key_reused_for_another_request_is_rejected(app, make_client):
+    client = make_client()
+    headers = {'Idempotency-Key': 'create-standup'}
+    assert client.post('/api/events', json=EVENT, headers=headers).status_code == 201
+
+    other_body = client.post('/api/events', json={**EVENT, 'title': 'Retro'}, headers=headers)
+    assert other_body.status_code == 422
+
+    # Same body, but another negotiated representation
+    other_format = client.post('/api/events', json=EVENT, headers={**headers, 'Accept': 'application/msgpack'})
+    assert other_format.status_code == 422
+
+    # Keys are per user
+    assert make_client().post('/api/events', json=EVENT, headers=headers).status_code == 201
+    assert _event_count(app) == 2
+
+
+def test_concurrent_duplicates_run_the_view_once(app, make_client):
+    client = make_client()
+    app.extensions['admission'].enabled = False
+    headers = {'Authorization': client.environ_base['HTTP_AUTHORIZATION'], 'Idempotency-Key': 'create-standup'}
+
+    start = threading.Barrier(REQUESTS)
+    responses = []
+
+    def send():
+        thread_client = app.test_client()
+        start.wait()
+        responses.append(thread_client.post('/api/events', json=EVENT, headers=headers))
+
+    threads = [threading.Thread(target=send) for _ in range(REQUESTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [response.status_code for response in responses] == [201] * REQUESTS
+    assert len({response.json['id'] for response in responses}) == 1
+    assert sum('Idempotent-Replayed' in response.headers for response in responses) == REQUESTS - 1
+    assert _event_count(app) == 1
@@ -0,0 +1,42 @@
+import threading
+
+WRITERS = 8
+ROUNDS = 5
+
+
+def test_concurrent_if_match_puts_succeed_once_per_version(app, make_client):
+    client = make_client()
+    app.extensions['admission'].enabled = False
+    created = client.post('/api/events', json={
+        'title': 'Standup',
+        'start_time': '2025-01-01T10:00:00Z',
+        'end_time': '2025-01-01T11:00:00Z',
+    })
+    event_id = created.json['id']
+    headers = {'Authorization': client.environ_base['HTTP_AUTHORIZATION']}
+
+    for round_ in range(ROUNDS):
+        version = client.get(f'/api/events/{event_id}').json['version']
+        # Every writer sends its PUT for the same version at the same time
+        start = threading.Barrier(WRITERS)
+        codes = []
+
+        def write(writer):
+            # One test client per thread, as concurrent clients would be
+            thread_client = app.test_client()
+            start.wait()
+            response = thread_client.put(
+                f'/api/events/{event_id}',
+                json={'title': f'round {round_} writer {writer}'},
+                headers={**headers, 'If-Match': f'"{version}"'},
+            )
+            codes.append(response.status_code)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(codes) == [200] + [412] * (WRITERS - 1)
+        assert client.get(f'/api/events/{event_id}').json['version'] == version + 1
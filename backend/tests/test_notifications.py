@@ -0,0 +1,142 @@
+import itertools
+import json
+import time
+
+from extensions import db
+from models import Notification, StreamListener
+from notifications import broker
+
+EVENT = {'title': 'Standup', 'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T10:15:00Z'}
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers'}
+
+
+def _count(app, model):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count()).select_from(model))
+
+
+def _open_stream(client, last_event_id=None):
+    headers = {'Last-Event-ID': last_event_id} if last_event_id else {}
+    response = client.get('/api/stream', headers=headers)
+    assert response.status_code == 200
+    frames = iter(response.response)
+    assert next(frames).startswith(b'retry: ')
+    return response, frames
+
+
+def _parse(frame: bytes) -> dict:
+    fields = dict(line.split(': ', 1) for line in frame.decode().splitlines() if line)
+    fields['data'] = json.loads(fields['data'])
+    return fields
+
+
+def test_writes_without_listeners_log_nothing(app, make_client):
+    client = make_client()
+
+    assert client.post('/api/events', json=EVENT).status_code == 201
+    assert client.post('/api/tasks', json=TASK).status_code == 201
+
+    assert _count(app, StreamListener) == 0
+    assert _count(app, Notification) == 0
+
+
+def test_stream_delivers_and_resumes(app, make_client):
+    client = make_client()
+    other = make_client()
+
+    response, frames = _open_stream(client)
+    try:
+        task = client.post('/api/tasks', json=TASK).json
+        # Nobody listens to the other user
+        assert other.post('/api/tasks', json=TASK).status_code == 201
+
+        frame = _parse(next(frames))
+        assert (frame['id'], frame['event'], frame['data']['id']) == ('main-1', 'task.created', task['id'])
+    finally:
+        response.close()
+
+    assert _count(app, Notification) == 1
+
+    # Still leased, so writes while disconnected are logged and replayed
+    event = client.post('/api/events', json=EVENT).json
+    response, frames = _open_stream(client, 'main-1')
+    try:
+        frame = _parse(next(frames))
+        assert (frame['id'], frame['event'], frame['data']['id']) == ('main-2', 'event.created', event['id'])
+    finally:
+        response.close()
+
+
+def test_unknown_last_event_id_resets(app, make_client):
+    client = make_client()
+
+    for last_event_id in ('main-99', '3-1', 'garbage'):
+        response, frames = _open_stream(client, last_event_id)
+        try:
+            assert _parse(next(frames)) == {'id': 'main-0', 'event': 'reset', 'data': {}}
+        finally:
+            response.close()
+
+
+def test_stream_headers_and_query_token(app, make_client):
+    client = make_client()
+    token = client.environ_base.pop('HTTP_AUTHORIZATION').split()[1]
+
+    assert client.get('/api/stream').status_code == 401
+    # EventSource cannot send headers; other routes still require them
+    assert client.get(f'/api/events?access_token={token}').status_code == 401
+
+    response = client.get(f'/api/stream?access_token={token}')
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+    finally:
+        response.close()
+
+
+def test_stream_reports_updates_and_deletes_and_keeps_alive(app, make_client):
+    client = make_client()
+    event_id = client.post('/api/events', json=EVENT).json['id']
+    broker.heartbeat = 0.05
+
+    response, frames = _open_stream(client)
+    try:
+        # Idle streams get comment frames
+        assert next(frames) == b': keepalive\n\n'
+
+        client.put(f'/api/events/{event_id}', json={'title': 'Retro'})
+        client.delete(f'/api/events/{event_id}')
+        received = []
+        while len(received) < 2:
+            frame = next(frames)
+            if not frame.startswith(b':'):
+                received.append(_parse(frame))
+    finally:
+        response.close()
+
+    assert [(frame['event'], frame['data']['id']) for frame in received] == [
+        ('event.updated', event_id), ('event.deleted', event_id),
+    ]
+    assert received[0]['data']['title'] == 'Retro'
+
+
+def test_slow_stream_is_dropped_when_its_queue_overflows(app, make_client):
+    app.config['SSE_QUEUE_SIZE'] = 2
+    broker.init_app(app)
+    broker.heartbeat = 0.05
+    client = make_client()
+
+    response, frames = _open_stream(client)
+    try:
+        for _ in range(5):
+            client.post('/api/tasks', json=TASK)
+        # Let the poller hand them out to the stream nobody reads
+        time.sleep(0.5)
+        frames = list(itertools.islice(frames, 20))
+    finally:
+        response.close()
+
+    # The stream ends instead of keeping alive; the client reconnects with Last-Event-ID
+    assert frames == []
@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+from werkzeug.serving import make_server
+
+from extensions import db
+from models import Event
+
+
+ABUSERS = 4
+# Requests per second each abusive thread sends, whatever the answers
+ABUSER_RATE = 20
+EVENTS = 300
+
+
+def _get(url, token):
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code
+
+
+def _under_abuse(base_url, victim_token, abuser_token):
+    """
+    Latencies of a polite client's requests while ABUSERS threads send
+    another user's requests at a fixed rate, as an abusive client would.
+    """
+
+    stop = threading.Event()
+    codes = []
+
+    def flood():
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            codes.append(_get(f'{base_url}/api/events', abuser_token))
+            next_at += 1 / ABUSER_RATE
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+
+    threads = [threading.Thread(target=flood) for _ in range(ABUSERS)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    try:
+        time.sleep(0.5)
+        for _ in range(20):
+            started = time.perf_counter()
+            assert _get(f'{base_url}/api/tasks', victim_token) == 200
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.15)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return latencies, codes
+
+
+def _token(client):
+    return client.environ_base['HTTP_AUTHORIZATION'].removeprefix('Bearer ')
+
+
+def test_polite_client_keeps_its_latency_under_an_abusive_one(app, make_client):
+    victim = make_client()
+    abuser = make_client()
+
+    abuser_id = abuser.get('/api/auth/me').json['id']
+    with app.app_context():
+        # Mapped attribute names and naive UTC, as the iCalendar import inserts them
+        db.session.execute(db.insert(Event), [
+            {
+                'user_id': abuser_id,
+                'title': f'event {i}',
+                '_start_time': datetime(2025, 1, 1, 10),
+                '_end_time': datetime(2025, 1, 1, 11),
+                'all_day': False,
+            }
+            for i in range(EVENTS)
+        ])
+        db.session.commit()
+
+    # One request at a time, so abusive requests make others queue as they
+    # would for a busy worker
+    server = make_server('127.0.0.1', 0, app, threaded=False)
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    try:
+        app.extensions['admission'].enabled = False
+        unprotected, _ = _under_abuse(base_url, _token(victim), _token(abuser))
+        app.extensions['admission'].enabled = True
+        protected, codes = _under_abuse(base_url, _token(victim), _token(abuser))
+    finally:
+        server.shutdown()
+        serving.join()
+
+    # The abuser only gets its burst plus the refill rate; the rest are cheap 429s
+    assert codes.count(429) > codes.count(200)
+    # ...so the polite client, never limited itself, waits far less than without limits
+    assert statistics.median(protected) * 3 < statistics.median(unprotected)
@@ -0,0 +1,67 @@
+import pytest
+
+EVENT = {'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T11:00:00Z'}
+
+
+def _search(client, query, **params):
+    response = client.get('/api/search', query_string={'q': query, **params})
+    assert response.status_code == 200, response.json
+    return [(result['type'], result['item']['title']) for result in response.json['results']]
+
+
+def test_search_ranks_title_hits_first_and_matches_prefixes(make_client):
+    client = make_client()
+    client.post('/api/events', json={**EVENT, 'title': 'Lunch', 'description': 'Team meeting notes'})
+    client.post('/api/events', json={**EVENT, 'title': 'Team meeting'})
+    client.post('/api/tasks', json={'title': 'Book room', 'description': 'For the team offsite'})
+
+    assert _search(client, 'team meet') == [('event', 'Team meeting'), ('event', 'Lunch')]
+    assert _search(client, 'team', type='task') == [('task', 'Book room')]
+    # Accents are folded
+    client.post('/api/tasks', json={'title': 'Café order', 'description': 'Pastries'})
+    assert _search(client, 'cafe') == [('task', 'Café order')]
+
+
+def test_search_follows_updates_and_deletes(make_client):
+    client = make_client()
+    event_id = client.post('/api/events', json={**EVENT, 'title': 'Budget review'}).json['id']
+
+    client.put(f'/api/events/{event_id}', json={'title': 'Roadmap review'})
+    assert _search(client, 'budget') == []
+    assert _search(client, 'roadmap') == [('event', 'Roadmap review')]
+
+    client.delete(f'/api/events/{event_id}')
+    assert _search(client, 'roadmap') == []
+
+
+def test_search_is_per_user_and_filters_by_time(make_client):
+    client = make_client()
+    make_client().post('/api/events', json={**EVENT, 'title': 'Planning'})
+    client.post('/api/events', json={**EVENT, 'title': 'Planning'})
+    client.post('/api/events', json={
+        'title': 'Planning', 'start_time': '2025-03-01T10:00:00Z', 'end_time': '2025-03-01T11:00:00Z',
+    })
+
+    assert len(_search(client, 'planning')) == 2
+    assert len(_search(client, 'planning', start='2025-02-01T00:00:00Z')) == 1
+    assert len(_search(client, 'planning', per_page=1, page=2)) == 1
+
+
+@pytest.mark.parametrize('params, message', [
+    ({'q': ' '}, 'Search query cannot be empty'),
+    ({'q': 'x', 'type': 'note'}, 'type must be "event" or "task"'),
+    ({'q': 'x', 'per_page': 101}, 'page must be >= 1 and per_page between 1 and 100'),
+    ({'q': 'x', 'start': 'soon'}, 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'),
+])
+def test_search_rejects_bad_parameters(make_client, params, message):
+    response = make_client().get('/api/search', query_string=params)
+
+    assert response.status_code == 400
+    assert response.json['error'] == message
+
+
+def test_search_treats_operators_as_text(make_client):
+    client = make_client()
+    client.post('/api/events', json={**EVENT, 'title': 'NOT this OR that'})
+
+    assert _search(client, 'NOT "this* OR (that') == [('event', 'NOT this OR that')]
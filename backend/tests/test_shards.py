@@ -0,0 +1,112 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import SHARDED, User
+from shards import DirectoryCache, move_tenant, router
+
+SHARDS = 2
+
+EVENT = {'title': 'Standup', 'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T10:15:00Z'}
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers'}
+
+# Sharding is fixed when the models are imported, so the tests below run in
+# a separate pytest process with SHARD_COUNT set
+sharded = pytest.mark.skipif(not SHARDED, reason='needs SHARD_COUNT in the environment')
+
+
+@pytest.mark.skipif(SHARDED, reason='the sharded tests run directly')
+def test_with_sharding_on():
+    result = subprocess.run(
+        [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', __file__],
+        env={**os.environ, 'SHARD_COUNT': str(SHARDS)},
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def _count(path, table, user_id):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f'SELECT count(*) FROM {table} WHERE user_id = ?', (user_id,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+@sharded
+def test_users_are_placed_on_shards_and_isolated(app, make_client):
+    clients = [make_client() for _ in range(4)]
+    user_ids = [client.get('/api/auth/me').json['id'] for client in clients]
+
+    for count, client in enumerate(clients, 1):
+        for _ in range(count):
+            assert client.post('/api/events', json=EVENT).status_code == 201
+
+    with app.app_context():
+        main = db.engine.url.database
+    for count, (client, user_id) in enumerate(zip(clients, user_ids), 1):
+        assert len(client.get('/api/events').json) == count
+        assert _count(router.path(user_id % SHARDS), 'events', user_id) == count
+        assert _count(router.path((user_id + 1) % SHARDS), 'events', user_id) == 0
+        assert _count(main, 'events', user_id) == 0
+
+
+@sharded
+def test_move_tenant_keeps_ids_and_sync_tokens(app, make_client):
+    client = make_client()
+    user_id = client.get('/api/auth/me').json['id']
+    event_ids = sorted(client.post('/api/events', json=EVENT).json['id'] for _ in range(3))
+    task_id = client.post('/api/tasks', json=TASK).json['id']
+    token = client.get('/api/sync').json['token']
+    deleted = event_ids.pop()
+    assert client.delete(f'/api/events/{deleted}').status_code == 204
+
+    source = user_id % SHARDS
+    target = (source + 1) % SHARDS
+    with app.app_context():
+        copied = move_tenant(db.session.get(User, user_id), target)
+        db.session.commit()
+    assert copied['events'] == 2
+    assert copied['tasks'] == 1
+
+    assert sorted(event['id'] for event in client.get('/api/events').json) == event_ids
+    assert client.get(f'/api/tasks/{task_id}').status_code == 200
+    changes = client.get(f'/api/sync?since={token}').json
+    assert deleted in changes['deleted']['events']
+
+    # New rows go to the new shard, and the old one refuses the user's rows
+    assert client.post('/api/events', json=EVENT).status_code == 201
+    assert _count(router.path(target), 'events', user_id) == 3
+    assert _count(router.path(source), 'events', user_id) == 0
+    with app.app_context(), pytest.raises(IntegrityError, match='not hosted'):
+        with router.engine(source).begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO tasks (id, user_id, title, description, version, created_at, updated_at) "
+                "VALUES (999999, ?, 't', 'd', 1, '2025-01-01', '2025-01-01')", (user_id,)
+            )
+
+
+@sharded
+def test_directory_cache_follows_moves_of_other_processes(app, make_client):
+    user_id = make_client().get('/api/auth/me').json['id']
+    shard = user_id % SHARDS
+    cache = router.directory_cache
+
+    with app.app_context():
+        assert cache.shard_of(user_id) == shard
+
+        # A change the cache was not told about is not seen...
+        db.session.execute(db.update(User).where(User.id == user_id).values(shard=None))
+        db.session.commit()
+        assert cache.shard_of(user_id) == shard
+
+        # ...until a move by any process bumps the stamp
+        DirectoryCache(os.path.join(router.directory, 'directory.stamp'), 1).moved()
+        assert cache.shard_of(user_id) is None
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+
+EVENTS = [
+    # Overlapping, so 90 busy minutes
+    ('2025-03-09T15:00:00Z', '2025-03-09T16:00:00Z'),
+    ('2025-03-09T15:30:00Z', '2025-03-09T16:30:00Z'),
+    # 23:00-01:00 in New York: split across the two local days
+    ('2025-03-10T03:00:00Z', '2025-03-10T05:00:00Z'),
+]
+
+
+def _summary(client, **params):
+    response = client.get('/api/events/summary', query_string=params)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+@pytest.fixture
+def client(make_client):
+    client = make_client()
+    for start, end in EVENTS:
+        client.post('/api/events', json={'title': 'Busy', 'start_time': start, 'end_time': end})
+    # The evening of March 9 in New York, but March 10 in UTC
+    client.post('/api/tasks', json={'title': 'Report', 'description': 'Due', 'due_datetime': '2025-03-10T02:00:00Z'})
+    return client
+
+
+def test_day_buckets_follow_the_local_day_across_dst(client):
+    summary = _summary(
+        client, start='2025-03-08T12:00:00-05:00', end='2025-03-11T00:00:00-04:00', tz='America/New_York',
+    )
+
+    buckets = [
+        (bucket['start'], bucket['event_count'], bucket['busy_minutes'], bucket['tasks_due'])
+        for bucket in summary['buckets']
+    ]
+    assert buckets == [
+        ('2025-03-08T00:00:00-05:00', 0, 0, 0),
+        ('2025-03-09T00:00:00-05:00', 3, 150, 1),
+        ('2025-03-10T00:00:00-04:00', 1, 60, 0),
+    ]
+    # The day clocks went forward is 23 hours long
+    day = summary['buckets'][1]
+    assert (datetime.fromisoformat(day['end']) - datetime.fromisoformat(day['start'])).total_seconds() == 23 * 3600
+
+
+def test_utc_buckets_split_differently(client):
+    summary = _summary(client, start='2025-03-09T00:00:00Z', end='2025-03-11T00:00:00Z')
+
+    assert summary['tz'] == 'UTC'
+    assert [(b['event_count'], b['busy_minutes'], b['tasks_due']) for b in summary['buckets']] == [
+        (2, 90, 0),
+        (1, 120, 1),
+    ]
+
+
+def test_week_buckets_start_on_local_monday(client):
+    summary = _summary(
+        client, start='2025-03-09T12:00:00Z', end='2025-03-12T00:00:00Z', bucket='week', tz='America/New_York',
+    )
+
+    assert [(b['start'], b['end']) for b in summary['buckets']] == [
+        ('2025-03-03T00:00:00-05:00', '2025-03-10T00:00:00-04:00'),
+        ('2025-03-10T00:00:00-04:00', '2025-03-17T00:00:00-04:00'),
+    ]
+    assert sum(b['busy_minutes'] for b in summary['buckets']) == 210
+
+
+@pytest.mark.parametrize('params, message', [
+    ({'start': '2025-03-09T00:00:00Z'}, 'start and end are required'),
+    ({'start': '2025-03-09', 'end': 'later'}, 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'),
+    ({'start': '2025-03-09', 'end': '2025-03-08'}, 'End time cannot be before start time'),
+    ({'start': '2025-03-09', 'end': '2025-03-10', 'bucket': 'month'}, 'bucket must be "day" or "week"'),
+    ({'start': '2025-03-09', 'end': '2025-03-10', 'tz': 'Mars/Olympus'}, 'Unknown timezone: Mars/Olympus'),
+])
+def test_summary_rejects_bad_parameters(make_client, params, message):
+    response = make_client().get('/api/events/summary', query_string=params)
+
+    assert response.status_code == 400
+    assert response.json['error'] == message
+
+
+def test_summary_caps_the_number_of_buckets(make_client):
+    response = make_client().get('/api/events/summary', query_string={'start': '2020-01-01', 'end': '2025-01-01'})
+
+    assert response.status_code == 400
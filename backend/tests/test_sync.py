@@ -0,0 +1,70 @@
+import pytest
+
+EVENT = {'title': 'Standup', 'start_time': '2025-01-01T10:00:00Z', 'end_time': '2025-01-01T10:15:00Z'}
+TASK = {'title': 'Write report', 'description': 'Quarterly numbers'}
+
+
+def _sync(client, since=None, **params):
+    if since is not None:
+        params['since'] = since
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.json
+    return response.json
+
+
+def test_sync_returns_changes_and_tombstones_since_a_token(make_client):
+    client = make_client()
+    kept, edited, removed = (client.post('/api/events', json=EVENT).json['id'] for _ in range(3))
+    task_id = client.post('/api/tasks', json=TASK).json['id']
+
+    full = _sync(client)
+    assert sorted(event['id'] for event in full['events']) == [kept, edited, removed]
+    assert [task['id'] for task in full['tasks']] == [task_id]
+    assert full['deleted'] == {'events': [], 'tasks': []}
+    assert full['has_more'] is False
+
+    client.put(f'/api/events/{edited}', json={'title': 'Retro'})
+    client.delete(f'/api/events/{removed}')
+    client.delete(f'/api/tasks/{task_id}')
+    created = client.post('/api/events', json=EVENT).json['id']
+    # Created and deleted between two syncs: only the tombstone is sent
+    short_lived = client.post('/api/events', json=EVENT).json['id']
+    client.delete(f'/api/events/{short_lived}')
+
+    delta = _sync(client, full['token'])
+    assert [(event['id'], event['title']) for event in delta['events']] == [(edited, 'Retro'), (created, 'Standup')]
+    assert delta['tasks'] == []
+    assert delta['deleted'] == {'events': [removed, short_lived], 'tasks': [task_id]}
+
+    # Nothing new since the last token
+    again = _sync(client, delta['token'])
+    assert (again['events'], again['deleted'], again['token']) == ([], {'events': [], 'tasks': []}, delta['token'])
+
+
+def test_sync_pages_with_the_returned_token(make_client):
+    client = make_client()
+    ids = [client.post('/api/events', json=EVENT).json['id'] for _ in range(5)]
+    make_client().post('/api/events', json=EVENT)
+
+    seen = []
+    token = '0'
+    while True:
+        page = _sync(client, token, limit=2)
+        seen.extend(event['id'] for event in page['events'])
+        token = page['token']
+        if not page['has_more']:
+            break
+    assert seen == ids
+
+
+@pytest.mark.parametrize('params, message', [
+    ({'since': 'abc'}, 'Invalid sync token'),
+    ({'since': '-1'}, 'Invalid sync token'),
+    ({'limit': 0}, 'limit must be between 1 and 1000'),
+    ({'limit': 1001}, 'limit must be between 1 and 1000'),
+])
+def test_sync_rejects_bad_parameters(make_client, params, message):
+    response = make_client().get('/api/sync', query_string=params)
+
+    assert response.status_code == 400
+    assert response.json['error'] == message
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+from extensions import db
+from migrations import upgrade_schema
+from models import Task
+
+
+def _score(model, task, now):
+    if task['due_datetime'] is None:
+        urgency = 0.0
+    else:
+        hours = (datetime.fromisoformat(task['due_datetime']) - now).total_seconds() / 3600
+        slack = hours - (task['estimated_minutes'] or model['default_minutes']) / 60
+        urgency = 1.0 if slack <= 0 else 1 / (1 + slack / model['slack_hours'])
+    return model['deadline'] * urgency + model['points'] * (task['points'] or 0)
+
+
+@pytest.fixture
+def client(make_client):
+    client = make_client()
+    now = datetime.now(timezone.utc)
+    specs = [
+        ('Overdue', now - timedelta(days=1), 30),
+        ('Tonight, long', now + timedelta(hours=3), 240),
+        ('Tonight, short', now + timedelta(hours=3), 15),
+        ('Next week', now + timedelta(days=7), 60),
+        ('Next month', now + timedelta(days=30), None),
+        ('Someday', None, None),
+        ('Someday, detailed', None, 600),
+    ]
+    for title, due, minutes in specs:
+        client.post('/api/tasks', json={
+            'title': title,
+            'description': title * 3,
+            'due_datetime': due and due.isoformat(),
+            'estimated_minutes': minutes,
+        })
+    done = client.post('/api/tasks', json={
+        'title': 'Done', 'description': 'Already', 'due_datetime': now.isoformat(),
+    }).json['id']
+    client.put(f'/api/tasks/{done}', json={'completed': True})
+    return client
+
+
+def test_next_tasks_match_the_scoring_model(app, client):
+    model = app.config['NEXT_TASKS_MODEL']
+    tasks = client.get('/api/tasks').json
+    now = datetime.now(timezone.utc)
+    expected = sorted(
+        (task for task in tasks if not task['completed']),
+        key=lambda task: -_score(model, task, now)
+    )
+
+    for limit in (1, 3, 7):
+        response = client.get(f'/api/tasks/next?limit={limit}')
+        assert response.status_code == 200
+        assert [task['title'] for task in response.json] == [task['title'] for task in expected[:limit]]
+
+    # Completed tasks are never suggested
+    assert 'Done' not in [task['title'] for task in client.get('/api/tasks/next?limit=20').json]
+
+
+def test_next_tasks_defaults_and_fields(client):
+    response = client.get('/api/tasks/next?fields=title')
+
+    assert len(response.json) == 5
+    assert all(set(task) == {'title'} for task in response.json)
+    assert response.json == [{'title': task['title']} for task in client.get('/api/tasks/next?limit=5').json]
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=10000', 'fields=urgency'])
+def test_next_tasks_rejects_bad_parameters(client, query):
+    assert client.get(f'/api/tasks/next?{query}').status_code == 400
+
+
+def test_ranking_reads_the_open_tasks_index(app, client):
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if 'ORDER BY' in statement and 'LIMIT' in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        assert client.get('/api/tasks/next').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    statement, parameters = statements[-1]
+    with engine.connect() as connection:
+        plan = ' '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters))
+    assert 'USING COVERING INDEX ix_tasks_user_open' in plan
+
+
+def test_upgrade_rebuilds_the_open_tasks_index(app):
+    with app.app_context(), db.engine.begin() as connection:
+        # As created before completed_at was added to it
+        connection.execute(text('DROP INDEX ix_tasks_user_open'))
+        connection.execute(text(
+            'CREATE INDEX ix_tasks_user_open ON tasks (user_id, due_datetime, estimated_minutes, points) '
+            'WHERE completed_at IS NULL'
+        ))
+
+        upgrade_schema(connection, [Task.__table__])
+
+        indexes = {index['name']: index['column_names'] for index in inspect(connection).get_indexes('tasks')}
+    assert indexes['ix_tasks_user_open'][-1] == 'completed_at'
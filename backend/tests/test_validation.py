@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from validation import (
+    DATE_FORMAT_ERROR, EVENT_SCHEMA, TASK_SCHEMA, Boolean, DateTime, Schema, Text, ValidationError, parse_datetime,
+)
+
+UTC = timezone.utc
+
+
+def _reference_parse(date_string):
+    # parse_datetime without the fast path
+    dt = datetime.fromisoformat(date_string)
+    return dt.replace(tzinfo=UTC) if dt.tzinfo is None else dt.astimezone(UTC)
+
+
+@pytest.mark.parametrize('date_string, expected', [
+    # Offset-less, through the fast path that appends +00:00
+    ('2025-01-01T10:00:00', datetime(2025, 1, 1, 10, tzinfo=UTC)),
+    ('2025-01-01T10:00', datetime(2025, 1, 1, 10, tzinfo=UTC)),
+    ('2025-01-01 10:00:00.250', datetime(2025, 1, 1, 10, 0, 0, 250000, tzinfo=UTC)),
+    ('20250101T100000', datetime(2025, 1, 1, 10, tzinfo=UTC)),
+    # Date only: nothing after the date, so not the fast path
+    ('2025-01-01', datetime(2025, 1, 1, tzinfo=UTC)),
+    # With an offset, converted
+    ('2025-01-01T10:00:00Z', datetime(2025, 1, 1, 10, tzinfo=UTC)),
+    ('2025-01-01T10:00:00+00:00', datetime(2025, 1, 1, 10, tzinfo=UTC)),
+    ('2025-01-01T10:00:00+02:00', datetime(2025, 1, 1, 8, tzinfo=UTC)),
+    ('2025-01-01T01:00:00-05:30', datetime(2025, 1, 1, 6, 30, tzinfo=UTC)),
+])
+def test_parse_datetime(date_string, expected):
+    parsed = parse_datetime(date_string)
+
+    assert parsed == expected
+    assert parsed.utcoffset() == timedelta(0)
+    assert parsed == _reference_parse(date_string)
+
+
+@pytest.mark.parametrize('date_string', [
+    '', 'soon', '2025-13-01T10:00:00', '2025-01-01T25:00:00', '2025-01-01T10:00:00+25:00',
+    '2025-01-01T10:00:00+00:00+00:00', '2025-01-01Tnoon',
+    # Not the fast path either: only an upper case Z is ISO 8601
+    '2025-01-01T10:00:00z',
+])
+def test_parse_datetime_rejects_invalid_strings(date_string):
+    with pytest.raises(ValueError):
+        parse_datetime(date_string)
+
+
+def test_validate_reports_every_field_at_once():
+    with pytest.raises(ValidationError) as info:
+        EVENT_SCHEMA.validate({'title': '  ', 'start_time': 'soon', 'all_day': 'yes', 'location': 3})
+
+    assert info.value.errors == {
+        'title': 'Title cannot be empty',
+        'start_time': DATE_FORMAT_ERROR,
+        'end_time': 'End time is required',
+        'location': 'location must be a string',
+        'all_day': 'all_day must be a boolean',
+    }
+    # The summary is the first field's message
+    assert info.value.to_dict()['error'] == 'Title cannot be empty'
+
+
+def test_validate_converts_values_and_applies_defaults():
+    values = EVENT_SCHEMA.validate({
+        'title': ' Standup ', 'description': '   ',
+        'start_time': '2025-01-01T10:00:00', 'end_time': '2025-01-01T11:00:00+01:00',
+    })
+
+    assert values == {
+        'title': 'Standup',
+        'description': None,
+        'start_time': datetime(2025, 1, 1, 10, tzinfo=UTC),
+        'end_time': datetime(2025, 1, 1, 10, tzinfo=UTC),
+        'all_day': False,
+    }
+
+
+def test_partial_validate_only_checks_present_fields():
+    assert TASK_SCHEMA.validate({'estimated_minutes': 30}, partial=True) == {'estimated_minutes': 30}
+    assert TASK_SCHEMA.validate({}, partial=True) == {}
+
+    with pytest.raises(ValidationError) as info:
+        TASK_SCHEMA.validate({'title': None, 'estimated_minutes': -1}, partial=True)
+    assert info.value.errors == {
+        'title': 'Title cannot be empty',
+        'estimated_minutes': 'estimated_minutes must be a non-negative integer',
+    }
+
+
+def test_checks_run_only_once_fields_are_valid():
+    with pytest.raises(ValidationError) as info:
+        EVENT_SCHEMA.validate({
+            'title': 'Standup', 'start_time': '2025-01-01T11:00:00Z', 'end_time': '2025-01-01T10:00:00Z',
+        })
+    assert info.value.errors == {'end_time': 'End time cannot be before start time'}
+
+    with pytest.raises(ValidationError) as info:
+        EVENT_SCHEMA.validate({'title': '', 'start_time': '2025-01-01T11:00:00Z', 'end_time': '2025-01-01T10:00:00Z'})
+    assert info.value.errors == {'title': 'Title cannot be empty'}
+
+
+@pytest.mark.parametrize('body', [None, [], 'x', 1])
+def test_validate_rejects_non_object_bodies(body):
+    with pytest.raises(ValidationError) as info:
+        TASK_SCHEMA.validate(body)
+
+    assert info.value.errors == {'body': 'Request body must be a JSON object'}
+
+
+def test_validate_many_keys_errors_by_index():
+    schema = Schema({'name': Text('Name', required=True), 'flag': Boolean(default=True)})
+
+    assert schema.validate_many([{'name': 'a'}, {'name': 'b', 'flag': False}]) == [
+        {'name': 'a', 'flag': True}, {'name': 'b', 'flag': False},
+    ]
+
+    with pytest.raises(ValidationError) as info:
+        schema.validate_many([{'name': 'a'}, {'flag': 1}, 'x', {'name': ''}], label='Row')
+    assert str(info.value) == 'Row 1: Name cannot be empty'
+    assert info.value.errors == {
+        '1': {'name': 'Name cannot be empty', 'flag': 'flag must be a boolean'},
+        '2': {'item': 'Row must be a JSON object'},
+        '3': {'name': 'Name cannot be empty'},
+    }
+
+    with pytest.raises(ValidationError) as info:
+        schema.validate_many([None, {}])
+    assert str(info.value) == 'Item 0 must be a JSON object'
+
+
+def test_field_messages_can_be_replaced():
+    schema = Schema({'at': DateTime(required=True, missing='at please', invalid='bad at')})
+
+    with pytest.raises(ValidationError) as info:
+        schema.validate({})
+    assert info.value.errors == {'at': 'at please'}
+
+    for value in ('later', 5):
+        with pytest.raises(ValidationError) as info:
+            schema.validate({'at': value})
+        assert info.value.errors == {'at': 'bad at'}
+
+
+def test_routes_answer_with_every_error(make_client):
+    client = make_client()
+
+    response = client.post('/api/events', json={'title': 'Standup', 'start_time': '2025-01-01T10:00:00'})
+    assert response.status_code == 400
+    assert response.json == {'error': 'End time is required', 'errors': {'end_time': 'End time is required'}}
+
+    response = client.post('/api/tasks', json={'title': 'Report', 'due_datetime': 'tomorrow'})
+    assert response.status_code == 400
+    assert response.json['errors'] == {'description': 'Description cannot be empty', 'due_datetime': DATE_FORMAT_ERROR}
+
+    event_id = client.post('/api/events', json={
+        'title': 'Standup', 'start_time': '2025-01-01T10:00:00', 'end_time': '2025-01-01T10:15:00',
+    }).json['id']
+    response = client.put(f'/api/events/{event_id}', json={'end_time': '2025-01-01T09:00:00'})
+    assert response.status_code == 400
+    assert response.json['error'] == 'End time cannot be before existing start time'
+
+    # Offset-less times are stored as UTC
+    event = client.get(f'/api/events/{event_id}').json
+    assert (event['start_time'], event['end_time']) == ('2025-01-01T10:00:00+00:00', '2025-01-01T10:15:00+00:00')
@@ -0,0 +1,70 @@
+"""
+"Next up" ranking of a user's open tasks.
+
+Each open task is scored with the NEXT_TASKS_MODEL weights:
+
+    score = deadline * urgency + points * task points
+
+The urgency depends on the task's slack, the hours until it is due minus
+its estimated duration. It is 1 once the slack has run out, falls off as
+1 / (1 + slack / slack_hours) before that, and is 0 for tasks without a
+due date.
+
+The score is computed in SQL. The query reads only the partial
+``ix_tasks_user_open`` index, which holds open tasks and every column the
+score needs, so completed tasks are never read. SQLite keeps just the best
+``limit`` rows while scanning it (ORDER BY ... LIMIT) instead of sorting
+every open task, and only those tasks are loaded.
+"""
+
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import BigInteger, bindparam, case, func, type_coerce
+from extensions import db
+from models import DATETIME_STORAGE, Task, UTCDateTime, to_epoch_micros
+
+
+def _hours_until(column, now: datetime):
+    if DATETIME_STORAGE == 'epoch':
+        return (type_coerce(column, BigInteger) - bindparam('now', to_epoch_micros(now))) / 3600000000.0
+    return (func.julianday(column) - func.julianday(bindparam('now', now, type_=UTCDateTime))) * 24
+
+
+def urgency_score(model: dict, now: datetime):
+    """SQL expression scoring a ``Task`` row with the ``model`` weights at ``now``."""
+
+    due = Task._due_datetime
+    slack = _hours_until(due, now) - func.coalesce(Task.estimated_minutes, model['default_minutes']) / 60.0
+    urgency = case(
+        (due.is_(None), 0.0),
+        (slack <= 0, 1.0),
+        else_=1.0 / (1 + slack / model['slack_hours'])
+    )
+    return model['deadline'] * urgency + model['points'] * func.coalesce(Task.points, 0)
+
+
+def next_tasks(user_id: int, limit: int, options=()) -> list[Task]:
+    """
+    The user's ``limit`` most urgent open tasks, most urgent first. Ties go
+    to the earlier due date (undated last), then the older task.
+    ``options`` are loader options for the returned tasks.
+    """
+
+    score = urgency_score(current_app.config['NEXT_TASKS_MODEL'], datetime.now(timezone.utc))
+
+    ranked = (
+        db.select(Task.id, score.label('score'))
+        .where(Task.user_id == user_id, Task._completed_at.is_(None))
+        .order_by(score.desc(), Task._due_datetime.is_(None), Task._due_datetime, Task.id)
+        .limit(limit)
+        .subquery()
+    )
+
+    stmt = (
+        db.select(Task)
+        .join(ranked, Task.id == ranked.c.id)
+        .options(*options)
+        .order_by(ranked.c.score.desc(), Task._due_datetime.is_(None), Task._due_datetime, Task.id)
+    )
+    return db.session.scalars(stmt).all()
@@ -0,0 +1,361 @@
+"""
+Declarative validation of event, task and auth request bodies.
+
+Each write route describes its body once, as a ``Schema`` of typed fields
+plus cross-field checks. Schemas are compiled when this module is imported:
+every field becomes one small function with its messages and options bound
+in, so validating a body is a single pass over the schema's fields. All
+fields are checked and every error is reported at once, keyed by field
+name. Batch routes validate lists of items with ``validate_many``, with
+errors keyed by item index.
+
+Validated values are converted (stripped text, UTC datetimes) and can be
+passed straight to the model.
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+
+DATE_FORMAT_ERROR = 'Invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)'
+
+_UTC = timezone.utc
+_fromisoformat = datetime.fromisoformat
+
+
+def parse_datetime(date_string: str) -> datetime:
+    """
+    Parse an ISO 8601 string into a UTC datetime. Strings without an offset
+    are taken to be UTC; others are converted. Raises ValueError.
+    """
+
+    # Fast path for offset-less date-times (the common client format): parsing
+    # with an explicit offset is several times cheaper than replace(tzinfo=...)
+    tail = date_string[10:]
+    if tail and '+' not in tail and '-' not in tail and tail[-1] not in 'Zz':
+        try:
+            return _fromisoformat(date_string + '+00:00')
+        except ValueError:
+            pass
+
+    dt = _fromisoformat(date_string)
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=_UTC)
+    if dt.tzinfo is _UTC:
+        return dt
+    return dt.astimezone(_UTC)
+
+
+class ValidationError(ValueError):
+    """A request body that failed validation; ``errors`` maps each bad field to its message."""
+
+    def __init__(self, errors: dict, message: str | None = None):
+        super().__init__(message or next(iter(errors.values())))
+        self.errors = errors
+
+    def to_dict(self) -> dict:
+        # ``error`` keeps the single-message shape of every other 400
+        return {'error': str(self), 'errors': self.errors}
+
+
+class _Invalid(Exception):
+    pass
+
+
+# Default of fields without one: left out of the values, so the model's applies
+_MISSING = object()
+
+
+class Field(ABC):
+    """
+    One body field. ``label`` names it in messages ("Title cannot be
+    empty"); ``required`` fields must be present and not blank; ``default``
+    is used for optional fields missing from a full (non-partial) body.
+    ``missing`` replaces the message for a missing required value.
+    """
+
+    # Message for a missing required value, filled with the label or name
+    MISSING = '{} cannot be empty'
+
+    def __init__(self, label: str | None = None, required: bool = False, default=_MISSING,
+                 missing: str | None = None):
+        self.label = label
+        self.required = required
+        self.default = default
+        self.missing = missing
+
+    def missing_message(self, name: str) -> str:
+        return self.missing or self.MISSING.format(self.label or name)
+
+    @abstractmethod
+    def compile(self, name: str):
+        """A function converting one present value, raising ``_Invalid`` with the message."""
+
+
+class Text(Field):
+    """A string, stripped. Blank optional values become None."""
+
+    def compile(self, name):
+        required = self.required
+        empty = self.missing_message(name)
+        wrong_type = f'{name} must be a string'
+
+        def convert(value):
+            if value is None:
+                if required:
+                    raise _Invalid(empty)
+                return None
+            if type(value) is not str:
+                raise _Invalid(wrong_type)
+            value = value.strip()
+            if not value:
+                if required:
+                    raise _Invalid(empty)
+                return None
+            return value
+
+        return convert
+
+
+class DateTime(Field):
+    """
+    An ISO 8601 string, as a UTC datetime. Blank optional values become
+    None. ``invalid`` replaces the message for unparseable values.
+    """
+
+    MISSING = '{} is required'
+
+    def __init__(self, *args, invalid: str = DATE_FORMAT_ERROR, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.invalid = invalid
+
+    def compile(self, name):
+        required = self.required
+        missing = self.missing_message(name)
+        invalid = self.invalid
+
+        def convert(value):
+            if value is None or value == '':
+                if required:
+                    raise _Invalid(missing)
+                return None
+            if type(value) is not str:
+                raise _Invalid(invalid)
+            try:
+                return parse_datetime(value)
+            except ValueError:
+                raise _Invalid(invalid) from None
+
+        return convert
+
+
+class Boolean(Field):
+    """A JSON boolean."""
+
+    def compile(self, name):
+        wrong_type = f'{name} must be a boolean'
+
+        def convert(value):
+            if value is not True and value is not False:
+                raise _Invalid(wrong_type)
+            return value
+
+        return convert
+
+
+class Minutes(Field):
+    """A non-negative integer, or null."""
+
+    def compile(self, name):
+        wrong_type = f'{name} must be a non-negative integer'
+
+        def convert(value):
+            if value is not None and (type(value) is not int or value < 0):
+                raise _Invalid(wrong_type)
+            return value
+
+        return convert
+
+
+class Email(Text):
+    """A string with an ``@``, stripped and lowercased. ``invalid`` is the message otherwise."""
+
+    def __init__(self, *args, invalid: str = 'A valid email is required', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.invalid = invalid
+
+    def compile(self, name):
+        text = super().compile(name)
+        invalid = self.invalid
+
+        def convert(value):
+            value = text(value)
+            if value is not None and '@' not in value:
+                raise _Invalid(invalid)
+            return value if value is None else value.lower()
+
+        return convert
+
+
+class Password(Field):
+    """A string, kept as sent, of at least ``min_length`` characters."""
+
+    def __init__(self, *args, min_length: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_length = min_length
+
+    def compile(self, name):
+        min_length = self.min_length
+        wrong_type = f'{name} must be a string'
+        too_short = f'{self.label or name} must be at least {min_length} characters'
+
+        def convert(value):
+            if type(value) is not str:
+                raise _Invalid(wrong_type)
+            if len(value) < min_length:
+                raise _Invalid(too_short)
+            return value
+
+        return convert
+
+
+def not_before(first: str, second: str, message: str):
+    """Check that ``second`` is not earlier than ``first`` when both are set; the error goes on ``second``."""
+
+    def check(values):
+        start, end = values.get(first), values.get(second)
+        if start is not None and end is not None and end < start:
+            return second, message
+        return None
+
+    return check
+
+
+class Schema:
+    """
+    Fields of a request body plus cross-field ``checks`` (functions of the
+    converted values returning ``(field, message)`` or None, run only when
+    every field is valid). Compiled on construction.
+    """
+
+    def __init__(self, fields: dict[str, Field], checks=()):
+        self.fields = fields
+        self._checks = tuple(checks)
+        # (name, converter, message when missing or None, default) per field
+        self._compiled = tuple(
+            (name, field.compile(name), field.missing_message(name) if field.required else None, field.default)
+            for name, field in fields.items()
+        )
+
+    def validate(self, data, partial: bool = False) -> dict:
+        """
+        Converted values of the fields present in ``data``. Unless
+        ``partial`` (updates), required fields must be there and missing
+        fields with a default get it. Raises ValidationError.
+        """
+
+        if not isinstance(data, dict):
+            raise ValidationError({'body': 'Request body must be a JSON object'})
+
+        values = {}
+        errors = {}
+        for name, convert, missing, default in self._compiled:
+            if name in data:
+                try:
+                    values[name] = convert(data[name])
+                except _Invalid as e:
+                    errors[name] = e.args[0]
+            elif partial:
+                continue
+            elif missing is not None:
+                errors[name] = missing
+            elif default is not _MISSING:
+                values[name] = default
+
+        if not errors:
+            for check in self._checks:
+                failure = check(values)
+                if failure is not None:
+                    errors[failure[0]] = failure[1]
+
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def validate_many(self, items: list, partial: bool = False, label: str = 'Item') -> list[dict]:
+        """
+        ``validate`` each item of a batch. Raises ValidationError with the
+        errors of every bad item, keyed by its index (``{"3": {...}}``), and
+        the first bad item's message, prefixed with ``label`` and its index,
+        as the summary. Items that are not objects get an ``item`` error.
+        """
+
+        results = []
+        errors = {}
+        first = None
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[str(i)] = {'item': f'{label} must be a JSON object'}
+                if first is None:
+                    first = f'{label} {i} must be a JSON object'
+                continue
+            try:
+                results.append(self.validate(item, partial))
+            except ValidationError as e:
+                errors[str(i)] = e.errors
+                if first is None:
+                    first = f'{label} {i}: {e}'
+
+        if errors:
+            raise ValidationError(errors, first)
+        return results
+
+
+EVENT_SCHEMA = Schema(
+    {
+        'title': Text('Title', required=True),
+        'description': Text(),
+        'start_time': DateTime('Start time', required=True),
+        'end_time': DateTime('End time', required=True),
+        'location': Text(),
+        'all_day': Boolean(default=False),
+    },
+    checks=[not_before('start_time', 'end_time', 'End time cannot be before start time')],
+)
+
+TASK_SCHEMA = Schema({
+    'title': Text('Title', required=True),
+    'description': Text('Description', required=True),
+    'location': Text(),
+    'due_datetime': DateTime(),
+    'link': Text(),
+    'estimated_minutes': Minutes(),
+    'completed': Boolean(),
+})
+
+REGISTER_SCHEMA = Schema({
+    'email': Email(required=True, missing='A valid email is required'),
+    'password': Password('Password', required=True, min_length=8,
+                         missing='Password must be at least 8 characters'),
+})
+
+LOGIN_SCHEMA = Schema({
+    'email': Email('Email', required=True),
+    'password': Password('Password', required=True),
+})
+
+# Proposed intervals of POST /api/events/conflicts, with the messages the
+# route has always answered with
+_INTERVAL_TIME = {
+    'required': True,
+    'missing': 'start_time and end_time are required',
+    'invalid': 'invalid date format. Use ISO 8601 format (YYYY-MM-DDThh:mm:ss)',
+}
+
+INTERVAL_SCHEMA = Schema(
+    {
+        'start_time': DateTime(**_INTERVAL_TIME),
+        'end_time': DateTime(**_INTERVAL_TIME),
+    },
+    checks=[not_before('start_time', 'end_time', 'end time cannot be before start time')],
+)
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers (see ``gunicorn.conf.py``).
+
+Builds the app for FLASK_ENV (``production`` unless set) and warms it up
+at import time, which under ``preload_app`` happens once in the gunicorn
+master before the workers are forked.
+"""
+
+import os
+
+from app import create_app, warm_up
+
+
+app = create_app(os.environ.get('FLASK_ENV', 'production'))
+warm_up(app)